@@ -0,0 +1,296 @@
+import asyncio
+import gzip
+import json
+import ssl
+import weakref
+import zlib
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlencode, urljoin, urlsplit
+
+from http_client import (DEFAULT_TIMEOUT, RETRY_BACKOFF_FACTOR, RETRY_STATUSES,
+                         RETRY_TOTAL, THROTTLED_STATUS, retry_after)
+
+if TYPE_CHECKING:
+    from rate_limiter import RateLimiter
+
+
+MAX_CONNECTIONS = 64  # connections open at once, across all hosts
+MAX_REDIRECTS = 10
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+USER_AGENT = "frost-dates/1.0"
+
+_Key = tuple[str, str, int]  # scheme, host, port
+_Connection = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class Response:
+    """The parts of an HTTP response the web service modules use.
+
+    The attributes match requests.Response, so responses can be parsed
+    the same way no matter which client sent the request.
+    """
+    def __init__(self, status_code: int, reason: str,
+                 headers: dict[str, str], content: bytes) -> None:
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> Any:
+        """Parse the body as JSON. Raises ValueError if it is not JSON."""
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise RuntimeError(f"{self.status_code} Error: {self.reason}")
+
+
+def get_client() -> "AsyncClient":
+    """Get the shared client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncClient()
+    return client
+
+
+async def close() -> None:
+    """Close the shared client for the running event loop."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+class AsyncClient:
+    """HTTP/1.1 client for asyncio with a bounded pool of keep-alive connections.
+
+    A semaphore limits the number of requests in flight, so any number
+    of lookups can be started at once and they wait for a free
+    connection. Connections are kept open and reused for later requests
+    to the same host. Failed requests are retried with exponential
+    backoff like they are by http_client. Redirects are followed and
+    gzip or deflate bodies are decompressed.
+    """
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, *,
+                 retries: int = RETRY_TOTAL,
+                 backoff_factor: float = RETRY_BACKOFF_FACTOR,
+                 timeout: tuple[float, float] = DEFAULT_TIMEOUT) -> None:
+        """Create a client. No connections are opened until they are needed.
+
+        Args:
+            max_connections: The maximum number of requests in flight.
+            retries: The number of times to retry a failed request.
+            backoff_factor: The base delay between retries. The delay
+                            doubles after each retry.
+            timeout: The connect and read timeouts in seconds.
+        """
+        if max_connections < 1:
+            raise ValueError("max_connections must be at least 1")
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self._idle: dict[_Key, list[_Connection]] = defaultdict(list)
+        self._ssl_context: ssl.SSLContext | None = None
+
+    async def __aenter__(self) -> "AsyncClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def get(self, url: str, *, params: dict[str, Any] | None = None,
+                  headers: dict[str, str] | None = None,
+                  limiter: "RateLimiter | None" = None, cost: float = 1) -> Response:
+        """Send a GET request.
+
+        Args:
+            url: The URL to request.
+            params: The URL parameters to send. List values are sent as
+                    repeated parameters.
+            headers: The HTTP headers to send.
+            limiter: The rate limiter of the service, if any. Throttled
+                     requests slow it down like they do in http_client.
+            cost: The tokens the request spends from the limiter.
+        Returns:
+            The response to the request.
+        """
+        async with self._semaphore:
+            for _ in range(MAX_REDIRECTS + 1):
+                response = await self._get(url, params, headers, limiter, cost)
+                location = response.headers.get("location")
+                if response.status_code not in REDIRECT_STATUSES or not location:
+                    return response
+                url, params = urljoin(url, location), None  # the query is in the location
+        raise RuntimeError(f"Too many redirects: {url}")
+
+    async def _get(self, url: str, params: dict[str, Any] | None,
+                   headers: dict[str, str] | None,
+                   limiter: "RateLimiter | None", cost: float) -> Response:
+        """Send one GET request, retrying it if it fails."""
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        target = parts.path or "/"
+        query = "&".join(q for q in (parts.query, urlencode(params or {}, doseq=True)) if q)
+        if query:
+            target += "?" + query
+        host = parts.hostname if parts.port is None else f"{parts.hostname}:{port}"
+        lines = [f"GET {target} HTTP/1.1", f"Host: {host}",
+                 f"User-Agent: {USER_AGENT}", "Accept: application/json",
+                 "Accept-Encoding: gzip, deflate"]
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            if limiter is not None:
+                await limiter.acquire_async(cost)
+            delay = None
+            try:
+                response = await self._send(key, request)
+            except (OSError, EOFError, asyncio.TimeoutError, ValueError) as error:
+                if attempt >= self.retries:
+                    raise RuntimeError(f"Request failed: {error!r}")
+            else:
+                status = response.status_code
+                if status == THROTTLED_STATUS:
+                    delay = retry_after(response.headers.get("retry-after"))
+                    if limiter is not None and attempt < self.retries:
+                        await loop.run_in_executor(None, limiter.throttled, delay)
+                        attempt += 1
+                        continue  # the limiter waits before the next attempt
+                elif limiter is not None and status < 400:
+                    await loop.run_in_executor(None, limiter.succeeded)
+                if (status not in RETRY_STATUSES and status != THROTTLED_STATUS
+                        or attempt >= self.retries):
+                    return response
+            await asyncio.sleep(delay if delay is not None
+                                else self.backoff_factor * 2 ** attempt)
+            attempt += 1
+
+    async def close(self) -> None:
+        """Close every idle connection."""
+        idle, self._idle = self._idle, defaultdict(list)
+        for connections in idle.values():
+            for _, writer in connections:
+                writer.close()
+        for connections in idle.values():
+            for _, writer in connections:
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    pass
+
+    async def _send(self, key: _Key, request: bytes) -> Response:
+        """Send a request on an idle connection or a new one.
+
+        A connection that the server closed while it sat idle is only
+        noticed when it is used, so the request is sent again on a new
+        connection if a reused one fails before the response starts.
+        """
+        while self._idle[key]:
+            reader, writer = self._idle[key].pop()
+            if reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+            try:
+                return await self._exchange(key, reader, writer, request)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+        reader, writer = await asyncio.wait_for(self._connect(key), self.timeout[0])
+        return await self._exchange(key, reader, writer, request)
+
+    async def _connect(self, key: _Key) -> _Connection:
+        scheme, host, port = key
+        ssl_context = None
+        if scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            ssl_context = self._ssl_context
+        return await asyncio.open_connection(host, port, ssl=ssl_context)
+
+    async def _exchange(self, key: _Key, reader: asyncio.StreamReader,
+                        writer: asyncio.StreamWriter, request: bytes) -> Response:
+        try:
+            writer.write(request)
+            await writer.drain()
+            response, keep_alive = await asyncio.wait_for(_read_response(reader),
+                                                          self.timeout[1])
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self._idle[key].append((reader, writer))
+        else:
+            writer.close()
+        return response
+
+
+async def _read_response(reader: asyncio.StreamReader) -> tuple[Response, bool]:
+    """Read a response and whether the connection can be reused."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed by server")
+    version, status, *reason = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    keep_alive = (version == "HTTP/1.1"
+                  and headers.get("connection", "").lower() != "close")
+    status = int(status)
+    if status < 200 or status in (204, 304):  # never have a body
+        content = b""
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        content = await _read_chunked(reader)
+    elif "content-length" in headers:
+        content = await reader.readexactly(int(headers["content-length"]))
+    else:  # the body ends when the server closes the connection
+        content = await reader.read()
+        keep_alive = False
+    content = _decode(content, headers.get("content-encoding", "").lower())
+    return Response(status, reason[0] if reason else "", headers, content), keep_alive
+
+
+def _decode(content: bytes, encoding: str) -> bytes:
+    """Decompress a gzip or deflate body."""
+    try:
+        if encoding == "gzip":
+            return gzip.decompress(content)
+        if encoding == "deflate":
+            try:
+                return zlib.decompress(content)
+            except zlib.error:  # some servers send raw deflate data
+                return zlib.decompress(content, -zlib.MAX_WBITS)
+    except (OSError, EOFError, zlib.error) as error:
+        raise ValueError(f"Unable to decompress body: {error}")
+    return content
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    chunks = []
+    while True:
+        size = int((await reader.readline()).split(b";", 1)[0], 16)
+        if size == 0:
+            break
+        chunks.append(await reader.readexactly(size))
+        await reader.readline()  # CRLF after the chunk
+    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass  # trailer headers
+    return b"".join(chunks)
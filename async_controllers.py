@@ -0,0 +1,392 @@
+import heapq
+import itertools
+from typing import Any, Callable, Literal
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from geonames_api import get_zipcode_location
+from location_coordinates import LocationCoordinates
+from ncdc_api import get_frost_dates
+from response_cache import ResponseCache
+from station_query_cache import StationQueryCache
+
+
+MAX_THREAD_COUNT = 8
+PREFETCH_QUEUE_SIZE = 16  # hints kept waiting; the oldest least urgent is dropped
+PREFETCH_CONCURRENCY = 2  # prefetches running at once, leaving threads for clicks
+PREFETCH_PRIORITY = -1    # thread pool priority, below the default of 0
+
+_thread_pool: QThreadPool | None = None
+_request_ids = itertools.count(1)
+
+
+def thread_pool() -> QThreadPool:
+    """Get the thread pool shared by all of the AsyncControllers.
+
+    The pool threads never expire, so the cost of starting a thread is
+    only paid the first time the pool grows.
+    """
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = QThreadPool()
+        _thread_pool.setMaxThreadCount(MAX_THREAD_COUNT)
+        _thread_pool.setExpiryTimeout(-1)
+    return _thread_pool
+
+
+class _RequestSignals(QObject):
+    """Signals for a request running in the thread pool.
+
+    QRunnable is not a QObject, so it cannot have signals of its own.
+    """
+    batch_ready = pyqtSignal(int, list)
+    result_ready = pyqtSignal(int, object)
+    error_raised = pyqtSignal(int, str)
+    finished = pyqtSignal(int)
+
+
+class _Request(QRunnable):
+    """A function call to run in the thread pool.
+
+    If batches is true, the function returns an iterator over lists.
+    Each list is emitted with batch_ready as it arrives and the combined
+    list is emitted with result_ready at the end. A cancelled request
+    stops before fetching the next batch.
+    """
+    def __init__(self, request_id: int, function: Callable[..., Any],
+                 *args: Any, batches: bool = False) -> None:
+        super().__init__()
+        self.request_id = request_id
+        self.function = function
+        self.args = args
+        self.batches = batches
+        self.cancelled = False
+        self.signals = _RequestSignals()
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def run(self) -> None:
+        try:
+            if self.cancelled:
+                return
+            if self.batches:
+                result = []
+                for batch in self.function(*self.args):
+                    if self.cancelled:
+                        return
+                    self.signals.batch_ready.emit(self.request_id, batch)
+                    result.extend(batch)
+            else:
+                result = self.function(*self.args)
+            self.signals.result_ready.emit(self.request_id, result)
+        except Exception as error:  # an exception escaping run() aborts the program
+            if not self.cancelled:
+                self.signals.error_raised.emit(self.request_id, str(error))
+        finally:
+            self.signals.finished.emit(self.request_id)
+
+
+class _PooledAsyncController(QObject):
+    """Base class for AsyncControllers that run requests in the thread pool.
+
+    Every request gets an ID that is returned by sendRequest() and sent
+    with each signal, so overlapping requests can be told apart. The
+    requests in flight are kept until they finish so they are not
+    garbage collected while running.
+
+    A request that is the same as one already in flight shares that
+    request instead of being sent again. Cancelled requests emit no
+    more signals.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self._requests: dict[int, _Request] = {}
+        self._keys: dict[Any, int] = {}  # key of each request in flight -> ID
+
+    def _find(self, key: Any) -> int | None:
+        """Get the ID of the request in flight with the key, if any."""
+        return self._keys.get(key)
+
+    def _start(self, request: _Request, key: Any = None, priority: int = 0) -> None:
+        signals = request.signals
+        signals.batch_ready.connect(self._relay_batch)
+        signals.result_ready.connect(self._relay_result)
+        signals.error_raised.connect(self._relay_error)
+        signals.finished.connect(self._request_finished)
+        self._requests[request.request_id] = request
+        if key is not None:
+            self._keys[key] = request.request_id
+            request.key = key
+        thread_pool().start(request, priority)
+
+    def _live(self, request_id: int) -> bool:
+        request = self._requests.get(request_id)
+        return request is not None and not request.cancelled
+
+    def _relay_batch(self, request_id: int, batch: list) -> None:
+        if self._live(request_id):
+            self.batch_ready.emit(request_id, batch)
+
+    def _relay_result(self, request_id: int, result: Any) -> None:
+        if self._live(request_id):
+            self.result_ready.emit(request_id, result)
+
+    def _relay_error(self, request_id: int, message: str) -> None:
+        if self._live(request_id):
+            self.error_raised.emit(request_id, message)
+
+    def _request_finished(self, request_id: int) -> None:
+        live = self._live(request_id)
+        request = self._requests.pop(request_id, None)
+        key = getattr(request, 'key', None)
+        if key is not None and self._keys.get(key) == request_id:
+            del self._keys[key]
+        if live:
+            self.finished.emit(request_id)
+
+    def cancelRequest(self, request_id: int) -> None:
+        """Cancel a request. Its remaining signals are not emitted."""
+        request = self._requests.get(request_id)
+        if request is None:
+            return
+        request.cancel()
+        key = getattr(request, 'key', None)
+        if key is not None and self._keys.get(key) == request_id:
+            del self._keys[key]
+
+    def cancelAll(self) -> None:
+        """Cancel every request in flight."""
+        for request_id in list(self._requests):
+            self.cancelRequest(request_id)
+
+    def pendingRequests(self) -> int:
+        """Get the number of requests that have not finished."""
+        return sum(1 for request_id in self._requests if self._live(request_id))
+
+
+class GetZIPCodeAsyncController(_PooledAsyncController):
+    """Send ZIP code requests asynchronously."""
+    batch_ready = pyqtSignal(int, list)  # not used for ZIP codes
+    result_ready = pyqtSignal(int, dict)
+    error_raised = pyqtSignal(int, str)
+    finished = pyqtSignal(int)
+
+    def __init__(self, username: str) -> None:
+        super().__init__()
+        self.username = username
+
+    def sendRequest(self, zipcode: str) -> int:
+        """Send a request for the location of a ZIP code.
+
+        Returns:
+            The ID sent with the signals for this request. A request for
+            a ZIP code that is already in flight gets the same ID.
+        """
+        request_id = self._find(zipcode)
+        if request_id is not None:
+            return request_id
+        request = _Request(next(_request_ids), get_zipcode_location,
+                           self.username, zipcode)
+        self._start(request, zipcode)
+        return request.request_id
+
+
+class GetNearbyStationsAsyncController(_PooledAsyncController):
+    """Send nearby stations requests asynchronously.
+
+    Each page of stations is emitted with batch_ready as soon as it
+    arrives. Once every page has arrived, the full list is emitted with
+    result_ready.
+
+    A new search supersedes the searches in flight: they are cancelled
+    and their results are dropped, so an old search can never replace
+    the results of a newer one. Searches go through a StationQueryCache,
+    so changing the radius only requests the part of the boundary that
+    has not been searched yet.
+    """
+    batch_ready = pyqtSignal(int, list)
+    result_ready = pyqtSignal(int, list)
+    error_raised = pyqtSignal(int, str)
+    finished = pyqtSignal(int)
+
+    def __init__(self, token: str, cache: ResponseCache | None = None) -> None:
+        super().__init__()
+        self.token = token
+        self.cache = cache
+        self.stations = StationQueryCache(token, cache)
+
+    def sendRequest(self, location: LocationCoordinates, search_radius: float,
+                    unit: Literal['miles', 'km']) -> int:
+        """Send a request for the stations near a location.
+
+        Returns:
+            The ID sent with the signals for this request. The same search
+            as the one in flight gets the same ID.
+        """
+        key = (location.latitude, location.longitude, search_radius, unit)
+        request_id = self._find(key)
+        if request_id is not None:
+            return request_id
+        self.cancelAll()
+        request = _Request(next(_request_ids), self.stations.iter_nearby_stations,
+                           location, search_radius, unit, batches=True)
+        self._start(request, key)
+        return request.request_id
+
+
+class GetFrostDatesAsyncController(_PooledAsyncController):
+    """Send the first and last frost date requests asynchronously.
+
+    Both requests are sent at the same time, so the total wait is about
+    as long as the slower of the two requests. The result for each kind
+    of frost date is emitted as soon as it arrives, and finished is
+    emitted once both requests are done. Each kind is sent as its own
+    pooled request, called a part, and the parts' signals are relayed
+    with the ID of the request they belong to.
+    """
+    result_ready = pyqtSignal(int, str, object)  # request ID, kind, FrostDateMatrix
+    error_raised = pyqtSignal(int, str)
+    finished = pyqtSignal(int)
+
+    def __init__(self, token: str, cache: ResponseCache | None = None) -> None:
+        super().__init__()
+        self.token = token
+        self.cache = cache
+        self._parts: dict[int, tuple[int, str]] = {}  # part ID -> (request ID, kind)
+        self._stations: dict[str, int] = {}  # station ID -> request ID in flight
+
+    def sendRequest(self, station_id: str) -> int:
+        """Send requests for the first and last frost dates of a station.
+
+        Returns:
+            The ID sent with the signals for this request. A request for
+            a station that is already in flight gets the same ID.
+        """
+        if station_id in self._stations:
+            return self._stations[station_id]
+        request_id = next(_request_ids)
+        self._stations[station_id] = request_id
+        for kind in ('first', 'last'):
+            request = _Request(next(_request_ids), get_frost_dates, self.token,
+                               station_id, kind, self.cache)
+            self._parts[request.request_id] = (request_id, kind)
+            self._start(request)
+        return request_id
+
+    def _relay_result(self, part_id: int, result: dict) -> None:
+        if self._live(part_id):
+            request_id, kind = self._parts[part_id]
+            self.result_ready.emit(request_id, kind, result)
+
+    def _relay_error(self, part_id: int, message: str) -> None:
+        if self._live(part_id):
+            request_id, _ = self._parts[part_id]
+            self.error_raised.emit(request_id, message)
+
+    def _request_finished(self, part_id: int) -> None:
+        live = self._live(part_id)
+        self._requests.pop(part_id, None)
+        request_id, _ = self._parts.pop(part_id)
+        if request_id in (other for other, _ in self._parts.values()):
+            return
+        for station_id, other in list(self._stations.items()):
+            if other == request_id:
+                del self._stations[station_id]
+        if live:
+            self.finished.emit(request_id)
+
+
+class PrefetchController(_PooledAsyncController):
+    """Warm the response cache for the requests the user is likely to make next.
+
+    Prefetches are hints: they are kept in a bounded queue, the most
+    urgent and most recent first, and when the queue is full the oldest
+    of the least urgent hints is dropped. A few are run at a time, at a
+    lower thread pool priority than the requests the user is waiting
+    on, so they only use threads that would otherwise be idle. Results
+    only go to the cache, and errors are ignored, since the real request
+    will report them. A real request for a response being prefetched
+    waits for it instead of sending it again, since the response cache
+    sends each request once at a time.
+    """
+    STATIONS = 0
+    FROST_DATES = 1  # the next click after a station is highlighted
+
+    batch_ready = pyqtSignal(int, list)  # not used for prefetches
+    result_ready = pyqtSignal(int, object)
+    error_raised = pyqtSignal(int, str)
+    finished = pyqtSignal(int)
+
+    def __init__(self, token: str, cache: ResponseCache | None,
+                 stations: StationQueryCache | None = None,
+                 max_pending: int = PREFETCH_QUEUE_SIZE,
+                 concurrency: int = PREFETCH_CONCURRENCY) -> None:
+        """Create a prefetcher.
+
+        Args:
+            token: The NCDC web service token used to retrieve the data.
+            cache: The response cache to warm.
+            stations: The station query cache to warm, which should be the
+                      one the station searches use.
+            max_pending: The most hints kept waiting.
+            concurrency: The most prefetches running at once.
+        """
+        super().__init__()
+        self.token = token
+        self.cache = cache
+        self.stations = stations if stations is not None else StationQueryCache(token, cache)
+        self.max_pending = max_pending
+        self.concurrency = concurrency
+        # (-urgency, -sequence, key, function, args), so heappop gets the next hint
+        self._queue: list[tuple[int, int, Any, Callable[..., Any], tuple]] = []
+        self._sequence = itertools.count()
+
+    def prefetchStations(self, location: LocationCoordinates, search_radius: float,
+                         unit: Literal['miles', 'km']) -> None:
+        """Fetch every page of a station search ahead of time."""
+        key = ('stations', location.latitude, location.longitude, search_radius, unit)
+        self._enqueue(self.STATIONS, key, _drain, self.stations.iter_nearby_stations,
+                      location, search_radius, unit)
+
+    def prefetchFrostDates(self, station_id: str) -> None:
+        """Fetch the first and last frost dates of a station ahead of time."""
+        for kind in ('first', 'last'):
+            self._enqueue(self.FROST_DATES, ('frost dates', station_id, kind),
+                          get_frost_dates, self.token, station_id, kind, self.cache)
+
+    def pendingPrefetches(self) -> int:
+        """Get the number of hints waiting to run."""
+        return len(self._queue)
+
+    def clear(self) -> None:
+        """Drop the hints waiting to run and cancel the running prefetches."""
+        self._queue.clear()
+        self.cancelAll()
+
+    def _enqueue(self, urgency: int, key: Any, function: Callable[..., Any],
+                 *args: Any) -> None:
+        if self.cache is None or self._find(key) is not None:
+            return
+        self._queue = [hint for hint in self._queue if hint[2] != key]
+        self._queue.append((-urgency, -next(self._sequence), key, function, args))
+        if len(self._queue) > self.max_pending:
+            self._queue.remove(max(self._queue, key=lambda hint: hint[:2]))
+        heapq.heapify(self._queue)
+        self._start_next()
+
+    def _start_next(self) -> None:
+        while self._queue and len(self._requests) < self.concurrency:
+            _, _, key, function, args = heapq.heappop(self._queue)
+            self._start(_Request(next(_request_ids), function, *args), key,
+                        PREFETCH_PRIORITY)
+
+    def _request_finished(self, request_id: int) -> None:
+        super()._request_finished(request_id)
+        self._start_next()
+
+
+def _drain(function: Callable[..., Any], *args: Any) -> None:
+    """Run a function that returns pages until every page has been fetched."""
+    for _ in function(*args):
+        pass
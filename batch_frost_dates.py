@@ -0,0 +1,385 @@
+"""Look up frost dates for a list of ZIP codes without the GUI.
+
+Reads one ZIP code per line from a file or standard input and writes
+one row per ZIP code as CSV or JSON lines:
+
+    python batch_frost_dates.py -i zipcodes.txt -o frost_dates.csv --workers 16
+
+Each ZIP code goes through three stages: geocode (program cache,
+gazetteer, then GeoNames), nearest station (station catalog, then an
+NCDC station search) and frost dates (first and last). Throughput and
+the latency of each stage are reported on standard error at the end.
+
+Requests are held to the published rates and daily quotas of NCEI and
+GeoNames (see rate_limiter), and the budget left for the day is
+reported with the statistics.
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import statistics
+import sys
+import time
+from concurrent.futures import (FIRST_COMPLETED, Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from dataclasses import dataclass, field
+from multiprocessing import util
+from typing import Any, Iterable, Iterator, TextIO
+
+import gazetteer
+import geonames_api
+import http_client
+import ncdc_api
+import normals_planner
+import rate_limiter
+import response_cache
+import station_catalog
+import zip_data
+from location_coordinates import LocationCoordinates
+from station_query_cache import StationQueryCache
+
+
+STAGES = ("geocode", "station", "frost_dates")
+FROST_DATE_KINDS = ("first", "last")
+FIELDNAMES = ["zipcode", "city", "latitude", "longitude",
+              "station_id", "station_name", "distance",
+              *ncdc_api.FrostDateDataTypesIterable('first'),
+              *ncdc_api.FrostDateDataTypesIterable('last'),
+              "error"]
+
+
+@dataclass
+class PipelineOptions:
+    username: str
+    token: str
+    radius: float = 20
+    zip_data_filename: str = "zip_data.csv"
+    gazetteer_filename: str = "gazetteer.dat"
+    catalog_filename: str = "station_catalog.csv"
+    cache_filename: str | None = "ncdc_cache.sqlite3"
+    rate_limits_filename: str | None = None  # requests are not rate limited if None
+
+
+@dataclass
+class PipelineResult:
+    row: dict[str, Any]
+    timings: dict[str, float] = field(default_factory=dict)
+    new_zip_entry: dict[str, Any] | None = None
+
+
+class Pipeline:
+    """The lookups for one ZIP code, with the data files they share."""
+    def __init__(self, options: PipelineOptions,
+                 zip_cache: zip_data.ZipData | None = None) -> None:
+        self.options = options
+        self._owns_zip_data = zip_cache is None
+        self.zip_data = zip_cache if zip_cache is not None else zip_data.load(
+            options.zip_data_filename
+        )
+        self.gazetteer = gazetteer.load(options.gazetteer_filename)
+        self.station_catalog = station_catalog.load(options.catalog_filename)
+        self.cache = (response_cache.load(options.cache_filename)
+                      if options.cache_filename else None)
+        self.stations = StationQueryCache(options.token, self.cache)
+
+    def close(self) -> None:
+        """Close the response cache and the ZIP cache if this pipeline opened it."""
+        if self.cache is not None:
+            self.cache.close()
+        if self._owns_zip_data:
+            self.zip_data.close()
+
+    def run(self, zipcode: str) -> PipelineResult:
+        """Look up the nearest station and its frost dates for a ZIP code.
+
+        Errors are reported in the error column of the row instead of
+        being raised, so one bad ZIP code does not stop the batch.
+        """
+        result = PipelineResult({"zipcode": zipcode})
+        try:
+            start = time.perf_counter()
+            entry, is_new = self.locate(zipcode)
+            result.timings["geocode"] = time.perf_counter() - start
+            if is_new:
+                result.new_zip_entry = entry
+            location = LocationCoordinates(latitude=entry["latitude"],
+                                           longitude=entry["longitude"])
+            result.row.update(city=entry["city"], latitude=location.latitude,
+                              longitude=location.longitude)
+
+            start = time.perf_counter()
+            station, distance = self.nearest_station(location)
+            result.timings["station"] = time.perf_counter() - start
+            result.row.update(station_id=station.id, station_name=station.name,
+                              distance=round(distance, 1))
+
+            start = time.perf_counter()
+            frost_dates = normals_planner.get_frost_dates_for_stations(
+                self.options.token, [station.id], self.cache, FROST_DATE_KINDS
+            ).get(station.id, {})
+            if any(kind not in frost_dates for kind in FROST_DATE_KINDS):
+                raise RuntimeError('No results')
+            for kind in FROST_DATE_KINDS:
+                result.row[kind] = frost_dates[kind]
+            result.timings["frost_dates"] = time.perf_counter() - start
+        except RuntimeError as error:
+            result.row["error"] = str(error)
+        except sqlite3.Error as error:  # such as a cache file locked by another process
+            result.row["error"] = f"Cache error: {error}"
+        return result
+
+    def locate(self, zipcode: str) -> tuple[dict[str, Any], bool]:
+        """Get the location of a ZIP code and whether it is new to the cache."""
+        try:
+            return self.zip_data[zipcode], False
+        except KeyError:
+            pass
+        entry = self.gazetteer.get(zipcode) if self.gazetteer else None
+        if entry is None:
+            entry = geonames_api.get_zipcode_location(self.options.username, zipcode)
+        return entry, True
+
+    def nearest_station(self, location: LocationCoordinates
+                        ) -> tuple[ncdc_api.StationInfo, float]:
+        """Get the station nearest to a location and its distance in miles.
+
+        The station catalog is used if it has been downloaded, otherwise
+        stations are searched for within the search radius. Nearby ZIP
+        codes have overlapping search boundaries, so only the parts not
+        searched for an earlier ZIP code are requested.
+        """
+        if self.station_catalog:
+            stations = ncdc_api.StationArray(self.station_catalog.nearest(location, 1))
+        else:
+            stations = ncdc_api.StationArray(self.stations.get_nearby_stations(
+                location, self.options.radius, 'miles'
+            ))
+        if not stations:
+            raise RuntimeError('No results')
+        stations, distances = stations.sorted_by_distance(location, 'miles')
+        return stations[0], distances[0]
+
+
+_pipeline: Pipeline | None = None
+
+
+def _init_pipeline(options: PipelineOptions,
+                   zip_cache: zip_data.ZipData | None = None) -> None:
+    """Set up the pipeline for the current process."""
+    global _pipeline
+    _pipeline = Pipeline(options, zip_cache)
+    if options.rate_limits_filename:
+        rate_limiter.install_defaults(options.rate_limits_filename)
+
+
+def _init_worker_process(options: PipelineOptions) -> None:
+    """Set up the pipeline for a worker process and close it when the process exits."""
+    _init_pipeline(options)
+    util.Finalize(None, _close_pipeline, exitpriority=10)
+
+
+def _close_pipeline() -> None:
+    """Close the files used by the pipeline in the current process."""
+    global _pipeline
+    if _pipeline is not None:
+        _pipeline.close()
+    _pipeline = None
+    rate_limiter.uninstall_all()
+
+
+def _run_pipeline(zipcode: str) -> PipelineResult:
+    return _pipeline.run(zipcode)
+
+
+def read_zipcodes(fh: TextIO) -> Iterator[str]:
+    """Read ZIP codes one per line, skipping blank lines and duplicates.
+
+    Only the first comma-separated field is used, so a CSV file with the
+    ZIP code in the first column also works. A zipcode header is skipped.
+    """
+    seen = set()
+    for line in fh:
+        zipcode = line.split(',', 1)[0].strip()
+        if not zipcode or zipcode == "zipcode" or zipcode in seen:
+            continue
+        seen.add(zipcode)
+        yield zipcode
+
+
+class ResultWriter:
+    """Write pipeline rows as CSV or JSON lines as they are produced."""
+    def __init__(self, fh: TextIO, output_format: str) -> None:
+        if output_format not in ("csv", "jsonl"):
+            raise ValueError("output format must be either csv or jsonl")
+        self.fh = fh
+        self.output_format = output_format
+        if output_format == "csv":
+            self._writer = csv.DictWriter(fh, FIELDNAMES)
+            self._writer.writeheader()
+
+    def write(self, row: dict[str, Any]) -> None:
+        if self.output_format == "csv":
+            flat_row = {name: value for name, value in row.items()
+                        if name not in FROST_DATE_KINDS}
+            for kind in FROST_DATE_KINDS:
+                if kind in row:
+                    flat_row.update(row[kind].to_dict())
+            self._writer.writerow(flat_row)
+        else:
+            row = {name: value.to_dict() if name in FROST_DATE_KINDS else value
+                   for name, value in row.items()}
+            self.fh.write(json.dumps(row) + "\n")
+        self.fh.flush()
+
+
+class StageStats:
+    """Collect the latency of each stage and the overall throughput."""
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.timings: dict[str, list[float]] = {stage: [] for stage in STAGES}
+        self.count = 0
+        self.errors = 0
+        self.budgets: list[rate_limiter.Budget] = []
+
+    def add(self, result: PipelineResult) -> None:
+        self.count += 1
+        if "error" in result.row:
+            self.errors += 1
+        for stage, seconds in result.timings.items():
+            self.timings[stage].append(seconds)
+
+    def report(self, fh: TextIO) -> None:
+        elapsed = time.perf_counter() - self.start
+        rate = self.count / elapsed if elapsed else 0.0
+        print(f"Processed {self.count} ZIP codes ({self.errors} errors) in "
+              f"{elapsed:.1f} s: {rate:.1f} ZIP codes/s", file=fh)
+        print(f"{'stage':<12}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}"
+              f"{'max':>10}  (ms)", file=fh)
+        for stage, timings in self.timings.items():
+            if not timings:
+                continue
+            p95 = (statistics.quantiles(timings, n=20, method='inclusive')[-1]
+                   if len(timings) > 1 else timings[0])
+            print(f"{stage:<12}{len(timings):>8}"
+                  f"{statistics.mean(timings) * 1000:>10.1f}"
+                  f"{statistics.median(timings) * 1000:>10.1f}"
+                  f"{p95 * 1000:>10.1f}{max(timings) * 1000:>10.1f}", file=fh)
+        for budget in self.budgets:
+            print(rate_limiter.format_budget(budget), file=fh)
+
+
+def run(zipcodes: Iterable[str], writer: ResultWriter, options: PipelineOptions, *,
+        workers: int = 8, executor_kind: str = "thread") -> StageStats:
+    """Run the pipeline for each ZIP code and write the results.
+
+    Results are written in the order they finish. New ZIP code locations
+    are saved to the program cache as they arrive.
+
+    Args:
+        zipcodes: The ZIP codes to look up.
+        writer: Where to write the results.
+        options: The pipeline settings.
+        workers: The number of threads or processes to use.
+        executor_kind: Either thread or process.
+    Returns:
+        The stage statistics for the run.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    if executor_kind not in ("thread", "process"):
+        raise ValueError("executor must be either thread or process")
+    zip_cache = zip_data.load(options.zip_data_filename)
+    executor: Executor
+    if executor_kind == "thread":
+        http_client.configure(pool_maxsize=max(workers, http_client.POOL_MAXSIZE))
+        _init_pipeline(options, zip_cache)
+        executor = ThreadPoolExecutor(max_workers=workers)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers,
+                                       initializer=_init_worker_process,
+                                       initargs=(options,))
+    stats = StageStats()
+    pending = set()
+
+    def finish(block: bool) -> None:
+        """Write the results that are ready, waiting for one if block is set."""
+        nonlocal pending
+        done, pending = wait(pending, timeout=None if block else 0,
+                             return_when=FIRST_COMPLETED)
+        for future in done:
+            result = future.result()
+            if result.new_zip_entry is not None:
+                zip_cache[result.new_zip_entry["zipcode"]] = result.new_zip_entry
+            writer.write(result.row)
+            stats.add(result)
+
+    try:
+        with executor:
+            for zipcode in zipcodes:
+                # keep memory bounded for long inputs
+                finish(block=len(pending) >= workers * 4)
+                pending.add(executor.submit(_run_pipeline, zipcode))
+            while pending:
+                finish(block=True)
+    finally:
+        zip_cache.close()
+        _close_pipeline()
+    if options.rate_limits_filename:
+        for limiter in rate_limiter.default_limiters(options.rate_limits_filename):
+            stats.budgets.append(limiter.remaining())
+            limiter.close()
+    return stats
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Look up frost dates for a list of ZIP codes."
+    )
+    parser.add_argument("-i", "--input", default="-",
+                        help="file with one ZIP code per line (default: stdin)")
+    parser.add_argument("-o", "--output", default="-",
+                        help="file to write results to (default: stdout)")
+    parser.add_argument("-f", "--format", choices=["csv", "jsonl"],
+                        help="output format (default: from the output file "
+                             "extension, otherwise csv)")
+    parser.add_argument("-w", "--workers", type=int, default=8,
+                        help="number of ZIP codes to process at once (default: 8)")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread",
+                        help="run workers as threads or processes (default: thread)")
+    parser.add_argument("-r", "--radius", type=float, default=20,
+                        help="station search radius in miles when there is no "
+                             "station catalog (default: 20)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not use the NCDC response cache")
+    parser.add_argument("--no-rate-limit", action="store_true",
+                        help="do not limit requests to the published rates and "
+                             "daily quotas of the services")
+    args = parser.parse_args(argv)
+
+    output_format = args.format or (
+        "jsonl" if args.output.endswith((".jsonl", ".json")) else "csv"
+    )
+    options = PipelineOptions(
+        username=geonames_api.load_username(),
+        token=ncdc_api.load_token(),
+        radius=args.radius,
+        cache_filename=None if args.no_cache else PipelineOptions.cache_filename,
+        rate_limits_filename=None if args.no_rate_limit else "rate_limits.sqlite3"
+    )
+    input_fh = sys.stdin if args.input == "-" else open(args.input, "r")
+    output_fh = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        writer = ResultWriter(output_fh, output_format)
+        stats = run(read_zipcodes(input_fh), writer, options,
+                    workers=args.workers, executor_kind=args.executor)
+    finally:
+        if input_fh is not sys.stdin:
+            input_fh.close()
+        if output_fh is not sys.stdout:
+            output_fh.close()
+    stats.report(sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
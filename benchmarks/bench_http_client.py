@@ -0,0 +1,50 @@
+"""Compare one-off requests.get() calls with the shared pooled session.
+
+Run from the project directory:
+
+    python -m benchmarks.bench_http_client
+"""
+import statistics
+import sys
+import time
+
+import requests
+
+import http_client
+from stub_services import StubServer
+
+
+def time_requests(send, url: str, count: int) -> list[float]:
+    """Time each of count requests sent with the send function."""
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        send(url, params={"q": "68008"}).json()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label: str, timings: list[float]) -> float:
+    mean = statistics.mean(timings)
+    print(f"{label:<20} mean {mean * 1e6:8.1f} us   "
+          f"p50 {statistics.median(timings) * 1e6:8.1f} us   "
+          f"max {max(timings) * 1e6:8.1f} us")
+    return mean
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with StubServer({"/ping": lambda params: (200, {"ok": True})}) as server:
+        url = server.url + "/ping"
+        time_requests(http_client.get, url, 10)  # warm up
+        unpooled = report("requests.get", time_requests(requests.get, url, count))
+        pooled = report("http_client.get", time_requests(http_client.get, url, count))
+    http_client.close()
+    print(f"Saved {(unpooled - pooled) * 1e6:.1f} us per request "
+          f"({(1 - pooled / unpooled) * 100:.0f}%) over plain HTTP on localhost. "
+          f"Savings are larger for HTTPS, where each new connection also "
+          f"needs a TLS handshake.")
+
+
+if __name__ == "__main__":
+    main()
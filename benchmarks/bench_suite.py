@@ -0,0 +1,293 @@
+"""End-to-end latency benchmarks against the fake web services.
+
+Times the web service calls, the program cache and the whole ZIP code
+to frost dates flow, and reports p50/p95/p99 latency and throughput.
+Run from the project directory:
+
+    python -m benchmarks.bench_suite --latency 50 --json results.json
+
+Save the results of a known good build with --json and compare later
+builds against it with --baseline. The run fails if any benchmark got
+slower by more than the tolerance.
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+import batch_frost_dates
+import geonames_api
+import http_client
+import ncdc_api
+import zip_data
+from location_coordinates import LocationCoordinates
+from stub_services import KNOWN_PLACES, FakeServices
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    count: int
+    p50: float          # seconds
+    p95: float
+    p99: float
+    throughput: float   # operations per second
+
+    @classmethod
+    def from_timings(cls, name: str, timings: list[float],
+                     elapsed: float) -> "BenchmarkResult":
+        if len(timings) > 1:
+            percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+            p50, p95, p99 = percentiles[49], percentiles[94], percentiles[98]
+        else:
+            p50 = p95 = p99 = timings[0]
+        return cls(name, len(timings), p50, p95, p99, len(timings) / elapsed)
+
+
+def measure(name: str, operation: Callable[[int], object], iterations: int,
+            workers: int = 1, warmup: int = 2) -> BenchmarkResult:
+    """Time iterations calls of operation(n), running workers at once."""
+    for n in range(warmup):
+        operation(n)
+
+    def timed(n: int) -> float:
+        start = time.perf_counter()
+        operation(n)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if workers == 1:
+        timings = [timed(n) for n in range(iterations)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            timings = list(executor.map(timed, range(iterations)))
+    return BenchmarkResult.from_timings(name, timings, time.perf_counter() - start)
+
+
+def zipcodes(count: int) -> list[str]:
+    """Get count ZIP codes, starting with the known ones."""
+    made_up = (f"{n:05d}" for n in itertools.count(10000, 7))
+    return list(itertools.islice(itertools.chain(KNOWN_PLACES, made_up), count))
+
+
+def bench_web_services(iterations: int, radius: float) -> list[BenchmarkResult]:
+    locations = [
+        geonames_api.get_zipcode_location("bench", zipcode)
+        for zipcode in zipcodes(20)
+    ]
+    locations = [LocationCoordinates(latitude=entry["latitude"],
+                                     longitude=entry["longitude"])
+                 for entry in locations]
+    station_ids = [station.id
+                   for location in locations[:5]
+                   for station in ncdc_api.get_nearby_stations("bench", location,
+                                                               radius, 'miles')]
+    codes = zipcodes(iterations)
+    return [
+        measure("geonames.get_zipcode_location",
+                lambda n: geonames_api.get_zipcode_location("bench", codes[n % len(codes)]),
+                iterations),
+        measure("ncdc.get_nearby_stations",
+                lambda n: ncdc_api.get_nearby_stations(
+                    "bench", locations[n % len(locations)], radius, 'miles'
+                ), iterations),
+        measure("ncdc.get_frost_dates",
+                lambda n: ncdc_api.get_frost_dates(
+                    "bench", station_ids[n % len(station_ids)], ('first', 'last')[n % 2]
+                ), iterations),
+    ]
+
+
+def bench_zip_data(iterations: int, directory: str,
+                   entries: int = 20_000) -> list[BenchmarkResult]:
+    data = {
+        zipcode: {"zipcode": zipcode, "latitude": 41.0 + n / entries,
+                  "longitude": -96.0 - n / entries, "city": f"Town {zipcode}, NE"}
+        for n, zipcode in enumerate(f"{n:05d}" for n in range(entries))
+    }
+    csv_filename = os.path.join(directory, "bench_save.csv")
+    filename = os.path.join(directory, "bench_load.csv")
+    zip_data.save(data, filename)
+    zip_data.convert(filename)
+    journal = zip_data.load(filename)
+    for zipcode in list(data)[:zip_data.JOURNAL_MAX_RECORDS // 2]:
+        journal[zipcode] = dict(data[zipcode], city="Renamed, NE")
+    journal.close()
+
+    def load(n: int) -> None:
+        cache = zip_data.load(filename)
+        cache.get(f"{n % entries:05d}")
+        cache.close()
+
+    return [
+        measure(f"zip_data.save ({entries} entries)",
+                lambda n: zip_data.save(data, csv_filename),
+                max(iterations // 10, 5)),
+        measure("zip_data.load (index + journal)", load, iterations),
+    ]
+
+
+def bench_pipeline(iterations: int, directory: str, radius: float,
+                   workers: int) -> list[BenchmarkResult]:
+    """Time the headless flow from ZIP code to frost dates.
+
+    The program cache, gazetteer, station catalog and response cache
+    are left empty so every stage goes to the web services.
+    """
+    options = batch_frost_dates.PipelineOptions(
+        username="bench", token="bench", radius=radius,
+        zip_data_filename=os.path.join(directory, "pipeline_zip_data.csv"),
+        gazetteer_filename=os.path.join(directory, "missing.dat"),
+        catalog_filename=os.path.join(directory, "missing.csv"),
+        cache_filename=None
+    )
+    pipeline = batch_frost_dates.Pipeline(options)
+    codes = zipcodes(iterations)
+
+    def run(n: int) -> None:
+        result = pipeline.run(codes[n % len(codes)])
+        if "error" in result.row:
+            raise RuntimeError(result.row["error"])
+
+    results = [measure("pipeline", run, iterations)]
+    if workers > 1:
+        results.append(measure(f"pipeline x{workers}", run, iterations, workers))
+    pipeline.zip_data.close()
+    return results
+
+
+def bench_controllers(iterations: int, radius: float) -> list[BenchmarkResult]:
+    """Time the async controllers the GUI uses, chained like the GUI chains them."""
+    try:
+        from PyQt5.QtCore import QCoreApplication, QEventLoop
+    except ImportError:
+        print("Skipping the controller benchmark: PyQt5 is not installed",
+              file=sys.stderr)
+        return []
+    import async_controllers
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    zipcode_controller = async_controllers.GetZIPCodeAsyncController("bench")
+    stations_controller = async_controllers.GetNearbyStationsAsyncController("bench")
+    frost_dates_controller = async_controllers.GetFrostDatesAsyncController("bench")
+    loop = QEventLoop()
+    zipcode_controller.result_ready.connect(
+        lambda request_id, entry: stations_controller.sendRequest(
+            LocationCoordinates(latitude=entry["latitude"], longitude=entry["longitude"]),
+            radius, 'miles'
+        )
+    )
+    stations_controller.result_ready.connect(
+        lambda request_id, stations: frost_dates_controller.sendRequest(stations[0].id)
+    )
+    for controller in (zipcode_controller, stations_controller):
+        controller.error_raised.connect(lambda request_id, message: loop.exit(1))
+    frost_dates_controller.error_raised.connect(lambda request_id, message: loop.exit(1))
+    frost_dates_controller.finished.connect(lambda request_id: loop.exit(0))
+    codes = zipcodes(iterations)
+
+    def run(n: int) -> None:
+        zipcode_controller.sendRequest(codes[n % len(codes)])
+        if loop.exec():
+            raise RuntimeError(f"Lookup failed for {codes[n % len(codes)]}")
+
+    results = [measure("controllers", run, iterations)]
+    app.processEvents()  # deliver the last finished signals
+    return results
+
+
+def report(results: list[BenchmarkResult], baseline: dict[str, dict] | None = None,
+           tolerance: float = 0.2) -> list[str]:
+    """Print the results and get the names of any that regressed."""
+    print(f"{'benchmark':<34}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}"
+          f"{'ops/s':>10}  (ms)")
+    regressions = []
+    for result in results:
+        line = (f"{result.name:<34}{result.count:>7}{result.p50 * 1000:>10.2f}"
+                f"{result.p95 * 1000:>10.2f}{result.p99 * 1000:>10.2f}"
+                f"{result.throughput:>10.1f}")
+        old = (baseline or {}).get(result.name)
+        if old is not None:
+            slower = (result.p95 > old["p95"] * (1 + tolerance)
+                      or result.throughput < old["throughput"] * (1 - tolerance))
+            change = result.p95 / old["p95"] - 1 if old["p95"] else 0.0
+            line += f"  p95 {change:+.0%}" + ("  REGRESSION" if slower else "")
+            if slower:
+                regressions.append(result.name)
+        print(line)
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=100,
+                        help="calls to time per benchmark (default: 100)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="milliseconds the fake services wait before "
+                             "answering (default: 0)")
+    parser.add_argument("--page-size", type=int, default=1000,
+                        help="largest page of stations the fake NCEI service "
+                             "returns (default: 1000)")
+    parser.add_argument("--radius", type=float, default=20,
+                        help="station search radius in miles (default: 20)")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="threads for the concurrent pipeline benchmark "
+                             "(default: 8)")
+    parser.add_argument("--only", action="append",
+                        choices=["services", "zip_data", "pipeline", "controllers"],
+                        help="run only these benchmarks (repeatable)")
+    parser.add_argument("--json", metavar="FILE", help="save the results to FILE")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="compare with results saved by --json")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown before a benchmark counts as a "
+                             "regression (default: 0.2)")
+    args = parser.parse_args(argv)
+    selected = set(args.only or ["services", "zip_data", "pipeline", "controllers"])
+
+    http_client.configure(pool_maxsize=max(args.workers, http_client.POOL_MAXSIZE))
+    results: list[BenchmarkResult] = []
+    urls = (geonames_api.GEONAMES_URL, ncdc_api.NCEI_URL)
+    try:
+        with FakeServices(page_size=args.page_size).server(args.latency / 1000) as server, \
+                tempfile.TemporaryDirectory() as directory:
+            geonames_api.GEONAMES_URL = ncdc_api.NCEI_URL = server.url
+            if "services" in selected:
+                results += bench_web_services(args.iterations, args.radius)
+            if "zip_data" in selected:
+                results += bench_zip_data(args.iterations, directory)
+            if "pipeline" in selected:
+                results += bench_pipeline(args.iterations, directory, args.radius,
+                                          args.workers)
+            if "controllers" in selected:
+                results += bench_controllers(args.iterations, args.radius)
+    finally:
+        geonames_api.GEONAMES_URL, ncdc_api.NCEI_URL = urls
+        http_client.configure()
+        http_client.close()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as fh:
+            baseline = {result["name"]: result for result in json.load(fh)["results"]}
+    regressions = report(results, baseline, args.tolerance)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"latency_ms": args.latency, "page_size": args.page_size,
+                       "results": [asdict(result) for result in results]}, fh, indent=2)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,39 +1,94 @@
 import re
 from typing import Any
 
-from PyQt5.QtWidgets import QTreeWidgetItem, QMessageBox, QTableWidgetItem
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QMessageBox, QTableWidgetItem
+from PyQt5.QtCore import QTimer
 
 from view import MainWindow
+import async_controllers
+import gazetteer
 import geonames_api
+import metrics
 import ncdc_api
+import rate_limiter
+import response_cache
+import station_catalog
 import zip_data
 from location_coordinates import LocationCoordinates
 
 
+METRICS_REFRESH_INTERVAL = 1000  # milliseconds between status bar metrics updates
+
+
 class MainController:
     def __init__(self) -> None:
-        self.geonames_controller = geonames_api.GetZIPCodeAsyncController(
+        rate_limiter.install_defaults()
+        self.geonames_controller = async_controllers.GetZIPCodeAsyncController(
             geonames_api.load_username()
         )
-        self.ncdc_controller = ncdc_api.GetNearbyStationsAsyncController(
-            ncdc_api.load_token()
+        self.ncdc_cache = response_cache.load()
+        self.ncdc_controller = async_controllers.GetNearbyStationsAsyncController(
+            ncdc_api.load_token(), self.ncdc_cache
+        )
+        self.frost_dates_controller = async_controllers.GetFrostDatesAsyncController(
+            self.ncdc_controller.token, self.ncdc_cache
+        )
+        self.prefetch_controller = async_controllers.PrefetchController(
+            self.ncdc_controller.token, self.ncdc_cache, self.ncdc_controller.stations
         )
         self.current_location = LocationCoordinates(latitude="41.318581", longitude="-96.346288")
         self.current_station_id: str = ''
+        self.station_request_id = 0  # the station search whose results are wanted
+        self.shown_station_request_id = 0  # the station search in the list
+        self.zip_code_request_id = 0  # the ZIP code lookup whose error is wanted
+        self.frost_dates_request_id = 0
+        self.reported_frost_dates_request_id = 0  # the last frost dates error shown
         self.main_window = MainWindow()
         self.zip_code_search_page = self.main_window.zip_code_search_widget
         self.select_weather_station_page = self.main_window.select_weather_station_widget
+        self.select_weather_station_page.station_model.set_origin(self.current_location,
+                                                                  'miles')
         self.frost_dates_page = self.main_window.frost_dates_widget
         self.zip_data = zip_data.load()
-        self.main_window.on_close = lambda: zip_data.save(self.zip_data)
+        self.zip_code_search_page.zip_code_model.restore(self.zip_data)
+        self.gazetteer = gazetteer.load()
+        self.station_catalog = station_catalog.load()
+        self.main_window.on_close = self.close_data_files
         self.set_up_signals_and_slots()
+        self.set_up_metrics()
 
     def show(self) -> None:
         """Show the main window to the user."""
         self.main_window.show()
         self.main_window.setFixedSize(self.main_window.size())
 
+    def close_data_files(self) -> None:
+        """Close the program cache files.
+
+        The requests still running use the response cache and the rate
+        limiters, so they are cancelled and waited for first.
+        """
+        self.prefetch_controller.clear()
+        for controller in (self.geonames_controller, self.ncdc_controller,
+                           self.frost_dates_controller):
+            controller.cancelAll()
+        async_controllers.thread_pool().waitForDone()
+        self.zip_data.close()
+        self.zip_code_search_page.zip_code_model.close()
+        self.ncdc_cache.close()
+        rate_limiter.uninstall_all()
+
+    def set_up_metrics(self) -> None:
+        """Show a summary of the metrics in the status bar, if they are enabled."""
+        if not metrics.enabled():
+            return
+        self.main_window.metrics_label.setVisible(True)
+        self.metrics_timer = QTimer()
+        self.metrics_timer.timeout.connect(
+            lambda: self.main_window.metrics_label.setText(metrics.format_summary())
+        )
+        self.metrics_timer.start(METRICS_REFRESH_INTERVAL)
+
     def set_up_signals_and_slots(self) -> None:
         """Set up the signals and slots for the program."""
         self.zip_code_search_page.close_button.clicked.connect(self.main_window.close)
@@ -50,22 +105,30 @@ class MainController:
         self.geonames_controller.result_ready.connect(
             lambda: self.main_window.status_bar.showMessage("Request successful.")
         )
-        self.geonames_controller.error_raised.connect(
-            lambda: self.main_window.status_bar.showMessage("Error occurred while making request.")
-        )
-        self.geonames_controller.error_raised.connect(
-            lambda message: QMessageBox.warning(self.main_window, "Error", message)
-        )
+        self.geonames_controller.error_raised.connect(self.zip_code_error)
         self.geonames_controller.finished.connect(
             lambda: self.zip_code_search_page.search_button.setEnabled(True)
         )
-        self.geonames_controller.result_ready.connect(lambda result: self.set_zip_data(result))
-        self.geonames_controller.result_ready.connect(lambda result: self.add_zip_code_item(**result))
-        self.zip_code_search_page.zip_code_list.itemSelectionChanged.connect(
+        self.geonames_controller.result_ready.connect(
+            lambda request_id, result: self.set_zip_data(result)
+        )
+        self.geonames_controller.result_ready.connect(
+            lambda request_id, result: self.add_zip_code_item(**result)
+        )
+        self.zip_code_search_page.zip_code_model.modelReset.connect(
+            lambda: self.zip_code_search_page.next_button.setEnabled(False)
+        )
+        self.zip_code_search_page.clear_history_button.clicked.connect(
+            self.zip_code_search_page.zip_code_model.delete_history
+        )
+        self.zip_code_search_page.zip_code_list.selectionModel().selectionChanged.connect(
             lambda: self.zip_code_search_page.next_button.setEnabled(
-                bool(self.zip_code_search_page.zip_code_list.selectedItems())
+                self.zip_code_search_page.zip_code_list.selectionModel().hasSelection()
             )
         )
+        self.zip_code_search_page.zip_code_list.selectionModel().selectionChanged.connect(
+            self.prefetch_weather_stations
+        )
         self.zip_code_search_page.next_button.clicked.connect(
             lambda: self.main_window.stacked_layout.setCurrentIndex(1)
         )
@@ -78,32 +141,35 @@ class MainController:
         self.select_weather_station_page.search_button.clicked.connect(
             lambda: self.select_weather_station_page.search_button.setEnabled(False)
         )
-        self.select_weather_station_page.search_button.clicked.connect(
-            self.select_weather_station_page.station_list.clear
-        )
         self.select_weather_station_page.search_button.clicked.connect(
             self.search_weather_stations
         )
-        self.ncdc_controller.result_ready.connect(
-            lambda result: self.add_weather_stations(result)
-        )
+        self.ncdc_controller.batch_ready.connect(self.add_weather_station_batch)
+        self.ncdc_controller.error_raised.connect(self.weather_station_error)
         self.ncdc_controller.finished.connect(
             lambda: self.select_weather_station_page.search_button.setEnabled(True)
         )
-        self.select_weather_station_page.station_list.itemSelectionChanged.connect(
+        self.select_weather_station_page.station_list.selectionModel().selectionChanged.connect(
             lambda: self.select_weather_station_page.next_button.setEnabled(
-                bool(self.select_weather_station_page.station_list.selectedItems())
+                self.select_weather_station_page.station_list.selectionModel().hasSelection()
             )
         )
         self.zip_code_search_page.next_button.clicked.connect(
             self.set_current_location
         )
         self.zip_code_search_page.next_button.clicked.connect(
-            self.select_weather_station_page.station_list.clear
+            self.cancel_weather_station_search
         )
-        self.select_weather_station_page.station_list.itemSelectionChanged.connect(
+        self.zip_code_search_page.next_button.clicked.connect(
+            self.clear_weather_stations
+        )
+        self.select_weather_station_page.station_list.selectionModel().selectionChanged.connect(
             self.set_current_station_id
         )
+        self.select_weather_station_page.station_list.selectionModel().selectionChanged.connect(
+            lambda: self.prefetch_controller.prefetchFrostDates(self.current_station_id)
+            if self.current_station_id else None
+        )
         self.select_weather_station_page.next_button.clicked.connect(
             lambda: self.main_window.stacked_layout.setCurrentIndex(2)
         )
@@ -111,7 +177,7 @@ class MainController:
             lambda: self.zip_code_search_page.zip_code_edit.clear()
         )
         self.frost_dates_page.restart_button.clicked.connect(
-            lambda: self.zip_code_search_page.zip_code_list.clear()
+            lambda: self.zip_code_search_page.zip_code_model.clear()
         )
         self.frost_dates_page.restart_button.clicked.connect(
             lambda: self.main_window.stacked_layout.setCurrentIndex(0)
@@ -125,6 +191,16 @@ class MainController:
         self.select_weather_station_page.next_button.clicked.connect(
             self.add_frost_dates
         )
+        self.frost_dates_controller.result_ready.connect(
+            lambda: self.main_window.status_bar.showMessage("Request successful.")
+        )
+        self.frost_dates_controller.result_ready.connect(
+            lambda request_id, kind, frost_dates: (
+                self.set_frost_dates(kind, frost_dates)
+                if request_id == self.frost_dates_request_id else None
+            )
+        )
+        self.frost_dates_controller.error_raised.connect(self.frost_dates_error)
 
     def submit_zip_code(self) -> None:
         """Submit the ZIP code displayed in the ZIP code line edit."""
@@ -139,9 +215,8 @@ class MainController:
             )
             self.zip_code_search_page.search_button.setEnabled(True)
             return
-        if self.zip_code_search_page.zip_code_list.findItems(
-                zipcode, Qt.MatchFlag.MatchExactly
-                ):
+        if zipcode in self.zip_code_search_page.zip_code_model:
+            self.select_zip_code(zipcode)
             self.main_window.status_bar.showMessage(f"Duplicate request for {zipcode}.")
             self.zip_code_search_page.search_button.setEnabled(True)
             return
@@ -154,8 +229,26 @@ class MainController:
             self.zip_code_search_page.search_button.setEnabled(True)
             return
         except KeyError:
-            self.main_window.status_bar.showMessage("Requesting ZIP code data ...")
-            self.geonames_controller.sendRequest(zipcode)
+            pass
+        zipcode_result = self.gazetteer.get(zipcode) if self.gazetteer else None
+        if zipcode_result:
+            self.set_zip_data(zipcode_result)
+            self.add_zip_code_item(**zipcode_result)
+            self.main_window.status_bar.showMessage(
+                "Data loaded from gazetteer."
+            )
+            self.zip_code_search_page.search_button.setEnabled(True)
+            return
+        self.main_window.status_bar.showMessage("Requesting ZIP code data ...")
+        self.zip_code_request_id = self.geonames_controller.sendRequest(zipcode)
+
+    def zip_code_error(self, request_id: int, message: str) -> None:
+        """Show the error of the latest ZIP code lookup once."""
+        if request_id != self.zip_code_request_id:
+            return
+        self.zip_code_request_id = 0
+        self.main_window.status_bar.showMessage("Error occurred while making request.")
+        QMessageBox.warning(self.main_window, "Error", message)
 
     def set_zip_data(self, zip_entry: dict[str, Any]) -> None:
         """Set the program data for the ZIP entry."""
@@ -164,76 +257,171 @@ class MainController:
 
     def add_zip_code_item(self, *, zipcode: str, latitude: Any, longitude: Any,
                           city: str) -> None:
-        """Add a ZIP code item to the list."""
-        zip_item = QTreeWidgetItem(None, [zipcode])
-        QTreeWidgetItem(zip_item, ["Latitude:", str(latitude)])
-        QTreeWidgetItem(zip_item, ["Longitude:", str(longitude)])
-        QTreeWidgetItem(zip_item, ["City:", city])
-        self.zip_code_search_page.zip_code_list.addTopLevelItem(zip_item)
-        zip_item.setFirstColumnSpanned(True)
-        zip_item.setExpanded(True)
+        """Add a ZIP code item to the top of the list."""
+        model = self.zip_code_search_page.zip_code_model
+        model.add({"zipcode": zipcode, "latitude": latitude, "longitude": longitude,
+                   "city": city})
+        self.zip_code_search_page.zip_code_list.expand(model.index(0, 0))
+
+    def select_zip_code(self, zipcode: str) -> None:
+        """Select a ZIP code in the list and scroll to it.
+
+        Rows the view has not fetched yet, e.g. from an earlier session,
+        are fetched first.
+        """
+        model = self.zip_code_search_page.zip_code_model
+        index = model.index(model.reveal(zipcode), 0)
+        self.zip_code_search_page.zip_code_list.setCurrentIndex(index)
+        self.zip_code_search_page.zip_code_list.scrollTo(index)
+
+    def selected_zip_entry(self) -> dict[str, Any] | None:
+        """Get the entry of the selected ZIP code, if one is selected."""
+        indexes = self.zip_code_search_page.zip_code_list.selectionModel().selectedIndexes()
+        if not indexes:
+            return None
+        selected = indexes[0]
+        if selected.parent().isValid():
+            selected = selected.parent()
+        return self.zip_code_search_page.zip_code_model.entry(selected.row())
 
     def set_current_location(self) -> None:
         """Set the current location to the selected ZIP code."""
-        selected = self.zip_code_search_page.zip_code_list.selectedItems()[0]
-        if isinstance(selected.parent(), QTreeWidgetItem):
-            selected = selected.parent()
-        zip_code = selected.text(0)
+        zip_entry = self.selected_zip_entry()
         self.current_location = LocationCoordinates(
-            latitude=self.zip_data[zip_code]["latitude"],
-            longitude=self.zip_data[zip_code]["longitude"]
+            latitude=zip_entry["latitude"],
+            longitude=zip_entry["longitude"]
         )
+        self.select_weather_station_page.station_model.set_origin(self.current_location,
+                                                                  'miles')
+
+    def prefetch_weather_stations(self) -> None:
+        """Start fetching the stations near the selected ZIP code before Next is clicked."""
+        zip_entry = self.selected_zip_entry()
+        if zip_entry is None or self.station_catalog:
+            return
+        location = LocationCoordinates(latitude=zip_entry["latitude"],
+                                       longitude=zip_entry["longitude"])
+        radius = self.select_weather_station_page.search_radius.value()
+        self.prefetch_controller.prefetchStations(location, radius, 'miles')
 
     def search_weather_stations(self) -> None:
         """Search for weather stations near the current location."""
         radius = self.select_weather_station_page.search_radius.value()
-        self.ncdc_controller.sendRequest(self.current_location, radius, 'miles')
+        if self.station_catalog:
+            stations = self.station_catalog.near(self.current_location, radius, 'miles')
+            self.clear_weather_stations()
+            self.add_weather_stations(stations)
+            self.main_window.status_bar.showMessage("Stations loaded from catalog.")
+            self.select_weather_station_page.search_button.setEnabled(True)
+            return
+        self.station_request_id = self.ncdc_controller.sendRequest(
+            self.current_location, radius, 'miles'
+        )
+
+    def clear_weather_stations(self) -> None:
+        """Remove all weather stations from the list."""
+        self.select_weather_station_page.station_model.clear()
+        self.select_weather_station_page.next_button.setEnabled(False)
+        self.shown_station_request_id = 0
+
+    def cancel_weather_station_search(self) -> None:
+        """Cancel the station search in flight, if any."""
+        self.station_request_id = 0
+        if self.ncdc_controller.pendingRequests():
+            self.ncdc_controller.cancelAll()
+            self.select_weather_station_page.search_button.setEnabled(True)
+
+    def add_weather_station_batch(self, request_id: int,
+                                  stations: list[ncdc_api.StationInfo]) -> None:
+        """Add a page of stations from a station search.
+
+        The list is replaced when the first page of a new search arrives,
+        so the old results stay visible until then. Pages from searches
+        that have been superseded are ignored.
+        """
+        if request_id != self.station_request_id:
+            return
+        if request_id != self.shown_station_request_id:
+            self.clear_weather_stations()
+            self.shown_station_request_id = request_id
+        self.add_weather_stations(stations)
+
+    def weather_station_error(self, request_id: int, message: str) -> None:
+        """Clear the results of a station search that failed."""
+        if request_id != self.station_request_id:
+            return
+        self.clear_weather_stations()
+        self.shown_station_request_id = request_id
+        self.main_window.status_bar.showMessage(message)
 
     def add_weather_stations(self, stations: list[ncdc_api.StationInfo]) -> None:
         """Add a list of weather stations.
 
+        The model inserts the stations so the list stays sorted from
+        nearest to farthest, which lets pages of stations be added as
+        they arrive.
+
         Args:
             stations: A list of stations to add to the list.
         """
-        self.select_weather_station_page.station_list.clear()
-        self.select_weather_station_page.next_button.setEnabled(False)
-        stations.sort(key=lambda s: self.current_location.distance_from(s.location, 'miles'))
-        for station in stations:
-            item = QTreeWidgetItem(None, [station.name])
-            QTreeWidgetItem(item, ["ID:", station.id])
-            QTreeWidgetItem(item, ["Latitude:", str(station.location.latitude)])
-            QTreeWidgetItem(item, ["Longitude:", str(station.location.longitude)])
-            distance = self.current_location.distance_from(station.location, 'miles')
-            QTreeWidgetItem(item, ["Distance:", f"{distance:.1f} miles"])
-            self.select_weather_station_page.station_list.addTopLevelItem(item)
-            item.setFirstColumnSpanned(True)
+        model = self.select_weather_station_page.station_model
+        with metrics.timer("ui.add_weather_stations"):
+            model.add_stations(stations)
+        if model.rowCount():
+            # the nearest station is the usual pick
+            self.prefetch_controller.prefetchFrostDates(model.station_id(0))
 
     def set_current_station_id(self) -> None:
         """Set the current station ID to the selected station."""
-        items = self.select_weather_station_page.station_list.selectedItems()
-        if not items:
+        indexes = self.select_weather_station_page.station_list.selectionModel().selectedIndexes()
+        if not indexes:
             self.current_station_id = ''
             return
-        selected = items[0]
-        if isinstance(selected.parent(), QTreeWidgetItem):
+        selected = indexes[0]
+        if selected.parent().isValid():
             selected = selected.parent()
-        station_id = selected.child(0).text(1)
-        self.current_station_id = station_id
+        model = self.select_weather_station_page.station_model
+        self.current_station_id = model.station_id(selected.row())
 
     def add_frost_dates(self) -> None:
-        """Add frost dates to the frost dates page."""
-        frost_dates = ncdc_api.get_frost_dates(self.ncdc_controller.token, self.current_station_id, 'first')
-        frost_date_keys = ncdc_api.FrostDateDataTypesIterable('first')
-        for key in frost_date_keys:
-            row = (frost_date_keys.temperature - 16) // 4
-            column = frost_date_keys.percent_probability // 10
-            item = QTableWidgetItem(frost_dates[key])
-            self.frost_dates_page.fall_frost_dates_table.setItem(row, column, item)
-
-        frost_dates = ncdc_api.get_frost_dates(self.ncdc_controller.token, self.current_station_id, 'last')
-        frost_date_keys = ncdc_api.FrostDateDataTypesIterable('last')
-        for key in frost_date_keys:
-            row = (frost_date_keys.temperature - 16) // 4
-            column = frost_date_keys.percent_probability // 10
-            item = QTableWidgetItem(frost_dates[key])
-            self.frost_dates_page.spring_frost_dates_table.setItem(row, column, item)
+        """Request frost dates for the frost dates page."""
+        with metrics.timer("ui.add_frost_dates"):
+            for table in (self.frost_dates_page.fall_frost_dates_table,
+                          self.frost_dates_page.spring_frost_dates_table):
+                for row in range(table.rowCount()):
+                    for column in range(1, table.columnCount()):
+                        table.setItem(row, column, QTableWidgetItem())
+        self.main_window.status_bar.showMessage("Requesting frost dates ...")
+        self.frost_dates_request_id = self.frost_dates_controller.sendRequest(
+            self.current_station_id
+        )
+
+    def frost_dates_error(self, request_id: int, message: str) -> None:
+        """Show the error of the latest frost dates request once.
+
+        The first and last frost dates are requested separately, so both
+        can fail for the same request.
+        """
+        if request_id != self.frost_dates_request_id \
+                or request_id == self.reported_frost_dates_request_id:
+            return
+        self.reported_frost_dates_request_id = request_id
+        self.main_window.status_bar.showMessage("Error occurred while making request.")
+        QMessageBox.warning(self.main_window, "Error", message)
+
+    def set_frost_dates(self, kind: str, frost_dates: ncdc_api.FrostDateMatrix) -> None:
+        """Add frost dates to the frost dates page.
+
+        Args:
+            kind: The kind of frost dates. Either first or last.
+            frost_dates: The frost dates by temperature and probability.
+        """
+        if kind == 'first':
+            table = self.frost_dates_page.fall_frost_dates_table
+        else:
+            table = self.frost_dates_page.spring_frost_dates_table
+        with metrics.timer("ui.set_frost_dates"):
+            for row in range(len(ncdc_api.FROST_TEMPERATURES)):
+                for column in range(len(ncdc_api.FROST_PROBABILITIES)):
+                    item = QTableWidgetItem(frost_dates.short_date(row, column))
+                    table.setItem(row, column + 1, item)  # column 0 is the temperature
@@ -0,0 +1,74 @@
+import csv
+import io
+import sys
+import zipfile
+from typing import Any, Iterator
+
+import zip_index
+
+
+# https://download.geonames.org/export/zip/readme.txt
+DUMP_FIELDS = ["country code", "postal code", "place name",
+               "admin name1", "admin code1", "admin name2", "admin code2",
+               "admin name3", "admin code3", "latitude", "longitude",
+               "accuracy"]
+
+
+def read_dump(filename: str) -> Iterator[dict[str, Any]]:
+    """Read ZIP code records from a GeoNames postal code dump.
+
+    The dump can be downloaded from https://download.geonames.org/export/zip/
+    and may be either the US.zip archive or the extracted US.txt file.
+
+    Args:
+        filename: The name of the dump file.
+    Returns:
+        An iterator over records in the program cache format.
+    """
+    if zipfile.is_zipfile(filename):
+        with zipfile.ZipFile(filename) as archive:
+            member = next(name for name in archive.namelist()
+                          if name.endswith(".txt") and name != "readme.txt")
+            with archive.open(member) as fh:
+                yield from _read_rows(io.TextIOWrapper(fh, encoding="utf-8"))
+    else:
+        with open(filename, "r", encoding="utf-8", newline="") as fh:
+            yield from _read_rows(fh)
+
+
+def _read_rows(fh) -> Iterator[dict[str, Any]]:
+    reader = csv.DictReader(fh, DUMP_FIELDS, delimiter="\t",
+                            quoting=csv.QUOTE_NONE)
+    for row in reader:
+        if row["country code"] != "US":
+            continue
+        yield {"zipcode": row["postal code"],
+               "latitude": float(row["latitude"]),
+               "longitude": float(row["longitude"]),
+               "city": f'{row["place name"]}, {row["admin code1"]}'}
+
+
+def build(dump_filename: str, filename: str = "gazetteer.dat") -> int:
+    """Build the gazetteer from a GeoNames postal code dump.
+
+    Returns:
+        The number of ZIP codes in the gazetteer.
+    """
+    return zip_index.write(read_dump(dump_filename), filename)
+
+
+def load(filename: str = "gazetteer.dat") -> zip_index.ZipIndex | None:
+    """Open the gazetteer if it has been built."""
+    return zip_index.load(filename)
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python gazetteer.py US.zip")
+        sys.exit(2)
+    count = build(sys.argv[1])
+    print(f"Wrote {count} ZIP codes to gazetteer.dat")
+
+
+if __name__ == "__main__":
+    main()
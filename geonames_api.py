@@ -1,7 +1,19 @@
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Any, Callable, Container, Iterable, Iterator
 
-import requests
-from PyQt5.QtCore import QThread, QObject, pyqtSignal
+import http_client
+import metrics
+import rate_limiter
+
+if TYPE_CHECKING:
+    import aio_client
+
+
+GEONAMES_URL = "https://secure.geonames.org"
+ZIPCODE_SEARCH_CREDITS = 2  # maxRows <= 500 uses 2 credits per request
+DAILY_LIMIT_EXCEEDED = 18   # GeoNames status codes
+HOURLY_LIMIT_EXCEEDED = 19
+WEEKLY_LIMIT_EXCEEDED = 20
 
 
 def get_zipcode_location(username: str, zipcode: str) -> dict[str, Any]:
@@ -16,19 +28,70 @@ def get_zipcode_location(username: str, zipcode: str) -> dict[str, Any]:
     Returns:
         The coordinates associated with the zip code.
     """
-    payload = {                 # maxRows <= 500 uses 2 credits per request
+    limiter = rate_limiter.get(rate_limiter.GEONAMES)
+    with metrics.timer("geonames.postalCodeSearch"):
+        r = http_client.get(f"{GEONAMES_URL}/postalCodeSearchJSON",
+                            params=zipcode_payload(username, zipcode),
+                            limiter=limiter, cost=ZIPCODE_SEARCH_CREDITS)
+    return parse_zipcode_response(r, zipcode, limiter)
+
+
+async def get_zipcode_location_async(username: str, zipcode: str,
+                                     client: "aio_client.AsyncClient | None" = None
+                                     ) -> dict[str, Any]:
+    """Get the ZIP code location without blocking the event loop.
+
+    Works like get_zipcode_location(), but sends the request with an
+    asyncio client.
+
+    Args:
+        username: The username to use for the application.
+        zipcode: The US postal code to use for the search.
+        client: The client to send the request with. Uses the shared
+                client for the running event loop if not given.
+    Returns:
+        The coordinates associated with the zip code.
+    """
+    import aio_client  # imports asyncio and ssl, which only async callers need
+
+    client = client or aio_client.get_client()
+    limiter = rate_limiter.get(rate_limiter.GEONAMES)
+    with metrics.timer("geonames.postalCodeSearch"):
+        r = await client.get(f"{GEONAMES_URL}/postalCodeSearchJSON",
+                             params=zipcode_payload(username, zipcode),
+                             limiter=limiter, cost=ZIPCODE_SEARCH_CREDITS)
+    return parse_zipcode_response(r, zipcode, limiter)
+
+
+def zipcode_payload(username: str, zipcode: str) -> dict[str, Any]:
+    """Get the URL parameters for a ZIP code search."""
+    return {
         "postalcode": zipcode,  # ZIP codes are exclusive to US
         "country": "US",        # restrict results to US
         "maxRows": 1,           # assume first row is correct latitude and longitude
         "username": username    # username should be unique to application
     }
-    r = requests.get("https://secure.geonames.org/postalCodeSearchJSON", params=payload)
+
+
+def parse_zipcode_response(r, zipcode: str,
+                           limiter: "rate_limiter.RateLimiter | None" = None
+                           ) -> dict[str, Any]:
+    """Get the ZIP code location from a postalCodeSearchJSON response.
+
+    GeoNames reports used up credits as an error status, so the limiter,
+    if given, is told to stop or slow down.
+    """
     try:
         response = r.json()
-        if not r.ok:
+        if not r.ok or "status" in response:
             if response:
                 error_message = response["status"]["message"]
                 error_code = response["status"]["value"]
+                if limiter is not None and error_code == DAILY_LIMIT_EXCEEDED:
+                    limiter.exhaust()
+                elif limiter is not None and error_code in (HOURLY_LIMIT_EXCEEDED,
+                                                            WEEKLY_LIMIT_EXCEEDED):
+                    limiter.throttled()
                 raise RuntimeError(f"GeoNames Webservice Exception ({error_code}): {error_message}")
             else:
                 r.raise_for_status()
@@ -40,96 +103,67 @@ def get_zipcode_location(username: str, zipcode: str) -> dict[str, Any]:
                 "latitude": result["lat"],
                 "longitude": result["lng"],
                 "city": f'{result["placeName"]}, {result["ISO3166-2"]}'}
-    except requests.exceptions.JSONDecodeError:
+    except ValueError:  # requests.exceptions.JSONDecodeError
         raise RuntimeError("Unable to parse JSON")
 
 
-def load_username() -> str:
-    """Load the GeoNames username from the file geonames.txt."""
-    with open("geonames.txt", "r") as fh:
-        return fh.read().strip()
-
+def get_zipcode_locations(username: str, zipcodes: Iterable[str], *,
+                          known: Container[str] = (), max_workers: int = 8,
+                          on_error: Callable[[str, RuntimeError], Any] | None = None
+                          ) -> Iterator[dict[str, Any]]:
+    """Get the locations of many ZIP codes concurrently.
 
-class GetZIPCodeAsyncController(QObject):
-    """Send the ZIP code request asynchronously.
+    Each ZIP code is requested at most once. ZIP codes that are already
+    in known (e.g. the program cache) are skipped. Results are yielded
+    in the order the requests complete, using the same format as
+    get_zipcode_location() so they can be stored in the program cache.
 
-    Asynchronous requests require the use of a worker object and worker
-    thread. The purpose of this AsyncController is to bundle these two
-    objects together and only expose some signals from the worker. The
-    worker and worker thread do not exist until sendRequest() is called
-    and are destroyed thereafter. This is why the AsyncController has
-    its own signals to use instead of allowing access to the worker's
-    signals.
+    Args:
+        username: The username to use for the application.
+        zipcodes: The US postal codes to use for the search.
+        known: ZIP codes that do not need to be requested.
+        max_workers: The maximum number of requests in flight.
+        on_error: Called with the ZIP code and error when a request
+                  fails. If not given, the error is raised.
+    Returns:
+        An iterator over the coordinates associated with each ZIP code.
     """
-    result_ready = pyqtSignal(dict)
-    error_raised = pyqtSignal(str)
-    finished = pyqtSignal()
-
-    def __init__(self, username: str) -> None:
-        """Initialize the AsyncController.
-
-        The worker and worker thread need to be class instance
-        variables otherwise they will be deleted before processing.
-        """
-        super().__init__()
-        self.username = username
-        self._worker = None
-        self._worker_thread = None
-
-    def sendRequest(self, zipcode: str) -> None:
-        """Start up a thread to send the request.
-
-        Connection chain adapted from blog and official documentation.
-
-        https://doc.qt.io/qt-5/qthread.html
-
-        https://mayaposch.wordpress.com/2011/11/01/how-to-really-truly-use-qthreads-the-full-explanation/
-
-        A lot of PyQt QThread examples use a subclass then call
-        QThread.terminate() and QThread.wait() for cleanup, but this is
-        discouraged for a variety of reasons.
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+    pending = {}
+    requested = set()
+    zipcodes = iter(zipcodes)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit_next() -> None:
+            """Submit the next new ZIP code, if there is one."""
+            for zipcode in zipcodes:
+                zipcode = zipcode.strip()
+                if not zipcode or zipcode in requested or zipcode in known:
+                    continue
+                requested.add(zipcode)
+                future = executor.submit(get_zipcode_location, username, zipcode)
+                pending[future] = zipcode
+                return
+
+        # keep a bounded number of requests queued so large inputs stream
+        for _ in range(max_workers * 2):
+            submit_next()
+        while pending:
+            future = next(as_completed(pending))
+            zipcode = pending.pop(future)
+            submit_next()
+            try:
+                yield future.result()
+            except RuntimeError as error:
+                if on_error is None:
+                    raise
+                on_error(zipcode, error)
 
-        https://www.vikingsoftware.com/blog/how-to-use-qthread-properly/
 
-        https://www.qt.io/blog/2010/06/17/youre-doing-it-wrong
-        """
-        self._worker_thread = QThread()
-        self._worker = _GetZIPCodeAsyncWorker(self.username, zipcode)
-        self._worker.moveToThread(self._worker_thread)
-        self._worker_thread.started.connect(self._worker.doWork)
-        self._worker.finished.connect(self._worker_thread.quit)
-        self._worker.finished.connect(self._worker.deleteLater)
-        self._worker_thread.finished.connect(self._worker_thread.deleteLater)
-
-        self._worker.result_ready.connect(self.result_ready)
-        self._worker.error_raised.connect(self.error_raised)
-        self._worker.finished.connect(self.finished)
-
-        self._worker_thread.start()
-
-
-class _GetZIPCodeAsyncWorker(QObject):
-    """Worker to perform asynchronous ZIP code info retrieval."""
-    result_ready = pyqtSignal(dict)
-    error_raised = pyqtSignal(str)
-    finished = pyqtSignal()
-
-    def __init__(self, geonames_username: str, zipcode: str) -> None:
-        super().__init__()
-        self.geonames_username = geonames_username
-        self.zipcode = zipcode
-
-    def doWork(self) -> None:
-        try:
-            result = get_zipcode_location(
-                username=self.geonames_username,
-                zipcode=self.zipcode
-            )
-            self.result_ready.emit(result)
-        except RuntimeError as error:
-            self.error_raised.emit(str(error))
-        finally:
-            self.finished.emit()
+def load_username() -> str:
+    """Load the GeoNames username from the file geonames.txt."""
+    with open("geonames.txt", "r") as fh:
+        return fh.read().strip()
 
 
 def main():
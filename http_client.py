@@ -0,0 +1,149 @@
+import threading
+import time
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import requests
+
+    from rate_limiter import RateLimiter
+
+# requests is imported when the first session is created, since importing
+# it takes longer than importing everything else in the core modules.
+
+
+DEFAULT_TIMEOUT = (3.05, 30.0)  # seconds to connect, seconds to read
+POOL_CONNECTIONS = 4            # number of hosts to keep connection pools for
+POOL_MAXSIZE = 8                # connections kept open per host
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.5      # sleeps 0.5s, 1s, 2s, ... between retries
+RETRY_STATUSES = (500, 502, 503, 504)
+THROTTLED_STATUS = 429          # retried here rather than by urllib3, see get()
+
+_session: "requests.Session | None" = None
+_timeout: tuple[float, float] = DEFAULT_TIMEOUT
+_retries = RETRY_TOTAL
+_backoff_factor = RETRY_BACKOFF_FACTOR
+_lock = threading.Lock()
+
+
+def configure(*, pool_maxsize: int = POOL_MAXSIZE,
+              retries: int = RETRY_TOTAL,
+              backoff_factor: float = RETRY_BACKOFF_FACTOR,
+              timeout: tuple[float, float] = DEFAULT_TIMEOUT) -> None:
+    """Configure the shared session used for all web service requests.
+
+    Args:
+        pool_maxsize: The maximum number of connections per host. Requests
+                      beyond this limit wait for a free connection.
+        retries: The number of times to retry a failed request.
+        backoff_factor: The base delay between retries. The delay doubles
+                        after each retry.
+        timeout: The connect and read timeouts in seconds.
+    """
+    global _session, _timeout, _retries, _backoff_factor
+    session = _create_session(pool_maxsize, retries, backoff_factor)
+    with _lock:
+        old_session, _session, _timeout = _session, session, timeout
+        _retries, _backoff_factor = retries, backoff_factor
+    if old_session is not None:
+        old_session.close()
+
+
+def get_session() -> "requests.Session":
+    """Get the shared session, creating it on first use."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _create_session(POOL_MAXSIZE, RETRY_TOTAL,
+                                       RETRY_BACKOFF_FACTOR)
+        return _session
+
+
+def get(url: str, *, params: dict[str, Any] | None = None,
+        headers: dict[str, str] | None = None,
+        timeout: tuple[float, float] | None = None,
+        limiter: "RateLimiter | None" = None, cost: float = 1) -> "requests.Response":
+    """Send a GET request using the shared session.
+
+    Connections are kept alive and reused between requests to the same
+    host. Failed requests are retried with exponential backoff.
+
+    Throttled requests (status 429) are retried here so the limiter,
+    if one is given, can slow down for the service. Without a limiter
+    the Retry-After header or the usual backoff is waited out instead.
+
+    Args:
+        url: The URL to request.
+        params: The URL parameters to send.
+        headers: The HTTP headers to send.
+        timeout: The connect and read timeouts in seconds. Uses the
+                 configured timeout if not given.
+        limiter: The rate limiter of the service, if any.
+        cost: The tokens the request spends from the limiter.
+    Returns:
+        The response to the request.
+    """
+    import requests
+
+    session = get_session()
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire(cost)
+        try:
+            r = session.get(url, params=params, headers=headers,
+                            timeout=timeout or _timeout)
+        except requests.exceptions.RequestException as error:
+            raise RuntimeError(f"Request failed: {error}")
+        if r.status_code != THROTTLED_STATUS:
+            if limiter is not None and r.status_code < 400:
+                limiter.succeeded()
+            return r
+        if attempt >= _retries:
+            return r
+        delay = retry_after(r.headers.get("Retry-After"))
+        if limiter is not None:
+            limiter.throttled(delay)
+        else:
+            time.sleep(delay if delay is not None else _backoff_factor * 2 ** attempt)
+        attempt += 1
+
+
+def retry_after(value: str | None) -> float | None:
+    """Get the seconds to wait from a Retry-After header, if it has any."""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None  # missing, or an HTTP date, which the services do not send
+
+
+def close() -> None:
+    """Close the shared session and all of its connections."""
+    global _session
+    with _lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+def _create_session(pool_maxsize: int, retries: int,
+                    backoff_factor: float) -> "requests.Session":
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False  # let the caller report the service error
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                          pool_maxsize=pool_maxsize,
+                          max_retries=retry,
+                          pool_block=True)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -0,0 +1,357 @@
+import bisect
+import os
+from array import array
+from collections.abc import Mapping
+from typing import Any, Iterable, Literal, TextIO
+
+from PyQt5.QtCore import QAbstractItemModel, QModelIndex, QObject, Qt
+
+from location_coordinates import LocationCoordinates
+from ncdc_api import StationArray, StationInfo
+
+
+class StationListModel(QAbstractItemModel):
+    """Weather stations shown as a tree, one top-level row per station.
+
+    A station row shows the name and distance of the station, and it
+    has four child rows with its ID, latitude, longitude
+    and distance. Nothing is created for the child rows: the view asks
+    for their data when a station is expanded and it is read from the
+    stations, so memory use does not depend on the rows shown.
+
+    The stations are kept in a StationArray and the model keeps a list
+    of their positions sorted by the sort key (distance by default).
+    Pages of stations are inserted where they belong in the order,
+    with one insert notification for each run of adjacent rows.
+    """
+    SORT_BY_NAME = 0
+    SORT_BY_DISTANCE = 1
+    CHILD_LABELS = ("ID:", "Latitude:", "Longitude:", "Distance:")
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self.origin: LocationCoordinates | None = None
+        self.unit: Literal['miles', 'km'] = 'miles'
+        self._stations = StationArray()
+        self._distances = array('d')
+        self._sort_column = self.SORT_BY_DISTANCE
+        self._sort_order = Qt.SortOrder.AscendingOrder
+        self._order: list[int] = []  # station positions sorted by key, ascending
+        self._keys: list[Any] = []   # the sort key of each station in _order
+
+    def set_origin(self, origin: LocationCoordinates,
+                   unit: Literal['miles', 'km'] = 'miles') -> None:
+        """Set the location distances are measured from and remove the stations."""
+        self.origin = origin
+        self.unit = unit
+        self.clear()
+
+    def clear(self) -> None:
+        """Remove every station."""
+        self.beginResetModel()
+        self._stations = StationArray()
+        self._distances = array('d')
+        self._order.clear()
+        self._keys.clear()
+        self.endResetModel()
+
+    def add_stations(self, stations: Iterable[StationInfo]) -> None:
+        """Insert stations into the list in sort order."""
+        if self.origin is None:
+            raise RuntimeError("The origin must be set before adding stations")
+        new = StationArray(stations)
+        if not new:
+            return
+        start = len(self._stations)
+        self._stations.extend(new)
+        self._distances.extend(new.distances_from(self.origin, self.unit))
+        items = sorted((self._key(position), position)
+                       for position in range(start, len(self._stations)))
+        # group the new stations by where they go in the current order
+        runs: list[tuple[int, list[tuple[Any, int]]]] = []
+        for key, position in items:
+            at = bisect.bisect_right(self._keys, key)
+            if runs and runs[-1][0] == at:
+                runs[-1][1].append((key, position))
+            else:
+                runs.append((at, [(key, position)]))
+        # insert the last run first, so the earlier insert points stay put
+        for at, run in reversed(runs):
+            size = len(self._order) + len(run)
+            if self._ascending():
+                first = at
+            else:
+                first = size - at - len(run)
+            self.beginInsertRows(QModelIndex(), first, first + len(run) - 1)
+            self._keys[at:at] = [key for key, _ in run]
+            self._order[at:at] = [position for _, position in run]
+            self.endInsertRows()
+
+    def station(self, row: int) -> StationInfo:
+        return self._stations[self._order[self._position(row)]]
+
+    def station_id(self, row: int) -> str:
+        return self._stations.id(self._order[self._position(row)])
+
+    def distance(self, row: int) -> float:
+        return self._distances[self._order[self._position(row)]]
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.SortOrder.AscendingOrder) -> None:
+        """Sort the stations by name (column 0) or distance (column 1)."""
+        if column not in (self.SORT_BY_NAME, self.SORT_BY_DISTANCE):
+            return
+        self.layoutAboutToBeChanged.emit()
+        persistent = [index for index in self.persistentIndexList()
+                      if index.internalId() == 0]
+        moved = [self._order[self._position(index.row())] for index in persistent]
+        self._sort_column = column
+        self._sort_order = order
+        self._order.sort(key=self._key)
+        self._keys = [self._key(position) for position in self._order]
+        self.changePersistentIndexList(
+            persistent,
+            [self.createIndex(self._row(position), index.column(), 0)
+             for index, position in zip(persistent, moved)]
+        )
+        self.layoutChanged.emit()
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, 0)
+        # a child row stores its station's position, which never changes
+        return self.createIndex(row, column, self._order[self._position(parent.row())] + 1)
+
+    def parent(self, index: QModelIndex) -> QModelIndex:
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(self._row(index.internalId() - 1), 0, 0)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if not parent.isValid():
+            return len(self._order)
+        if parent.internalId() == 0 and parent.column() == 0:
+            return len(self.CHILD_LABELS)
+        return 0
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 2
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if index.internalId() == 0:
+            position = self._order[self._position(index.row())]
+            if index.column() == 0:
+                return self._stations.name(position)
+            return f"{self._distances[position]:.1f} {self.unit}"
+        if index.column() == 0:
+            return self.CHILD_LABELS[index.row()]
+        position = index.internalId() - 1
+        if index.row() == 0:
+            return self._stations.id(position)
+        if index.row() == 1:
+            return str(self._stations.latitudes[position])
+        if index.row() == 2:
+            return str(self._stations.longitudes[position])
+        return f"{self._distances[position]:.1f} {self.unit}"
+
+    def _ascending(self) -> bool:
+        return self._sort_order == Qt.SortOrder.AscendingOrder
+
+    def _key(self, position: int) -> Any:
+        if self._sort_column == self.SORT_BY_NAME:
+            return self._stations.name(position).lower(), self._distances[position]
+        return self._distances[position]
+
+    def _position(self, row: int) -> int:
+        """Get where a row is in the ascending order."""
+        return row if self._ascending() else len(self._order) - 1 - row
+
+    def _row(self, position: int) -> int:
+        """Get the row that shows the station at a position in the StationArray."""
+        key = self._key(position)
+        at = bisect.bisect_left(self._keys, key)
+        while self._order[at] != position:
+            at += 1
+        return self._position(at)  # reversing the order is its own inverse
+
+
+class ZipCodeListModel(QAbstractItemModel):
+    """ZIP codes that have been looked up, newest first.
+
+    A ZIP code row shows the ZIP code and city and has child rows with
+    the latitude, longitude and city. The ZIP codes are kept in the
+    order they were looked up with a dict from ZIP code to position,
+    so checking for a duplicate does not depend on the length of the
+    list.
+
+    The history is appended to a text file, one ZIP code per line, so
+    it survives restarts. Restoring it only reads the ZIP codes; rows
+    are handed to the view FETCH_SIZE at a time as it scrolls, and the
+    entries for them are read from the program cache then.
+    """
+    FETCH_SIZE = 100
+    CHILD_LABELS = ("Latitude:", "Longitude:", "City:")
+    CHILD_FIELDS = ("latitude", "longitude", "city")
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self._history: list[str] = []       # ZIP codes, oldest first
+        self._positions: dict[str, int] = {}
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._shown = 0                     # newest ZIP codes handed to the view
+        self._lookup: Mapping[str, dict[str, Any]] = {}
+        self._file: TextIO | None = None
+
+    def __contains__(self, zipcode: object) -> bool:
+        return zipcode in self._positions
+
+    def restore(self, lookup: Mapping[str, dict[str, Any]],
+                filename: str | None = "zip_history.txt") -> None:
+        """Restore the history saved in a file and keep saving to it.
+
+        Args:
+            lookup: The ZIP code entries, e.g. the program cache. ZIP
+                    codes that are not in it are left out.
+            filename: The history file, or None to not save the history.
+        """
+        self.beginResetModel()
+        self.close()
+        self._lookup = lookup
+        saved: list[str] = []
+        if filename is not None:
+            try:
+                with open(filename, 'r') as fh:
+                    saved = fh.read().split()
+            except FileNotFoundError:
+                pass
+        positions = {zipcode: position for position, zipcode in enumerate(saved)}
+        self._history = [zipcode for position, zipcode in enumerate(saved)
+                         if positions[zipcode] == position and zipcode in lookup]
+        self._positions = {zipcode: position
+                           for position, zipcode in enumerate(self._history)}
+        self._entries = {}
+        self._shown = 0
+        self.endResetModel()
+        if filename is not None:
+            if len(self._history) != len(saved):
+                self._rewrite(filename)
+            self._file = open(filename, 'a')
+
+    def add(self, entry: dict[str, Any]) -> None:
+        """Add a ZIP code entry to the top of the list, unless it is there."""
+        zipcode = entry['zipcode']
+        if zipcode in self._positions:
+            return
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._positions[zipcode] = len(self._history)
+        self._history.append(zipcode)
+        self._entries[zipcode] = entry
+        self._shown += 1
+        self.endInsertRows()
+        if self._file is not None:
+            self._file.write(zipcode + "\n")
+            self._file.flush()
+
+    def reveal(self, zipcode: str) -> int:
+        """Hand the view every row down to a ZIP code and get its row."""
+        row = len(self._history) - 1 - self._positions[zipcode]
+        while self._shown <= row:
+            self.fetchMore(QModelIndex())
+        return row
+
+    def clear(self) -> None:
+        """Remove every ZIP code from the list.
+
+        The saved history is kept, so the next restore() brings it back.
+        ZIP codes added after clearing are appended to it again.
+        """
+        self.beginResetModel()
+        self._history.clear()
+        self._positions.clear()
+        self._entries.clear()
+        self._shown = 0
+        self.endResetModel()
+
+    def delete_history(self) -> None:
+        """Remove every ZIP code from the list and from the saved history."""
+        self.clear()
+        if self._file is not None:
+            self._file.truncate(0)
+            self._file.flush()
+
+    def close(self) -> None:
+        """Close the history file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def zipcode(self, row: int) -> str:
+        return self._history[len(self._history) - 1 - row]
+
+    def entry(self, row: int) -> dict[str, Any]:
+        return self._entries[self.zipcode(row)]
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        return not parent.isValid() and self._shown < len(self._history)
+
+    def fetchMore(self, parent: QModelIndex) -> None:
+        if parent.isValid():
+            return
+        count = min(self.FETCH_SIZE, len(self._history) - self._shown)
+        if count <= 0:
+            return
+        end = len(self._history) - self._shown
+        for zipcode in self._history[end - count:end]:
+            try:
+                self._entries[zipcode] = self._lookup[zipcode]
+            except KeyError:  # removed from the program cache since the restore
+                self._entries[zipcode] = {"zipcode": zipcode, "latitude": "",
+                                          "longitude": "", "city": ""}
+        self.beginInsertRows(QModelIndex(), self._shown, self._shown + count - 1)
+        self._shown += count
+        self.endInsertRows()
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, 0)
+        # a child row stores its ZIP code's position, which never changes
+        position = len(self._history) - 1 - parent.row()
+        return self.createIndex(row, column, position + 1)
+
+    def parent(self, index: QModelIndex) -> QModelIndex:
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(len(self._history) - index.internalId(), 0, 0)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if not parent.isValid():
+            return self._shown
+        if parent.internalId() == 0 and parent.column() == 0:
+            return len(self.CHILD_LABELS)
+        return 0
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 2
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if index.internalId() == 0:
+            entry = self.entry(index.row())
+            return entry['zipcode'] if index.column() == 0 else entry['city']
+        if index.column() == 0:
+            return self.CHILD_LABELS[index.row()]
+        entry = self._entries[self._history[index.internalId() - 1]]
+        return str(entry[self.CHILD_FIELDS[index.row()]])
+
+    def _rewrite(self, filename: str) -> None:
+        """Save the history without the duplicate and missing ZIP codes."""
+        temp_filename = filename + ".tmp"
+        with open(temp_filename, 'w') as fh:
+            fh.writelines(zipcode + "\n" for zipcode in self._history)
+        os.replace(temp_filename, filename)
@@ -1,15 +1,20 @@
 import math
-from typing import Literal
+from array import array
+from typing import Literal, Sequence
 
 
 AVG_MILES_PER_PARALLEL = 69.0
 AVG_MILES_PER_MERIDIAN = 69.18
 AVG_KM_PER_PARALLEL = 111.0
 AVG_KM_PER_MERIDIAN = 111.32
+MEAN_EARTH_RADIUS_MILES = 3958.8
+MEAN_EARTH_RADIUS_KM = 6371.0
 
 
 class LocationCoordinates:
     """Describes a location using its latitude and longitude."""
+    __slots__ = ('latitude', 'longitude')
+
     def __init__(self, *, latitude, longitude):
         self.latitude = float(latitude)
         self.longitude = float(longitude)
@@ -79,6 +84,58 @@ class LocationCoordinates:
         north_south_distance = from_parallels(other.latitude - self.latitude, unit)
         return math.sqrt((east_west_distance ** 2) + (north_south_distance ** 2))
 
+    def distances_from(self, latitudes: Sequence[float], longitudes: Sequence[float],
+                       unit: Literal['miles', 'km'],
+                       model: Literal['flat', 'great_circle'] = 'flat') -> array:
+        """Get the distances from many other sets of coordinates at once.
+
+        The unit is checked and the conversion factors are looked up
+        once, then every distance is computed in a single pass.
+
+        Args:
+            latitudes: The latitudes of the other coordinates.
+            longitudes: The longitudes of the other coordinates.
+            unit: The unit to use when calculating the distance. Either miles or km.
+            model: Either flat, which gives the same distances as
+                   distance_from(), or great_circle, which follows the
+                   curve of the Earth.
+        Returns:
+            An array of distances in the same order as the coordinates.
+        """
+        if len(latitudes) != len(longitudes):
+            raise ValueError('latitudes and longitudes must be the same length')
+        if model == 'flat':
+            per_meridian = from_meridians(1.0, unit)
+            per_parallel = from_parallels(1.0, unit)
+            longitude, latitude = self.longitude, self.latitude
+            hypot = math.hypot
+            return array('d', [
+                hypot((other_longitude - longitude) * per_meridian,
+                      (other_latitude - latitude) * per_parallel)
+                for other_latitude, other_longitude in zip(latitudes, longitudes)
+            ])
+        elif model == 'great_circle':
+            diameter = 2.0 * mean_earth_radius(unit)
+            latitude = math.radians(self.latitude)
+            longitude = math.radians(self.longitude)
+            cos_latitude = math.cos(latitude)
+            radians, sin, cos, asin, sqrt = math.radians, math.sin, math.cos, math.asin, math.sqrt
+            distances = array('d', bytes(8 * len(latitudes)))
+            for i, (other_latitude, other_longitude) in enumerate(zip(latitudes, longitudes)):
+                other_latitude = radians(other_latitude)
+                half_chord = (sin((other_latitude - latitude) / 2) ** 2
+                              + cos_latitude * cos(other_latitude)
+                              * sin((radians(other_longitude) - longitude) / 2) ** 2)
+                distances[i] = diameter * asin(sqrt(min(half_chord, 1.0)))
+            return distances
+        else:
+            raise ValueError('model must be either flat or great_circle')
+
+
+def sort_order(values: Sequence[float]) -> list[int]:
+    """Get the indexes that would sort the values from smallest to largest."""
+    return sorted(range(len(values)), key=values.__getitem__)
+
 
 def latitude_compass_direction(latitude):
     """Determine the compass direction for the given latitude value."""
@@ -100,6 +157,16 @@ def longitude_compass_direction(longitude):
     return ''
 
 
+def mean_earth_radius(unit: Literal['miles', 'km']):
+    """Get the mean radius of the Earth in the given unit."""
+    if unit == 'miles':
+        return MEAN_EARTH_RADIUS_MILES
+    elif unit == 'km':
+        return MEAN_EARTH_RADIUS_KM
+    else:
+        raise ValueError('unit must be either miles or km')
+
+
 def to_parallels(distance: float, unit: Literal['miles', 'km']):
     """Convert distance to approximate parallels.
 
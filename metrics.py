@@ -0,0 +1,204 @@
+"""Timers and counters for the slow parts of the program.
+
+Metrics are off unless the FROST_DATES_METRICS environment variable is
+set, either to the JSON lines file to write them to or to 1 for
+metrics.jsonl:
+
+    FROST_DATES_METRICS=metrics.jsonl python main.py
+
+While off, timer() returns a shared object that does nothing, so the
+instrumented code costs one flag check. While on, every timing and
+count is written to the file as one JSON object per line, and the most
+recent timings of each name are kept for summary().
+"""
+import atexit
+import functools
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, TextIO, TypeVar
+
+
+ENVIRONMENT_VARIABLE = "FROST_DATES_METRICS"
+DEFAULT_FILENAME = "metrics.jsonl"
+ROLLING_WINDOW = 100  # recent timings kept per name for the summary
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+_enabled = False
+_file: TextIO | None = None
+_lock = threading.Lock()
+_timers: dict[str, "TimerStats"] = {}
+_counters: dict[str, int] = {}
+
+
+@dataclass
+class TimerStats:
+    count: int = 0
+    errors: int = 0
+    total: float = 0.0  # seconds
+    recent: deque = field(default_factory=lambda: deque(maxlen=ROLLING_WINDOW))
+
+    @property
+    def p50(self) -> float:
+        return statistics.median(self.recent) if self.recent else 0.0
+
+    @property
+    def p95(self) -> float:
+        if len(self.recent) < 2:
+            return self.p50
+        return statistics.quantiles(self.recent, n=20, method='inclusive')[-1]
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(filename: str | None = DEFAULT_FILENAME) -> None:
+    """Start collecting metrics, appending them to filename if given."""
+    global _enabled, _file
+    with _lock:
+        if _file is not None:
+            _file.close()
+        _file = open(filename, "a") if filename else None
+        _enabled = True
+
+
+def disable() -> None:
+    """Stop collecting metrics and close the metrics file."""
+    global _enabled, _file
+    with _lock:
+        _enabled = False
+        if _file is not None:
+            _file.close()
+            _file = None
+
+
+def reset() -> None:
+    """Forget the collected timings and counts."""
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        record(self.name, time.perf_counter() - self.start, error=exc_type is not None)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name: str) -> "_Timer | _NullTimer":
+    """Time a with block under the given name."""
+    return _Timer(name) if _enabled else _NULL_TIMER
+
+
+def timed(name: str) -> Callable[[_F], _F]:
+    """Decorate a function to time each call under the given name.
+
+    Do not decorate Qt slots. PyQt passes a slot only the signal
+    arguments it accepts, and the wrapper accepts all of them, so a slot
+    like clicked() would get an argument it does not take. Time the body
+    of a slot with timer() instead.
+    """
+    def decorate(function: _F) -> _F:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Timer(name):
+                return function(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return decorate
+
+
+def count(name: str, amount: int = 1) -> None:
+    """Add to the counter with the given name."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+        _write({"time": time.time(), "type": "counter", "name": name, "value": amount})
+
+
+def record(name: str, seconds: float, *, error: bool = False) -> None:
+    """Record a timing that was measured elsewhere."""
+    if not _enabled:
+        return
+    with _lock:
+        stats = _timers.get(name)
+        if stats is None:
+            stats = _timers[name] = TimerStats()
+        stats.count += 1
+        stats.errors += error
+        stats.total += seconds
+        stats.recent.append(seconds)
+        line = {"time": time.time(), "type": "timer", "name": name, "seconds": seconds}
+        if error:
+            line["error"] = True
+        _write(line)
+
+
+def summary() -> tuple[dict[str, TimerStats], dict[str, int]]:
+    """Get copies of the timers and counters collected so far."""
+    with _lock:
+        timers = {name: TimerStats(stats.count, stats.errors, stats.total,
+                                   deque(stats.recent, maxlen=ROLLING_WINDOW))
+                  for name, stats in _timers.items()}
+        return timers, dict(_counters)
+
+
+def format_summary(limit: int = 3) -> str:
+    """Get a one-line summary of where the time went recently.
+
+    Lists the timers with the most recent time spent, with their median
+    and 95th percentile, and the response cache hit rate.
+    """
+    timers, counters = summary()
+    busiest = sorted(timers.items(), key=lambda item: sum(item[1].recent), reverse=True)
+    parts = [f"{name} {stats.p50 * 1000:.1f}/{stats.p95 * 1000:.1f} ms"
+             for name, stats in busiest[:limit]]
+    lookups = counters.get("cache.hit", 0) + counters.get("cache.miss", 0)
+    if lookups:
+        parts.append(f"cache {counters.get('cache.hit', 0) / lookups:.0%} hits")
+    return " | ".join(parts)
+
+
+def _write(line: dict[str, Any]) -> None:
+    if _file is not None:
+        _file.write(json.dumps(line) + "\n")
+
+
+def _enable_from_environment() -> None:
+    value = os.environ.get(ENVIRONMENT_VARIABLE, "").strip()
+    if value.lower() in ("", "0", "false", "no"):
+        return
+    enable(DEFAULT_FILENAME if value.lower() in ("1", "true", "yes") else value)
+
+
+_enable_from_environment()
+atexit.register(disable)
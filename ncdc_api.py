@@ -1,15 +1,33 @@
-from typing import Literal
-from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterable, Iterator, Literal
+from array import array
+from contextlib import nullcontext
+from dataclasses import dataclass, field
 import datetime
 
-import requests
-from PyQt5.QtCore import QThread, QObject, pyqtSignal
+import http_client
+import metrics
+import rate_limiter
+from location_coordinates import LocationCoordinates, sort_order
+from response_cache import ResponseCache
 
-from location_coordinates import LocationCoordinates
+if TYPE_CHECKING:
+    import aio_client
+
+
+NCEI_URL = 'https://www.ncei.noaa.gov/cdo-web/api/v2'
+STATIONS_PAGE_LIMIT = 1000  # the largest page size the API allows
+FROST_TEMPERATURES = (16, 20, 24, 28, 32, 36)  # ℉, the rows of a FrostDateMatrix
+FROST_PROBABILITIES = (10, 20, 30, 40, 50, 60, 70, 80, 90)  # %, the columns
+NO_DATE = 0  # the day stored for a frost date the station does not have
+
+
+class NoResultsError(RuntimeError):
+    """The web service found nothing for a request."""
 
 
 def get_nearby_stations(token: str, location: LocationCoordinates,
-                        radius: float, unit: Literal['miles', 'km']):
+                        radius: float, unit: Literal['miles', 'km'],
+                        cache: ResponseCache | None = None):
     """Retrieve a list of nearby stations.
 
     https://www.ncdc.noaa.gov/cdo-web/webservices/v2
@@ -19,34 +37,154 @@ def get_nearby_stations(token: str, location: LocationCoordinates,
         location: The coordinates to use when searching.
         radius: The distance to search from the center of the search location.
         unit: The unit to use for the search radius. Either miles or km.
+        cache: The cache to check before sending the request.
     Returns:
         A list of stations near the given search coordinates.
     """
+    return [
+        station
+        for page in iter_nearby_stations(token, location, radius, unit, cache)
+        for station in page
+    ]
+
+
+def iter_nearby_stations(token: str, location: LocationCoordinates,
+                         radius: float, unit: Literal['miles', 'km'],
+                         cache: ResponseCache | None = None):
+    """Retrieve nearby stations one page at a time.
+
+    Args:
+        token: The NCDC web service token used to retrieve the data.
+        location: The coordinates to use when searching.
+        radius: The distance to search from the center of the search location.
+        unit: The unit to use for the search radius. Either miles or km.
+        cache: The cache to check before sending each request.
+    Returns:
+        An iterator over lists of stations, one list for each page.
+    """
+    extent = location.googleapi_latlngbounds_urlvalue(radius, unit)
+    return iter_stations_in_extent(token, extent, cache)
+
+
+def iter_stations_in_extent(token: str, extent: str | None,
+                            cache: ResponseCache | None = None,
+                            limit: int | None = None):
+    """Retrieve the stations inside a boundary one page at a time.
+
+    Pages are requested until the count in the response metadata has
+    been reached.
+
+    Args:
+        token: The NCDC web service token used to retrieve the data.
+        extent: The boundary to search as a LatLngBounds URL value. Every
+                station is retrieved if not given.
+        cache: The cache to check before sending each request.
+        limit: The number of stations to request per page. Uses
+               STATIONS_PAGE_LIMIT if not given.
+    Returns:
+        An iterator over lists of stations, one list for each page.
+    """
+    limit = limit or STATIONS_PAGE_LIMIT
+    offset = 1  # the API counts results from 1
+    while offset is not None:
+        payload = stations_payload(extent, limit, offset)
+        response = get_json(token, 'stations', payload, cache)
+        stations = parse_stations(response, offset)
+        if stations is None:
+            return
+        yield stations
+        offset = next_offset(response, offset, len(stations))
+
+
+async def get_nearby_stations_async(token: str, location: LocationCoordinates,
+                                    radius: float, unit: Literal['miles', 'km'],
+                                    cache: ResponseCache | None = None,
+                                    client: "aio_client.AsyncClient | None" = None):
+    """Retrieve a list of nearby stations without blocking the event loop.
+
+    Works like get_nearby_stations(), but sends the requests with an
+    asyncio client. Uses the shared client for the running event loop
+    if client is not given.
+    """
+    extent = location.googleapi_latlngbounds_urlvalue(radius, unit)
+    return [
+        station
+        async for page in iter_stations_in_extent_async(token, extent, cache,
+                                                        client=client)
+        for station in page
+    ]
+
+
+async def iter_stations_in_extent_async(token: str, extent: str | None,
+                                        cache: ResponseCache | None = None,
+                                        limit: int | None = None,
+                                        client: "aio_client.AsyncClient | None" = None
+                                        ) -> AsyncIterator[list["StationInfo"]]:
+    """Retrieve the stations inside a boundary one page at a time.
+
+    Works like iter_stations_in_extent(), but sends the requests with
+    an asyncio client.
+    """
+    limit = limit or STATIONS_PAGE_LIMIT
+    offset = 1
+    while offset is not None:
+        payload = stations_payload(extent, limit, offset)
+        response = await get_json_async(token, 'stations', payload, cache, client)
+        stations = parse_stations(response, offset)
+        if stations is None:
+            return
+        yield stations
+        offset = next_offset(response, offset, len(stations))
+
+
+def stations_payload(extent: str | None, limit: int, offset: int) -> dict:
+    """Get the URL parameters for a page of a station search."""
     payload = {
-        'extent': location.googleapi_latlngbounds_urlvalue(radius, unit),
         'datatypeid': 'ANN-TMIN-PRBFST-T16FP10',
-        'datasetid': 'NORMAL_ANN'  # Normals Annual/Seasonal
+        'datasetid': 'NORMAL_ANN',  # Normals Annual/Seasonal
+        'limit': limit,
+        'offset': offset
     }
-    r = requests.get('https://www.ncei.noaa.gov/cdo-web/api/v2/stations',
-                     params=payload, headers={'token': token})
+    if extent:
+        payload['extent'] = extent
+    return payload
+
+
+def parse_stations(response: dict, offset: int) -> "list[StationInfo] | None":
+    """Get the stations from a page of a station search.
+
+    Returns:
+        The stations, or None if a page after the first has no results.
+    """
     try:
-        response = r.json()
-        stations = [
+        return [
             StationInfo(
                 station['id'], station['name'],
                 LocationCoordinates(latitude=station['latitude'],
                                     longitude=station['longitude'])
             ) for station in response['results']
         ]
-        return stations
     except KeyError:
-        raise RuntimeError('No results')
-    except requests.exceptions.JSONDecodeError:
-        raise RuntimeError('Unable to parse JSON')
+        if offset == 1:
+            raise NoResultsError('No results')
+        return None
 
 
-def get_frost_dates(token: str, station_id: str, kind: Literal['first', 'last']):
-    """Retrieve a list of nearby stations.
+def next_offset(response: dict, offset: int, count: int) -> int | None:
+    """Get the offset of the page after this one, or None if it was the last."""
+    try:
+        total = response['metadata']['resultset']['count']
+    except KeyError:
+        return None
+    offset += count
+    if not count or offset > total:
+        return None
+    return offset
+
+
+def get_frost_dates(token: str, station_id: str, kind: Literal['first', 'last'],
+                    cache: ResponseCache | None = None) -> "FrostDateMatrix":
+    """Retrieve the frost dates of a station.
 
     https://www.ncdc.noaa.gov/cdo-web/webservices/v2
 
@@ -54,10 +192,32 @@ def get_frost_dates(token: str, station_id: str, kind: Literal['first', 'last'])
         token: The NCDC web service token used to retrieve the data.
         station_id: The station ID to fetch from.
         kind: The kind of frost dates to fetch. Either first or last.
+        cache: The cache to check before sending the request.
     Returns:
-        A list of stations near the given search coordinates sorted from nearest to farthest.
+        The frost dates as days of the year, by temperature and probability.
     """
-    payload = {
+    response = get_json(token, 'data', frost_dates_payload(station_id, kind), cache)
+    return parse_frost_dates(response, kind)
+
+
+async def get_frost_dates_async(token: str, station_id: str,
+                                kind: Literal['first', 'last'],
+                                cache: ResponseCache | None = None,
+                                client: "aio_client.AsyncClient | None" = None
+                                ) -> "FrostDateMatrix":
+    """Retrieve the frost dates of a station without blocking the event loop.
+
+    Works like get_frost_dates(), but sends the request with an asyncio
+    client.
+    """
+    response = await get_json_async(token, 'data', frost_dates_payload(station_id, kind),
+                                    cache, client)
+    return parse_frost_dates(response, kind)
+
+
+def frost_dates_payload(station_id: str, kind: Literal['first', 'last']) -> dict:
+    """Get the URL parameters for a frost dates request."""
+    return {
         'datasetid': 'NORMAL_ANN',  # Normals Annual/Seasonal
         'startdate': '2010-01-01',
         'enddate': '2010-01-01',
@@ -65,16 +225,82 @@ def get_frost_dates(token: str, station_id: str, kind: Literal['first', 'last'])
         'datatypeid': list(FrostDateDataTypesIterable(kind)),
         'limit': 100
     }
-    r = requests.get('https://www.ncei.noaa.gov/cdo-web/api/v2/data',
-                     params=payload, headers={'token': token})
+
+
+def parse_frost_dates(response: dict, kind: Literal['first', 'last']) -> "FrostDateMatrix":
+    """Get the frost dates from a frost dates response."""
+    try:
+        values = {data['datatype']: data['value'] for data in response['results']}
+    except KeyError:
+        raise NoResultsError('No results')
+    return FrostDateMatrix.from_values(kind, values)
+
+
+def get_json(token: str, endpoint: str, payload: dict,
+             cache: ResponseCache | None = None):
+    """Send a request to an NCDC endpoint and parse the JSON response.
+
+    Successful responses are stored in the cache, if one is given, and
+    later requests with the same parameters are answered from it. A
+    request that another thread is already sending waits for its
+    response instead of being sent again.
+
+    Args:
+        token: The NCDC web service token used to retrieve the data.
+        endpoint: The endpoint to request, e.g. stations or data.
+        payload: The URL parameters to send.
+        cache: The cache to check before sending the request.
+    Returns:
+        The parsed JSON response.
+    """
+    flight = cache.single_flight(endpoint, payload) if cache is not None else nullcontext()
+    with flight as response:
+        if response is not None:
+            return response
+        with metrics.timer(f'ncdc.{endpoint}'):
+            r = http_client.get(f'{NCEI_URL}/{endpoint}',
+                                params=payload, headers={'token': token},
+                                limiter=rate_limiter.get(rate_limiter.NCEI))
+        return parse_json(r, endpoint, payload, cache)
+
+
+async def get_json_async(token: str, endpoint: str, payload: dict,
+                         cache: ResponseCache | None = None,
+                         client: "aio_client.AsyncClient | None" = None):
+    """Send a request to an NCDC endpoint without blocking the event loop.
+
+    Works like get_json(), but sends the request with an asyncio client.
+    The cache is read and written on the default executor, so its
+    database does not block the event loop.
+    """
+    import asyncio  # only async callers need asyncio and ssl
+    import aio_client
+
+    loop = asyncio.get_running_loop()
+    if cache is not None:
+        response = await loop.run_in_executor(None, cache.get, endpoint, payload)
+        if response is not None:
+            return response
+    client = client or aio_client.get_client()
+    with metrics.timer(f'ncdc.{endpoint}'):
+        r = await client.get(f'{NCEI_URL}/{endpoint}',
+                             params=payload, headers={'token': token},
+                             limiter=rate_limiter.get(rate_limiter.NCEI))
+    response = parse_json(r, endpoint, payload)
+    if cache is not None and r.ok:
+        await loop.run_in_executor(None, cache.put, endpoint, payload, response)
+    return response
+
+
+def parse_json(r, endpoint: str, payload: dict, cache: ResponseCache | None = None):
+    """Parse the JSON response to a request and cache it if successful."""
     try:
         response = r.json()
-        return {
-            data['datatype']: to_short_date(data['value'])
-            for data in response['results']
-        }
-    except requests.exceptions.JSONDecodeError:
+    except ValueError:  # requests.exceptions.JSONDecodeError
         raise RuntimeError('Unable to parse JSON')
+    if cache is not None and r.ok:
+        cache.put(endpoint, payload, response)
+    return response
 
 
 def to_short_date(day_of_year) -> str:
@@ -89,6 +315,10 @@ def to_short_date(day_of_year) -> str:
     return d.strftime('%b %d')
 
 
+# the short date of every day of the year, so formatting is a lookup
+SHORT_DATES = ('',) + tuple(to_short_date(day) for day in range(1, 367))
+
+
 class FrostDateDataTypesIterable:
     """Generate frost date data types to fetch from API."""
     def __init__(self, kind: Literal['first', 'last'], limit: int = 0) -> None:
@@ -128,98 +358,175 @@ class FrostDateDataTypesIterable:
         return self.base + f'T{self.temperature}FP{self.percent_probability}'
 
 
-@dataclass
-class StationInfo:
-    id: str
-    name: str
-    location: LocationCoordinates
+# the FrostDateMatrix cell of each frost date data type, by kind
+_FROST_DATE_CELLS = {
+    kind: {datatype: cell for cell, datatype in enumerate(FrostDateDataTypesIterable(kind))}
+    for kind in ('first', 'last')
+}
 
 
-def load_token() -> str:
-    """Load the NCDC service token from the file ncdc.txt."""
-    with open("ncdc.txt", "r") as fh:
-        return fh.read().strip()
+def _no_dates() -> array:
+    return array('h', [NO_DATE]) * (len(FROST_TEMPERATURES) * len(FROST_PROBABILITIES))
 
 
-class GetNearbyStationsAsyncController(QObject):
-    """Send the nearby stations request asynchronously.
+@dataclass(slots=True)
+class FrostDateMatrix:
+    """The frost dates of one kind for a station, as days of the year.
 
-    Asynchronous requests require the use of a worker object and worker
-    thread. The purpose of this AsyncController is to bundle these two
-    objects together and only expose some signals from the worker. The
-    worker and worker thread do not exist until sendRequest() is called
-    and are destroyed thereafter. This is why the AsyncController has
-    its own signals to use instead of allowing access to the worker's
-    signals.
+    days holds a row of FROST_PROBABILITIES days for each of the
+    FROST_TEMPERATURES, one row after another, with NO_DATE where the
+    station has no value. short_date() formats a day with SHORT_DATES.
     """
-    result_ready = pyqtSignal(list)
-    error_raised = pyqtSignal(str)
-    finished = pyqtSignal()
+    kind: Literal['first', 'last']
+    days: array = field(default_factory=_no_dates)
 
-    def __init__(self, token: str) -> None:
-        """Initialize the AsyncController.
+    @classmethod
+    def from_values(cls, kind: Literal['first', 'last'],
+                    values: dict[str, Any]) -> "FrostDateMatrix":
+        """Create a matrix from values keyed by data type.
 
-        The worker and worker thread need to be class instance
-        variables otherwise they will be deleted before processing.
+        Values that are not a day of the year, and data types that are
+        not frost dates of the kind, are left out.
         """
-        super().__init__()
-        self.token = token
-        self._worker = None
-        self._worker_thread = None
-
-    def sendRequest(self, location: LocationCoordinates, search_radius: float,
-                    unit: Literal['miles', 'km']) -> None:
-        """Start up a thread to send the request.
+        frost_dates = cls(kind)
+        cells = _FROST_DATE_CELLS[kind]
+        for datatype, value in values.items():
+            cell = cells.get(datatype)
+            if cell is not None and 1 <= int(value) <= 366:
+                frost_dates.days[cell] = int(value)
+        return frost_dates
+
+    def day(self, row: int, column: int) -> int:
+        """Get the day of the year for a temperature row and probability column."""
+        return self.days[row * len(FROST_PROBABILITIES) + column]
+
+    def short_date(self, row: int, column: int) -> str:
+        """Get the short date for a cell, or an empty string if there is none."""
+        return SHORT_DATES[self.days[row * len(FROST_PROBABILITIES) + column]]
+
+    def rows(self) -> list[list[int]]:
+        """Get the days as one list per temperature."""
+        width = len(FROST_PROBABILITIES)
+        return [self.days[start:start + width].tolist()
+                for start in range(0, len(self.days), width)]
+
+    def to_dict(self) -> dict[str, str]:
+        """Get the short dates keyed by data type, leaving out missing dates."""
+        return {datatype: SHORT_DATES[day]
+                for datatype, day in zip(FrostDateDataTypesIterable(self.kind), self.days)
+                if day != NO_DATE}
+
+
+@dataclass(slots=True)
+class StationInfo:
+    id: str
+    name: str
+    location: LocationCoordinates
 
-        Connection chain adapted from blog and official documentation.
 
-        https://doc.qt.io/qt-5/qthread.html
+class StationArray:
+    """Compact, column-oriented collection of stations.
 
-        https://mayaposch.wordpress.com/2011/11/01/how-to-really-truly-use-qthreads-the-full-explanation/
+    IDs and names are packed into byte arrays with an array of end
+    offsets, and the coordinates are kept in contiguous float arrays.
+    Distances can be computed straight from the coordinate arrays, so
+    sorting thousands of stations does not touch a Python object per
+    station. Iterating or indexing returns StationInfo objects for
+    code that works with single stations.
+    """
+    def __init__(self, stations: Iterable[StationInfo] = ()) -> None:
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        self._ids = bytearray()
+        self._id_ends = array('Q')
+        self._names = bytearray()
+        self._name_ends = array('Q')
+        self.extend(stations)
+
+    def __len__(self) -> int:
+        return len(self.latitudes)
+
+    def __getitem__(self, index: int) -> StationInfo:
+        index = self._position(index)
+        return StationInfo(self.id(index), self.name(index),
+                           LocationCoordinates(latitude=self.latitudes[index],
+                                               longitude=self.longitudes[index]))
+
+    def __iter__(self) -> Iterator[StationInfo]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self, station: StationInfo) -> None:
+        """Add a station to the end of the collection."""
+        self.append_values(station.id, station.name,
+                           station.location.latitude, station.location.longitude)
+
+    def append_values(self, station_id: str, name: str,
+                      latitude: float, longitude: float) -> None:
+        """Add a station to the end of the collection from its values."""
+        self._ids += station_id.encode('utf-8')
+        self._id_ends.append(len(self._ids))
+        self._names += name.encode('utf-8')
+        self._name_ends.append(len(self._names))
+        self.latitudes.append(float(latitude))
+        self.longitudes.append(float(longitude))
+
+    def extend(self, stations: Iterable[StationInfo]) -> None:
+        """Add stations to the end of the collection."""
+        for station in stations:
+            self.append(station)
+
+    def id(self, index: int) -> str:
+        """Get the ID of the station at the given index."""
+        index = self._position(index)
+        start = self._id_ends[index - 1] if index else 0
+        return self._ids[start:self._id_ends[index]].decode('utf-8')
+
+    def name(self, index: int) -> str:
+        """Get the name of the station at the given index."""
+        index = self._position(index)
+        start = self._name_ends[index - 1] if index else 0
+        return self._names[start:self._name_ends[index]].decode('utf-8')
+
+    def distances_from(self, origin: LocationCoordinates, unit: Literal['miles', 'km'],
+                       model: Literal['flat', 'great_circle'] = 'flat') -> array:
+        """Get the distance from the origin to every station."""
+        return origin.distances_from(self.latitudes, self.longitudes, unit, model)
+
+    def take(self, indexes: Iterable[int]) -> 'StationArray':
+        """Get a new collection holding the stations at the given indexes."""
+        result = StationArray()
+        for index in indexes:
+            index = self._position(index)
+            id_start = self._id_ends[index - 1] if index else 0
+            name_start = self._name_ends[index - 1] if index else 0
+            result._ids += self._ids[id_start:self._id_ends[index]]
+            result._id_ends.append(len(result._ids))
+            result._names += self._names[name_start:self._name_ends[index]]
+            result._name_ends.append(len(result._names))
+            result.latitudes.append(self.latitudes[index])
+            result.longitudes.append(self.longitudes[index])
+        return result
+
+    def sorted_by_distance(self, origin: LocationCoordinates,
+                           unit: Literal['miles', 'km']) -> tuple['StationArray', array]:
+        """Sort the stations from nearest to farthest from the origin.
+
+        Returns:
+            The sorted stations and their distances from the origin.
+        """
+        distances = self.distances_from(origin, unit)
+        order = sort_order(distances)
+        return self.take(order), array('d', [distances[i] for i in order])
 
-        A lot of PyQt QThread examples use a subclass then call
-        QThread.terminate() and QThread.wait() for cleanup, but this is
-        discouraged for a variety of reasons.
+    def _position(self, index: int) -> int:
+        """Get the position of an index that may count from the end."""
+        if not -len(self) <= index < len(self):
+            raise IndexError('station index out of range')
+        return index % len(self)
 
-        https://www.vikingsoftware.com/blog/how-to-use-qthread-properly/
 
-        https://www.qt.io/blog/2010/06/17/youre-doing-it-wrong
-        """
-        self._worker_thread = QThread()
-        self._worker = _GetNearbyStationsAsyncWorker(self.token, location, search_radius, unit)
-        self._worker.moveToThread(self._worker_thread)
-        self._worker_thread.started.connect(self._worker.doWork)
-        self._worker.finished.connect(self._worker_thread.quit)
-        self._worker.finished.connect(self._worker.deleteLater)
-        self._worker_thread.finished.connect(self._worker_thread.deleteLater)
-
-        self._worker.result_ready.connect(self.result_ready)
-        self._worker.error_raised.connect(self.error_raised)
-        self._worker.finished.connect(self.finished)
-
-        self._worker_thread.start()
-
-
-class _GetNearbyStationsAsyncWorker(QObject):
-    """Worker to perform asynchronous fetch of nearby stations."""
-    result_ready = pyqtSignal(list)
-    error_raised = pyqtSignal(str)
-    finished = pyqtSignal()
-
-    def __init__(self, token: str, location: LocationCoordinates,
-                 radius: float, unit: Literal['miles', 'km']) -> None:
-        super().__init__()
-        self.token = token
-        self.location = location
-        self.radius = radius
-        self.unit = unit
-
-    def doWork(self) -> None:
-        try:
-            result = get_nearby_stations(self.token, self.location,
-                                         self.radius, self.unit)
-            self.result_ready.emit(result)
-        except RuntimeError as error:
-            self.error_raised.emit(str(error))
-        finally:
-            self.finished.emit()
+def load_token() -> str:
+    """Load the NCDC service token from the file ncdc.txt."""
+    with open("ncdc.txt", "r") as fh:
+        return fh.read().strip()
@@ -0,0 +1,217 @@
+"""Fetch NCEI climate normals for many stations in as few requests as possible.
+
+The /data endpoint takes one dataset per request but any number of
+stations and data types, and answers with every combination of them,
+up to DATA_PAGE_LIMIT results per page. plan() groups the wanted data
+types by dataset and packs the stations that want them into queries,
+and fetch_normals() requests every page of every query at once and
+splits the results back out by station and data type:
+
+    normals = fetch_normals(token, {
+        "GHCND:USC00250070": ["ANN-TMIN-PRBGSL-T32FP50", "MLY-TMIN-NORMAL"],
+        "GHCND:USC00251145": ["ANN-TMIN-PRBGSL-T32FP50"],
+    })
+    normals["GHCND:USC00250070"]["MLY-TMIN-NORMAL"]  # twelve values, January first
+"""
+import math
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Iterable, Literal, Mapping
+
+import ncdc_api
+from ncdc_api import FrostDateDataTypesIterable, FrostDateMatrix
+from response_cache import ResponseCache
+
+
+DATA_PAGE_LIMIT = 1000  # the largest page size the /data endpoint allows
+MAX_QUERY_IDS = 150     # station and data type IDs per request, about 5 KB of URL
+MAX_WORKERS = 4         # pages requested at once
+# the dates each dataset is requested for and the values per data type
+DATASET_PERIODS = {
+    'NORMAL_ANN': ('2010-01-01', '2010-01-01', 1),   # Normals Annual/Seasonal
+    'NORMAL_MLY': ('2010-01-01', '2010-12-01', 12),  # Normals Monthly
+}
+
+
+def dataset_for(datatype: str) -> str:
+    """Get the normals dataset a data type belongs to."""
+    return 'NORMAL_MLY' if datatype.startswith('MLY-') else 'NORMAL_ANN'
+
+
+@dataclass(frozen=True)
+class DataQuery:
+    """One /data query: every data type for every station, in one dataset."""
+    dataset: str
+    station_ids: tuple[str, ...]
+    datatypes: tuple[str, ...]
+
+    @property
+    def size(self) -> int:
+        """The most results the query can have."""
+        return len(self.station_ids) * len(self.datatypes) * DATASET_PERIODS[self.dataset][2]
+
+    @property
+    def pages(self) -> int:
+        return max(1, math.ceil(self.size / DATA_PAGE_LIMIT))
+
+    def offsets(self) -> range:
+        """Get the offset of each page. The API counts results from 1."""
+        return range(1, self.pages * DATA_PAGE_LIMIT, DATA_PAGE_LIMIT)
+
+    def payload(self, offset: int = 1) -> dict:
+        """Get the URL parameters for a page of the query."""
+        startdate, enddate, _ = DATASET_PERIODS[self.dataset]
+        return {
+            'datasetid': self.dataset,
+            'startdate': startdate,
+            'enddate': enddate,
+            'stationid': list(self.station_ids),
+            'datatypeid': list(self.datatypes),
+            'limit': DATA_PAGE_LIMIT,
+            'offset': offset
+        }
+
+
+def plan(requests: Mapping[str, Iterable[str]]) -> list[DataQuery]:
+    """Pack the data types wanted for each station into queries.
+
+    Stations that want the same data types of a dataset share queries.
+    Queries are split so none names more than MAX_QUERY_IDS stations and
+    data types, and pairs of queries are merged when the merged query
+    needs fewer pages than the two did. A merged query can return
+    results nobody asked for; fetch_normals() drops them.
+
+    Args:
+        requests: The data types wanted, keyed by station ID.
+    Returns:
+        The queries, with the most results first.
+    """
+    groups: dict[tuple[str, frozenset[str]], list[str]] = defaultdict(list)
+    for station_id, datatypes in requests.items():
+        by_dataset: dict[str, set[str]] = defaultdict(set)
+        for datatype in datatypes:
+            by_dataset[dataset_for(datatype)].add(datatype)
+        for dataset, wanted in by_dataset.items():
+            groups[dataset, frozenset(wanted)].append(station_id)
+    queries: list[DataQuery] = []
+    for (dataset, datatypes), station_ids in groups.items():
+        group = DataQuery(dataset, tuple(sorted(set(station_ids))), tuple(sorted(datatypes)))
+        for query in _split(group):
+            for index, other in enumerate(queries):
+                merged = _merge(other, query)
+                if merged is not None:
+                    queries[index] = merged
+                    break
+            else:
+                queries.append(query)
+    return sorted(queries, key=lambda query: query.size, reverse=True)
+
+
+def fetch_normals(token: str, requests: Mapping[str, Iterable[str]],
+                  cache: ResponseCache | None = None,
+                  workers: int = MAX_WORKERS) -> dict[str, dict[str, list[Any]]]:
+    """Fetch normals for many stations with the queries from plan().
+
+    The number of results of a query is known in advance, so every page
+    of every query is requested at once, workers at a time.
+
+    Args:
+        token: The NCDC web service token used to retrieve the data.
+        requests: The data types wanted, keyed by station ID.
+        cache: The cache to check before sending each request.
+        workers: The most requests in flight at once.
+    Returns:
+        The values of each data type keyed by station ID and data type,
+        in date order: one value for annual data types and twelve for
+        monthly ones. Stations and data types without values are left out.
+    """
+    wanted = {(station_id, datatype)
+              for station_id, datatypes in requests.items() for datatype in datatypes}
+    pages = [(query, offset) for query in plan(requests) for offset in query.offsets()]
+
+    def fetch(page: tuple[DataQuery, int]) -> dict:
+        query, offset = page
+        return ncdc_api.get_json(token, 'data', query.payload(offset), cache)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        responses = list(executor.map(fetch, pages))
+    values: dict[str, dict[str, list[tuple[str, Any]]]] = defaultdict(lambda: defaultdict(list))
+    try:
+        for response in responses:
+            for data in response.get('results', ()):  # a page past the end is empty
+                if (data['station'], data['datatype']) in wanted:
+                    values[data['station']][data['datatype']].append((data['date'], data['value']))
+    except KeyError:
+        raise RuntimeError('Unexpected data format')
+    return {station_id: {datatype: [value for _, value in sorted(dated)]
+                         for datatype, dated in by_datatype.items()}
+            for station_id, by_datatype in values.items()}
+
+
+def get_frost_dates_for_stations(token: str, station_ids: Iterable[str],
+                                 cache: ResponseCache | None = None,
+                                 kinds: Iterable[Literal['first', 'last']] = ('first', 'last')
+                                 ) -> dict[str, dict[str, FrostDateMatrix]]:
+    """Fetch frost dates of several kinds for several stations at once.
+
+    Returns:
+        The frost dates keyed by station ID and kind. Stations without
+        any frost dates of a kind are left out for that kind.
+    """
+    kinds = tuple(kinds)
+    datatypes = [datatype for kind in kinds for datatype in FrostDateDataTypesIterable(kind)]
+    normals = fetch_normals(token, {station_id: datatypes for station_id in station_ids},
+                            cache)
+    frost_dates: dict[str, dict[str, FrostDateMatrix]] = {}
+    for station_id, by_datatype in normals.items():
+        values = {datatype: dated[0] for datatype, dated in by_datatype.items()}
+        for kind in kinds:
+            matrix = FrostDateMatrix.from_values(kind, values)
+            if any(matrix.days):
+                frost_dates.setdefault(station_id, {})[kind] = matrix
+    return frost_dates
+
+
+def _split(query: DataQuery) -> list[DataQuery]:
+    """Split a query into queries that name at most MAX_QUERY_IDS IDs.
+
+    The stations are split into the runs that need the fewest pages in
+    total, and the fewest requests among those.
+    """
+    if len(query.station_ids) + len(query.datatypes) <= MAX_QUERY_IDS:
+        return [query]
+    if len(query.datatypes) < MAX_QUERY_IDS:
+        datatype_count = len(query.datatypes)
+    else:
+        datatype_count = MAX_QUERY_IDS // 2
+    per_station = datatype_count * DATASET_PERIODS[query.dataset][2]
+    total = len(query.station_ids)
+
+    def pages(count: int) -> int:
+        full, rest = divmod(total, count)
+        return full * math.ceil(count * per_station / DATA_PAGE_LIMIT) \
+            + math.ceil(rest * per_station / DATA_PAGE_LIMIT)
+
+    station_count = min(range(MAX_QUERY_IDS - datatype_count, 0, -1),
+                        key=lambda count: (pages(count), math.ceil(total / count)))
+    return [
+        DataQuery(query.dataset, query.station_ids[start:start + station_count],
+                  query.datatypes[first:first + datatype_count])
+        for first in range(0, len(query.datatypes), datatype_count)
+        for start in range(0, len(query.station_ids), station_count)
+    ]
+
+
+def _merge(query: DataQuery, other: DataQuery) -> DataQuery | None:
+    """Merge two queries if that saves a request."""
+    if query.dataset != other.dataset:
+        return None
+    merged = DataQuery(query.dataset,
+                       tuple(sorted(set(query.station_ids) | set(other.station_ids))),
+                       tuple(sorted(set(query.datatypes) | set(other.datatypes))))
+    if len(merged.station_ids) + len(merged.datatypes) > MAX_QUERY_IDS:
+        return None
+    if merged.pages >= query.pages + other.pages:
+        return None
+    return merged
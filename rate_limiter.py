@@ -0,0 +1,246 @@
+import datetime
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+
+NCEI = "ncei"
+GEONAMES = "geonames"
+
+NCEI_RATE = 5.0                 # requests per second per token
+NCEI_DAILY_LIMIT = 10_000       # requests per day per token
+GEONAMES_RATE = 1000 / 3600     # credits per second, from the hourly limit
+GEONAMES_BURST = 1000           # credits that can be spent at once
+GEONAMES_DAILY_LIMIT = 20_000   # credits per day per application
+MIN_RATE_FRACTION = 0.05        # throttling never slows below this part of the rate
+RECOVERY_FRACTION = 0.05        # part of the rate regained after each success
+
+_limiters: dict[str, "RateLimiter"] = {}
+
+
+@dataclass
+class Budget:
+    service: str
+    used: float         # spent today
+    remaining: float    # left today
+    daily_limit: float
+    rate: float         # current sustained rate per second
+    available: float    # can be spent right now without waiting
+
+
+def get(service: str) -> "RateLimiter | None":
+    """Get the installed limiter for a service, or None if there is none."""
+    return _limiters.get(service)
+
+
+def install(limiter: "RateLimiter") -> None:
+    """Use a limiter for every request to its service."""
+    _limiters[limiter.service] = limiter
+
+
+def default_limiters(filename: str = "rate_limits.sqlite3") -> list["RateLimiter"]:
+    """Create limiters with the published limits of NCEI and GeoNames.
+
+    Both limiters keep their accounting in the same file, so every
+    program and process using the file shares the same budget.
+    """
+    return [
+        RateLimiter(NCEI, NCEI_RATE, daily_limit=NCEI_DAILY_LIMIT, filename=filename),
+        RateLimiter(GEONAMES, GEONAMES_RATE, capacity=GEONAMES_BURST,
+                    daily_limit=GEONAMES_DAILY_LIMIT, filename=filename),
+    ]
+
+
+def install_defaults(filename: str = "rate_limits.sqlite3") -> None:
+    """Install the limiters from default_limiters()."""
+    for limiter in default_limiters(filename):
+        install(limiter)
+
+
+def uninstall_all() -> None:
+    """Remove the installed limiters and close their files."""
+    while _limiters:
+        _, limiter = _limiters.popitem()
+        limiter.close()
+
+
+class RateLimiter:
+    """Token bucket limiter with a daily quota for one web service.
+
+    The bucket refills at rate tokens per second up to capacity, and
+    each request spends cost tokens. Requests are also counted against
+    a daily limit, which resets at midnight UTC. The bucket and the
+    daily count are kept in a SQLite database and updated in a single
+    transaction, so they survive restarts and are shared by every
+    process using the same file.
+
+    When the service reports throttling, the rate is halved and
+    requests pause. Each successful request then regains a little of
+    the rate until it is back to the published one.
+    """
+    def __init__(self, service: str, rate: float, *, capacity: float | None = None,
+                 daily_limit: float | None = None,
+                 filename: str = "rate_limits.sqlite3") -> None:
+        """Create a limiter.
+
+        Args:
+            service: The name of the service the limiter is for.
+            rate: The published number of tokens per second.
+            capacity: The most tokens that can be spent at once. Defaults
+                      to one second's worth of tokens, at least 1.
+            daily_limit: The most tokens that can be spent per day. There
+                         is no daily limit if not given.
+            filename: The database file. Use ":memory:" for accounting
+                      that is not saved.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.service = service
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.daily_limit = daily_limit
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename, check_same_thread=False,
+                                           isolation_level=None, timeout=30)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "service TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL,"
+            "rate REAL NOT NULL, blocked_until REAL NOT NULL,"
+            "day TEXT NOT NULL, used REAL NOT NULL)"
+        )
+
+    def acquire(self, cost: float = 1) -> None:
+        """Wait until a request can be sent and spend its tokens.
+
+        Raises:
+            RuntimeError: The daily limit would be exceeded.
+        """
+        while (delay := self._reserve(cost)) > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, cost: float = 1) -> None:
+        """Like acquire(), but waits without blocking the event loop.
+
+        The database can be locked by another process for a while, so
+        the tokens are reserved in the loop's default executor.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while (delay := await loop.run_in_executor(None, self._reserve, cost)) > 0:
+            await asyncio.sleep(delay)
+
+    def throttled(self, retry_after: float | None = None) -> None:
+        """Slow down after the service reported too many requests.
+
+        Args:
+            retry_after: The seconds the service asked to wait, if it did.
+        """
+        with self._transaction() as state:
+            state["rate"] = max(state["rate"] / 2, self.rate * MIN_RATE_FRACTION)
+            state["tokens"] = 0.0
+            delay = retry_after if retry_after is not None else 1 / state["rate"]
+            state["blocked_until"] = max(state["blocked_until"], state["updated"] + delay)
+
+    def succeeded(self) -> None:
+        """Regain some of the rate lost to throttling after a success."""
+        with self._transaction() as state:
+            if state["rate"] < self.rate:
+                state["rate"] = min(self.rate,
+                                    state["rate"] + self.rate * RECOVERY_FRACTION)
+
+    def exhaust(self) -> None:
+        """Use up the rest of today's budget, e.g. when the service says it is gone."""
+        with self._transaction() as state:
+            if self.daily_limit is not None:
+                state["used"] = max(state["used"], self.daily_limit)
+
+    def remaining(self) -> Budget:
+        """Get the budget left today and the current rate."""
+        with self._transaction() as state:
+            used = state["used"]
+            remaining = (float("inf") if self.daily_limit is None
+                         else max(self.daily_limit - used, 0))
+            available = min(state["tokens"], remaining)
+            if state["blocked_until"] > state["updated"]:
+                available = 0.0
+            return Budget(self.service, used, remaining,
+                          self.daily_limit if self.daily_limit is not None else float("inf"),
+                          state["rate"], available)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _reserve(self, cost: float) -> float:
+        """Spend the tokens for a request if it can be sent now.
+
+        Returns:
+            0 if the tokens were spent, otherwise the seconds to wait
+            before trying again.
+        """
+        if cost > self.capacity:
+            raise ValueError(f"cost must be at most {self.capacity}")
+        with self._transaction() as state:
+            if self.daily_limit is not None and state["used"] + cost > self.daily_limit:
+                raise RuntimeError(f"Daily limit of {self.daily_limit:g} reached "
+                                   f"for {self.service}")
+            now = state["updated"]
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+            if state["tokens"] < cost:
+                return (cost - state["tokens"]) / state["rate"]
+            state["tokens"] -= cost
+            state["used"] += cost
+            return 0.0
+
+    @contextmanager
+    def _transaction(self) -> Iterator[dict[str, Any]]:
+        """Load the bucket, refilled to now, and save it when done."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")  # lock out other processes
+            try:
+                now = time.time()
+                today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+                row = self._connection.execute(
+                    "SELECT tokens, updated, rate, blocked_until, day, used "
+                    "FROM buckets WHERE service = ?", (self.service,)
+                ).fetchone()
+                if row is None:
+                    row = (self.capacity, now, self.rate, 0.0, today, 0.0)
+                tokens, updated, rate, blocked_until, day, used = row
+                refill = max(now - max(updated, blocked_until), 0) * rate
+                state = {"tokens": min(self.capacity, tokens + refill),
+                         "updated": now, "rate": rate, "blocked_until": blocked_until,
+                         "day": today, "used": used if day == today else 0.0}
+                yield state
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.service, state["tokens"], state["updated"], state["rate"],
+                     state["blocked_until"], state["day"], state["used"])
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+
+def main():
+    filename = sys.argv[1] if len(sys.argv) > 1 else "rate_limits.sqlite3"
+    for limiter in default_limiters(filename):
+        print(format_budget(limiter.remaining()))
+        limiter.close()
+
+
+def format_budget(budget: Budget) -> str:
+    return (f"{budget.service}: {budget.remaining:g} of {budget.daily_limit:g} left "
+            f"today, {budget.rate:.3g}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+import metrics
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MEMORY_ENTRIES = 256
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def cache_key(endpoint: str, params: dict[str, Any]) -> str:
+    """Create a cache key from an endpoint and its URL parameters.
+
+    Parameters are sorted by name and list values are sorted, so the
+    same query always produces the same key no matter how it was built.
+    """
+    normalized = []
+    for name, value in sorted(params.items()):
+        if isinstance(value, (list, tuple, set)):
+            value = sorted(str(v) for v in value)
+        else:
+            value = str(value)
+        normalized.append([name, value])
+    return json.dumps([endpoint, normalized], separators=(',', ':'))
+
+
+def load(filename: str = "ncdc_cache.sqlite3", **kwargs: Any) -> "ResponseCache":
+    """Open the response cache stored in the given file."""
+    return ResponseCache(filename, **kwargs)
+
+
+class ResponseCache:
+    """Persistent cache of parsed web service responses.
+
+    Responses are stored in a SQLite database. When the total size of
+    the stored responses exceeds the size budget, the least recently
+    used responses are evicted. Recently used responses are also kept
+    in memory so repeated lookups do not touch the database. They are
+    kept as JSON text and parsed on every hit, so each caller gets its
+    own copy to change.
+
+    Threads that use single_flight() send each request at most once at a
+    time: a thread that wants a response another thread is requesting
+    waits for it and reads it from the cache.
+    """
+    def __init__(self, filename: str = "ncdc_cache.sqlite3", *,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: float | None = None,
+                 memory_entries: int = DEFAULT_MEMORY_ENTRIES) -> None:
+        """Open the cache.
+
+        Args:
+            filename: The database file. Use ":memory:" for a cache that
+                      is not saved.
+            max_bytes: The size budget for stored responses.
+            ttl: The number of seconds a response stays valid. Responses
+                 never expire if not given.
+            memory_entries: The number of responses to keep in memory.
+        """
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._accessed: dict[str, float] = {}
+        self._session = CacheStats()
+        self._flights: dict[str, threading.Event] = {}  # key -> set when requested
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+        self._size, = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+
+    def __enter__(self) -> "ResponseCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @metrics.timed("cache.get")
+    def get(self, endpoint: str, params: dict[str, Any]) -> Any | None:
+        """Get a cached response or None if it is not cached."""
+        key = cache_key(endpoint, params)
+        now = time.time()
+        with self._lock:
+            try:
+                created, value = self._memory[key]
+            except KeyError:
+                row = self._connection.execute(
+                    "SELECT value, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self._session.misses += 1
+                    metrics.count("cache.miss")
+                    return None
+                value, created = row
+                self._remember(key, created, value)
+            if self._expired(created, now):
+                self._delete(key)
+                self._session.misses += 1
+                metrics.count("cache.miss")
+                return None
+            self._memory.move_to_end(key)
+            self._accessed[key] = now
+            self._session.hits += 1
+            metrics.count("cache.hit")
+        return json.loads(value)
+
+    @contextmanager
+    def single_flight(self, endpoint: str, params: dict[str, Any]) -> Iterator[Any | None]:
+        """Get a cached response, or claim the request for it.
+
+        Yields the cached response if there is one. Otherwise yields None,
+        and the caller should send the request and put() its response.
+        Until the caller is done, other threads asking for the same
+        response wait, then check the cache again. If the request
+        failed, the next of them sends it.
+        """
+        key = cache_key(endpoint, params)
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+            if flight is not None:
+                flight.wait()
+                continue
+            response = self.get(endpoint, params)
+            if response is not None:
+                yield response
+                return
+            with self._lock:
+                if key not in self._flights:
+                    flight = self._flights[key] = threading.Event()
+                    break
+        try:
+            yield None
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.set()
+
+    @metrics.timed("cache.put")
+    def put(self, endpoint: str, params: dict[str, Any], response: Any) -> None:
+        """Store a response in the cache."""
+        key = cache_key(endpoint, params)
+        value = json.dumps(response, separators=(',', ':'))
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            with self._connection:
+                old = self._connection.execute(
+                    "SELECT size FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now)
+                )
+            self._size += size - (old[0] if old else 0)
+            self._accessed.pop(key, None)
+            self._remember(key, now, value)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def stats(self) -> CacheStats:
+        """Get the hit and miss statistics for this session."""
+        with self._lock:
+            entries, = self._connection.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()
+            return CacheStats(self._session.hits, self._session.misses,
+                              self._session.evictions, entries, self._size)
+
+    def total_stats(self) -> CacheStats:
+        """Get the statistics for every session that used the cache file."""
+        stats = self.stats()
+        with self._lock:
+            for name, value in self._connection.execute(
+                    "SELECT name, value FROM counters"):
+                setattr(stats, name, getattr(stats, name) + value)
+        return stats
+
+    def clear(self) -> None:
+        """Remove every response from the cache."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+            self._memory.clear()
+            self._accessed.clear()
+            self._size = 0
+
+    def close(self) -> None:
+        """Save the access times and statistics and close the database."""
+        with self._lock:
+            with self._connection:
+                self._flush_accessed()
+                for name in ("hits", "misses", "evictions"):
+                    self._connection.execute(
+                        "INSERT INTO counters VALUES (?, ?) ON CONFLICT (name) "
+                        "DO UPDATE SET value = value + excluded.value",
+                        (name, getattr(self._session, name))
+                    )
+            self._session = CacheStats()
+            self._connection.close()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key: str, created: float, value: str) -> None:
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _delete(self, key: str) -> None:
+        with self._connection:
+            row = self._connection.execute(
+                "DELETE FROM responses WHERE key = ? RETURNING size", (key,)
+            ).fetchone()
+        if row:
+            self._size -= row[0]
+        self._memory.pop(key, None)
+        self._accessed.pop(key, None)
+
+    def _flush_accessed(self) -> None:
+        """Write the access times of responses served from memory."""
+        self._connection.executemany(
+            "UPDATE responses SET accessed = ? WHERE key = ?",
+            [(accessed, key) for key, accessed in self._accessed.items()]
+        )
+        self._accessed.clear()
+
+    def _evict(self) -> None:
+        """Evict the least recently used responses until under budget."""
+        with self._connection:
+            self._flush_accessed()
+            rows = self._connection.execute(
+                "SELECT key, size FROM responses ORDER BY accessed"
+            )
+            evicted = []
+            for key, size in rows:
+                if self._size <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                self._size -= size
+                self._memory.pop(key, None)
+            rows.close()
+            self._connection.executemany(
+                "DELETE FROM responses WHERE key = ?", evicted
+            )
+        self._session.evictions += len(evicted)
+
+
+def main():
+    filename = sys.argv[1] if len(sys.argv) > 1 else "ncdc_cache.sqlite3"
+    with load(filename) as cache:
+        stats = cache.total_stats()
+    print(f"Entries:   {stats.entries}")
+    print(f"Size:      {stats.size} bytes")
+    print(f"Hits:      {stats.hits}")
+    print(f"Misses:    {stats.misses}")
+    print(f"Hit rate:  {stats.hit_rate:.1%}")
+    print(f"Evictions: {stats.evictions}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import csv
+import heapq
+import math
+import os
+from collections import defaultdict
+from typing import Iterable, Literal
+
+import ncdc_api
+from location_coordinates import LocationCoordinates, from_meridians, from_parallels
+from ncdc_api import StationArray, StationInfo
+
+
+CELL_SIZE = 1.0  # degrees of latitude and longitude covered by each grid cell
+FIELDNAMES = ["id", "name", "latitude", "longitude"]
+
+
+def sync(token: str, filename: str = "station_catalog.csv") -> int:
+    """Download every station that reports frost probabilities.
+
+    Args:
+        token: The NCDC web service token used to retrieve the data.
+        filename: The file to save the catalog to.
+    Returns:
+        The number of stations in the catalog.
+    """
+    stations = [
+        station
+        for page in ncdc_api.iter_stations_in_extent(token, None)
+        for station in page
+    ]
+    save(stations, filename)
+    return len(stations)
+
+
+def save(stations: Iterable[StationInfo], filename: str = "station_catalog.csv") -> None:
+    """Save a list of stations as the station catalog."""
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(FIELDNAMES)
+        for station in stations:
+            writer.writerow([station.id, station.name,
+                             station.location.latitude, station.location.longitude])
+    os.replace(temp_filename, filename)
+
+
+def load(filename: str = "station_catalog.csv") -> "StationCatalog | None":
+    """Load the station catalog if it has been downloaded."""
+    stations = StationArray()
+    try:
+        with open(filename, 'r', newline='') as csvfile:
+            reader = csv.DictReader(csvfile)
+            for row in reader:
+                stations.append_values(row['id'], row['name'],
+                                       row['latitude'], row['longitude'])
+    except FileNotFoundError:
+        return None
+    except (KeyError, ValueError):
+        raise RuntimeError("Unexpected station catalog format")
+    return StationCatalog(stations)
+
+
+class StationCatalog:
+    """Local copy of the stations with a grid index for spatial queries.
+
+    Stations are grouped into grid cells of CELL_SIZE degrees, so a
+    query only looks at the stations in the cells it overlaps.
+    """
+    def __init__(self, stations: Iterable[StationInfo]) -> None:
+        if not isinstance(stations, StationArray):
+            stations = StationArray(stations)
+        self.stations = StationArray()
+        self._cells: dict[tuple[int, int], list[int]] = defaultdict(list)
+        self.add(stations)
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def add(self, stations: Iterable[StationInfo]) -> None:
+        """Add stations to the catalog."""
+        if not isinstance(stations, StationArray):
+            stations = StationArray(stations)
+        start = len(self.stations)
+        self.stations.extend(stations)
+        for index, (latitude, longitude) in enumerate(zip(stations.latitudes,
+                                                          stations.longitudes), start):
+            self._cells[_cell(latitude, longitude)].append(index)
+        rows = [row for row, _ in self._cells]
+        columns = [column for _, column in self._cells]
+        self._grid_bounds = (min(rows, default=0), min(columns, default=0),
+                             max(rows, default=0), max(columns, default=0))
+
+    def within_bounds(self, lat_lo: float, lng_lo: float,
+                      lat_hi: float, lng_hi: float) -> list[StationInfo]:
+        """Get the stations inside a boundary, edges included."""
+        row_lo, column_lo = _cell(lat_lo, lng_lo)
+        row_hi, column_hi = _cell(lat_hi, lng_hi)
+        latitudes, longitudes = self.stations.latitudes, self.stations.longitudes
+        result = []
+        for row in range(row_lo, row_hi + 1):
+            for column in range(column_lo, column_hi + 1):
+                for index in self._cells.get((row, column), ()):
+                    if (lat_lo <= latitudes[index] <= lat_hi
+                            and lng_lo <= longitudes[index] <= lng_hi):
+                        result.append(self.stations[index])
+        return result
+
+    def near(self, location: LocationCoordinates, radius: float,
+             unit: Literal['miles', 'km']) -> list[StationInfo]:
+        """Get the stations that a search of the web service would return.
+
+        The boundary is the same one ncdc_api.get_nearby_stations() uses.
+        """
+        extent = location.googleapi_latlngbounds_urlvalue(radius, unit)
+        lat_lo, lng_lo, lat_hi, lng_hi = (float(value) for value in extent.split(','))
+        return self.within_bounds(lat_lo, lng_lo, lat_hi, lng_hi)
+
+    def nearest(self, location: LocationCoordinates, k: int,
+                unit: Literal['miles', 'km'] = 'miles') -> list[StationInfo]:
+        """Get the k stations nearest to a location, nearest first.
+
+        Rings of grid cells around the location are searched until no
+        unsearched cell can hold a station closer than the k-th nearest
+        station found so far.
+        """
+        if k < 1 or not self.stations:
+            return []
+        per_parallel = from_parallels(1.0, unit)
+        per_meridian = from_meridians(1.0, unit)
+        ring_distance = CELL_SIZE * min(per_parallel, per_meridian)
+        latitudes, longitudes = self.stations.latitudes, self.stations.longitudes
+        center_row, center_column = _cell(location.latitude, location.longitude)
+        row_lo, column_lo, row_hi, column_hi = self._grid_bounds
+        max_ring = max(center_row - row_lo, row_hi - center_row,
+                       center_column - column_lo, column_hi - center_column)
+        heap = []  # the k nearest so far as (-distance, index)
+        for ring in range(max_ring + 1):
+            for row, column in _ring_cells(center_row, center_column, ring):
+                for index in self._cells.get((row, column), ()):
+                    distance = math.hypot(
+                        (longitudes[index] - location.longitude) * per_meridian,
+                        (latitudes[index] - location.latitude) * per_parallel
+                    )
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-distance, index))
+                    elif distance < -heap[0][0]:
+                        heapq.heapreplace(heap, (-distance, index))
+            # every station in a later ring is at least this far away
+            if len(heap) == k and -heap[0][0] <= ring * ring_distance:
+                break
+        return [self.stations[index] for _, index in sorted(heap, reverse=True)]
+
+
+def _cell(latitude: float, longitude: float) -> tuple[int, int]:
+    return math.floor(latitude / CELL_SIZE), math.floor(longitude / CELL_SIZE)
+
+
+def _ring_cells(center_row: int, center_column: int, ring: int):
+    """Generate the cells that are exactly ring cells from the center."""
+    if ring == 0:
+        yield center_row, center_column
+        return
+    for column in range(center_column - ring, center_column + ring + 1):
+        yield center_row - ring, column
+        yield center_row + ring, column
+    for row in range(center_row - ring + 1, center_row + ring):
+        yield row, center_column - ring
+        yield row, center_column + ring
+
+
+def main():
+    count = sync(ncdc_api.load_token())
+    print(f"Wrote {count} stations to station_catalog.csv")
+
+
+if __name__ == "__main__":
+    main()
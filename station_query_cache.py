@@ -0,0 +1,157 @@
+import threading
+from typing import Iterable, Iterator, Literal
+
+import ncdc_api
+from location_coordinates import LocationCoordinates
+from ncdc_api import NoResultsError, StationInfo
+from response_cache import ResponseCache
+from station_catalog import StationCatalog
+
+
+Box = tuple[float, float, float, float]  # lat_lo, lng_lo, lat_hi, lng_hi
+TOLERANCE = 1e-9  # degrees; extents are rounded to 0.001 so real gaps are larger
+
+
+def parse_extent(extent: str) -> Box:
+    """Get the boundary of a LatLngBounds URL value."""
+    lat_lo, lng_lo, lat_hi, lng_hi = (float(value) for value in extent.split(','))
+    return lat_lo, lng_lo, lat_hi, lng_hi
+
+
+def format_extent(box: Box) -> str:
+    """Get the LatLngBounds URL value of a boundary."""
+    return ','.join(f'{value:.3f}' for value in box)
+
+
+def contains(outer: Box, inner: Box) -> bool:
+    """Check whether a boundary is inside another one, edges included."""
+    return (outer[0] <= inner[0] + TOLERANCE and outer[1] <= inner[1] + TOLERANCE
+            and inner[2] <= outer[2] + TOLERANCE and inner[3] <= outer[3] + TOLERANCE)
+
+
+def subtract(box: Box, other: Box) -> list[Box]:
+    """Get the parts of a boundary that are outside another one.
+
+    The parts are up to four boxes: the bands below and above the other
+    box, across the full width, and the parts to its left and right
+    between them.
+    """
+    lat_lo, lng_lo, lat_hi, lng_hi = box
+    other_lat_lo, other_lng_lo, other_lat_hi, other_lng_hi = other
+    if (other_lat_lo >= lat_hi or other_lat_hi <= lat_lo
+            or other_lng_lo >= lng_hi or other_lng_hi <= lng_lo):
+        return [box]
+    parts = []
+    if other_lat_lo > lat_lo + TOLERANCE:
+        parts.append((lat_lo, lng_lo, other_lat_lo, lng_hi))
+    if other_lat_hi < lat_hi - TOLERANCE:
+        parts.append((other_lat_hi, lng_lo, lat_hi, lng_hi))
+    middle_lo, middle_hi = max(lat_lo, other_lat_lo), min(lat_hi, other_lat_hi)
+    if other_lng_lo > lng_lo + TOLERANCE:
+        parts.append((middle_lo, lng_lo, middle_hi, other_lng_lo))
+    if other_lng_hi < lng_hi - TOLERANCE:
+        parts.append((middle_lo, other_lng_hi, middle_hi, lng_hi))
+    return parts
+
+
+def uncovered(box: Box, covered: Iterable[Box]) -> list[Box]:
+    """Get the parts of a boundary that none of the covered boundaries contain."""
+    parts = [box]
+    for other in covered:
+        parts = [part for remaining in parts for part in subtract(remaining, other)]
+        if not parts:
+            break
+    return parts
+
+
+class StationQueryCache:
+    """Station searches answered from the boundaries already searched.
+
+    Every boundary that has been searched is remembered along with the
+    stations found in it. A search inside a remembered boundary is
+    answered by filtering those stations, and a larger or shifted search
+    only requests the parts of its boundary that have not been searched.
+    A boundary is only remembered once all of its pages have arrived.
+
+    The stations are kept in memory for the life of the object. The
+    requests for the parts still go through the response cache, if one
+    is given.
+    """
+    def __init__(self, token: str, cache: ResponseCache | None = None,
+                 limit: int | None = None) -> None:
+        """Create an empty station query cache.
+
+        Args:
+            token: The NCDC web service token used to retrieve the data.
+            cache: The cache to check before sending each request.
+            limit: The number of stations to request per page. Uses
+                   ncdc_api.STATIONS_PAGE_LIMIT if not given.
+        """
+        self.token = token
+        self.cache = cache
+        self.limit = limit
+        self._boxes: list[Box] = []
+        self._catalog = StationCatalog([])
+        self._ids: set[str] = set()
+        self._lock = threading.Lock()
+
+    def get_nearby_stations(self, location: LocationCoordinates, radius: float,
+                            unit: Literal['miles', 'km']) -> list[StationInfo]:
+        """Get the stations ncdc_api.get_nearby_stations() would return."""
+        return [station
+                for page in self.iter_nearby_stations(location, radius, unit)
+                for station in page]
+
+    def iter_nearby_stations(self, location: LocationCoordinates, radius: float,
+                             unit: Literal['miles', 'km']) -> Iterator[list[StationInfo]]:
+        """Get the stations near a location one page at a time."""
+        extent = location.googleapi_latlngbounds_urlvalue(radius, unit)
+        return self.iter_stations_in_extent(extent)
+
+    def iter_stations_in_extent(self, extent: str) -> Iterator[list[StationInfo]]:
+        """Get the stations inside a boundary one page at a time.
+
+        The stations already known to be inside the boundary come first,
+        as one page, followed by the pages for the parts that had not
+        been searched.
+
+        Raises:
+            RuntimeError: A request failed, or there are no stations in
+                          the boundary.
+        """
+        box = parse_extent(extent)
+        with self._lock:
+            parts = uncovered(box, self._boxes)
+            known = self._catalog.within_bounds(*box)
+        seen = {station.id for station in known}
+        if known:
+            yield known
+        for part in parts:
+            try:
+                for page in ncdc_api.iter_stations_in_extent(
+                        self.token, format_extent(part), self.cache, self.limit):
+                    self._add(page)
+                    page = [station for station in page if station.id not in seen]
+                    seen.update(station.id for station in page)
+                    if page:
+                        yield page
+            except NoResultsError:
+                pass
+            self._cover(part)
+        self._cover(box)
+        if not seen:
+            raise NoResultsError('No results')
+
+    def _add(self, stations: list[StationInfo]) -> None:
+        with self._lock:
+            new = [station for station in stations if station.id not in self._ids]
+            self._ids.update(station.id for station in new)
+            self._catalog.add(new)
+
+    def _cover(self, box: Box) -> None:
+        """Remember that every station in a boundary is known."""
+        with self._lock:
+            if any(contains(other, box) for other in self._boxes):
+                return
+            self._boxes = [other for other in self._boxes if not contains(box, other)]
+            self._boxes.append(box)
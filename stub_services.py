@@ -0,0 +1,241 @@
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+from urllib.parse import parse_qs, urlsplit
+
+
+Route = Callable[[dict[str, list[str]]], tuple[int, Any]]
+
+
+class StubServer:
+    """Local HTTP server that stands in for a web service.
+
+    Each route maps a URL path to a function that takes the parsed
+    query parameters and returns a status code and a JSON payload.
+    Connections are kept alive like they are by the real services.
+    """
+    def __init__(self, routes: dict[str, Route], latency: float = 0.0) -> None:
+        """Create the server on a free local port.
+
+        Args:
+            routes: The functions used to answer each URL path.
+            latency: Seconds to wait before answering each request.
+        """
+        self.routes = routes
+        self.latency = latency
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), _make_handler(self))
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def handle(self, path: str, params: dict[str, list[str]]) -> tuple[int, Any]:
+        """Answer a request for the given path and parameters."""
+        with self._count_lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        route = self.routes.get(path)
+        if route is None:
+            return 404, {"status": {"message": f"Not found: {path}", "value": 404}}
+        return route(params)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # accept many clients connecting at once
+
+
+def _make_handler(stub: StubServer) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self) -> None:
+            url = urlsplit(self.path)
+            status, payload = stub.handle(url.path, parse_qs(url.query))
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+# Known ZIP codes for the fake GeoNames service. Other ZIP codes get a
+# made-up place a few miles from one of the fake stations.
+KNOWN_PLACES = {
+    "68008": ("Blair", "Washington", "NE", 41.5437, -96.1347),
+    "68102": ("Omaha", "Douglas", "NE", 41.2587, -95.9378),
+    "68503": ("Lincoln", "Lancaster", "NE", 40.8231, -96.6761),
+    "10001": ("New York", "New York", "NY", 40.7484, -73.9967),
+    "80202": ("Denver", "Denver", "CO", 39.7491, -104.9946),
+    "98101": ("Seattle", "King", "WA", 47.6114, -122.3305),
+}
+STATION_COUNT = 7500  # about the number of stations with frost probability normals
+
+
+class FakeServices:
+    """Fake GeoNames and NCEI services that answer like the real ones.
+
+    The payloads have the same fields as real responses. The stations
+    are spread over the contiguous US at random, with a fixed seed so
+    every run sees the same stations, plus one near each known place.
+    Every station reports the frost date and growing season data types
+    and the monthly minimum temperature normals. Data requests can name
+    several stations and are paged. Station searches honor the extent
+    and are paged, with pages no larger than page_size.
+    """
+    def __init__(self, station_count: int = STATION_COUNT,
+                 page_size: int = 1000, seed: int = 1620) -> None:
+        """Create the fake services.
+
+        Args:
+            station_count: The number of stations to make up.
+            page_size: The largest page of stations returned, whatever
+                       limit is requested.
+            seed: The seed used to place the stations.
+        """
+        import random
+
+        rng = random.Random(seed)
+        self.page_size = page_size
+        self.stations = []
+        places = [(latitude + 0.05, longitude - 0.05)
+                  for *_, latitude, longitude in KNOWN_PLACES.values()]
+        for n in range(station_count):
+            if n < len(places):
+                latitude, longitude = places[n]
+            else:
+                latitude = round(rng.uniform(25.0, 49.0), 4)
+                longitude = round(rng.uniform(-124.0, -67.0), 4)
+            self.stations.append({
+                "elevation": round(rng.uniform(0, 3000), 1),
+                "mindate": "2010-01-01",
+                "maxdate": "2010-01-01",
+                "latitude": latitude,
+                "name": f"STATION {n}, US",
+                "datacoverage": 1,
+                "id": f"GHCND:USC{n:08d}",
+                "elevationUnit": "METERS",
+                "longitude": longitude,
+            })
+        self.stations.sort(key=lambda station: station["id"])
+        self._latitudes = {station["id"]: station["latitude"] for station in self.stations}
+
+    def routes(self) -> dict[str, Route]:
+        return {"/postalCodeSearchJSON": self.postal_code_search,
+                "/stations": self.search_stations,
+                "/data": self.data}
+
+    def server(self, latency: float = 0.0) -> StubServer:
+        """Create a stub server that answers with these services."""
+        return StubServer(self.routes(), latency)
+
+    def postal_code_search(self, params: dict[str, list[str]]) -> tuple[int, Any]:
+        zipcode = params.get("postalcode", [""])[0]
+        if not zipcode.isdigit() or len(zipcode) != 5 or zipcode == "00000":
+            return 200, {"postalCodes": []}
+        if zipcode in KNOWN_PLACES:
+            place, county, state, latitude, longitude = KNOWN_PLACES[zipcode]
+        else:
+            n = int(zipcode)
+            place, county, state = f"Town {zipcode}", f"County {n % 97}", "NE"
+            station = self.stations[n * 7919 % len(self.stations)]
+            latitude = round(station["latitude"] - 0.04, 4)
+            longitude = round(station["longitude"] + 0.06, 4)
+        return 200, {"postalCodes": [{
+            "adminCode2": "177", "adminCode1": state, "adminName2": county,
+            "lng": longitude, "countryCode": "US", "postalCode": zipcode,
+            "adminName1": state, "ISO3166-2": state, "placeName": place,
+            "lat": latitude,
+        }]}
+
+    def search_stations(self, params: dict[str, list[str]]) -> tuple[int, Any]:
+        offset = int(params.get("offset", ["1"])[0])
+        limit = min(int(params.get("limit", ["25"])[0]), self.page_size)
+        stations = self.stations
+        if "extent" in params:
+            lat_lo, lng_lo, lat_hi, lng_hi = (float(v) for v in params["extent"][0].split(","))
+            stations = [station for station in stations
+                        if lat_lo <= station["latitude"] <= lat_hi
+                        and lng_lo <= station["longitude"] <= lng_hi]
+        page = stations[offset - 1:offset - 1 + limit]
+        if not page:
+            return 200, {}  # the service sends an empty object when nothing matches
+        return 200, {
+            "metadata": {"resultset": {"offset": offset, "count": len(stations),
+                                       "limit": limit}},
+            "results": page,
+        }
+
+    def data(self, params: dict[str, list[str]]) -> tuple[int, Any]:
+        dataset = params.get("datasetid", ["NORMAL_ANN"])[0]
+        limit = min(int(params.get("limit", ["25"])[0]), 1000)
+        offset = int(params.get("offset", ["1"])[0])
+        results = [
+            result
+            for station_id in params.get("stationid", [])
+            if station_id in self._latitudes
+            for datatype in params.get("datatypeid", [])
+            for result in self._normals(dataset, station_id, datatype)
+        ]
+        page = results[offset - 1:offset - 1 + limit]
+        if not page:
+            return 200, {}
+        return 200, {
+            "metadata": {"resultset": {"offset": offset, "count": len(results),
+                                       "limit": limit}},
+            "results": page,
+        }
+
+    def _normals(self, dataset: str, station_id: str, datatype: str) -> list[dict[str, Any]]:
+        """Make up the values of a data type for a station."""
+        # farther north, frost comes earlier in fall and later in spring,
+        # and winters are colder
+        north = (self._latitudes[station_id] - 25.0) / 24.0
+        if dataset == "NORMAL_MLY":
+            if datatype != "MLY-TMIN-NORMAL":
+                return []
+            return [{"date": f"2010-{month:02d}-01T00:00:00", "datatype": datatype,
+                     "station": station_id, "attributes": "C",
+                     "value": round(48 - north * 25 - 20 * math.cos((month - 1) * math.pi / 6), 1)}
+                    for month in range(1, 13)]
+        if dataset != "NORMAL_ANN" or not datatype.startswith("ANN-TMIN-PRB"):
+            return []
+        temperature = int(datatype[-6:-4])
+        probability = int(datatype[-2:])
+        first = 330 - north * 45 - (temperature - 16) * 1.5 + (probability - 50) * 0.3
+        last = 50 + north * 45 + (temperature - 16) * 1.5 - (probability - 50) * 0.3
+        day = {"PRBFST": first, "PRBLST": last, "PRBGSL": first - last}.get(datatype[9:15])
+        if day is None:
+            return []
+        return [{"date": "2010-01-01T00:00:00", "datatype": datatype,
+                 "station": station_id, "attributes": "C", "value": int(day)}]
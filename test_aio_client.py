@@ -0,0 +1,147 @@
+import asyncio
+import gzip
+import threading
+import time
+
+import pytest
+
+import aio_client
+import geonames_api
+import ncdc_api
+from location_coordinates import LocationCoordinates
+from stub_services import StubServer
+
+
+def concurrency_tracker(route, delay):
+    """Wrap a route to record the most requests it handled at once."""
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0}
+
+    def tracked(params):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(delay)
+        with lock:
+            state["active"] -= 1
+        return route(params)
+    return tracked, state
+
+
+def postal_code_search(params):
+    zipcode = params["postalcode"][0]
+    return 200, {"postalCodes": [{"lat": 41.0, "lng": -96.0,
+                                  "placeName": f"Town {zipcode}", "ISO3166-2": "NE"}]}
+
+
+def test_thousands_of_concurrent_lookups(monkeypatch):
+    route, state = concurrency_tracker(postal_code_search, 0.01)
+    with StubServer({"/postalCodeSearchJSON": route}) as server:
+        monkeypatch.setattr(geonames_api, "GEONAMES_URL", server.url)
+        zipcodes = [f"{n:05d}" for n in range(2000)]
+
+        async def lookup_all():
+            async with aio_client.AsyncClient(max_connections=32) as client:
+                return await asyncio.gather(*(
+                    geonames_api.get_zipcode_location_async("user", zipcode, client)
+                    for zipcode in zipcodes
+                ))
+
+        start = time.perf_counter()
+        results = asyncio.run(lookup_all())
+        elapsed = time.perf_counter() - start
+    assert [result["zipcode"] for result in results] == zipcodes
+    assert results[5]["city"] == "Town 00005, NE"
+    assert state["peak"] <= 32
+    assert state["peak"] > 1
+    assert server.request_count == len(zipcodes)
+    assert elapsed < len(zipcodes) * 0.01 / 4  # far faster than one at a time
+
+
+def paged_stations(params):
+    offset = int(params["offset"][0])
+    ids = range(offset, min(offset + int(params["limit"][0]), 26))
+    return 200, {
+        "metadata": {"resultset": {"offset": offset, "count": 25}},
+        "results": [{"id": f"GHCND:{n:011d}", "name": f"STATION {n}",
+                     "latitude": 41.0, "longitude": -96.0} for n in ids]
+    }
+
+
+def frost_dates(params):
+    return 200, {"results": [{"datatype": datatype, "value": 290}
+                             for datatype in params["datatypeid"]]}
+
+
+def test_ncdc_calls_match_blocking_versions(monkeypatch):
+    routes = {"/stations": paged_stations, "/data": frost_dates}
+    location = LocationCoordinates(latitude=41.3, longitude=-96.3)
+    with StubServer(routes) as server:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        monkeypatch.setattr(ncdc_api, "STATIONS_PAGE_LIMIT", 10)
+
+        async def lookup():
+            async with aio_client.AsyncClient(max_connections=4) as client:
+                return await asyncio.gather(
+                    ncdc_api.get_nearby_stations_async("token", location, 20, "miles",
+                                                       client=client),
+                    ncdc_api.get_frost_dates_async("token", "GHCND:USC00250070", "first",
+                                                   client=client)
+                )
+
+        stations, dates = asyncio.run(lookup())
+        blocking_stations = ncdc_api.get_nearby_stations("token", location, 20, "miles")
+        blocking_dates = ncdc_api.get_frost_dates("token", "GHCND:USC00250070", "first")
+    assert all(isinstance(station, ncdc_api.StationInfo) for station in stations)
+    assert [s.id for s in stations] == [s.id for s in blocking_stations]
+    assert len(stations) == 25
+    assert dates == blocking_dates
+
+
+def test_errors_are_runtime_errors(monkeypatch):
+    with StubServer({}) as server:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+
+        async def lookup():
+            async with aio_client.AsyncClient(retries=0) as client:
+                return await ncdc_api.get_frost_dates_async(
+                    "token", "GHCND:USC00250070", "first", client=client
+                )
+
+        with pytest.raises(RuntimeError, match="No results"):
+            asyncio.run(lookup())
+
+
+RAW_RESPONSES = {
+    "/empty": b"HTTP/1.1 204 No Content\r\n\r\n",
+    "/moved": b"HTTP/1.1 302 Found\r\nLocation: /gzip?n=1\r\nContent-Length: 0\r\n\r\n",
+    "/gzip?n=1": (b"HTTP/1.1 200 OK\r\nContent-Encoding: gzip\r\nContent-Length: %d\r\n\r\n"
+                  % len(gzip.compress(b'{"n": 1}')) + gzip.compress(b'{"n": 1}')),
+    "/unframed": b"HTTP/1.1 200 OK\r\nConnection: close\r\n\r\n[1, 2]",
+}
+
+
+def test_bodyless_redirected_and_compressed_responses():
+    async def handle(reader, writer):
+        while True:
+            request = await reader.readuntil(b"\r\n\r\n")
+            target = request.split(b" ")[1].decode()
+            writer.write(RAW_RESPONSES[target])
+            await writer.drain()
+            if target == "/unframed":
+                writer.close()
+                return
+
+    async def lookup():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        url = "http://127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+        async with server, aio_client.AsyncClient(retries=0, timeout=(1, 1)) as client:
+            empty = await client.get(url + "/empty")
+            moved = await client.get(url + "/moved")
+            unframed = await client.get(url + "/unframed")
+        return empty, moved, unframed
+
+    empty, moved, unframed = asyncio.run(asyncio.wait_for(lookup(), 5))
+    assert (empty.status_code, empty.content) == (204, b"")
+    assert (moved.status_code, moved.json()) == (200, {"n": 1})
+    assert unframed.json() == [1, 2]
@@ -0,0 +1,190 @@
+import time
+
+import pytest
+from PyQt5.QtCore import QCoreApplication, QEventLoop
+
+import async_controllers
+import geonames_api
+import ncdc_api
+import response_cache
+from location_coordinates import LocationCoordinates
+from stub_services import StubServer
+
+
+def frost_dates(params):
+    return 200, {"results": [{"datatype": datatype, "value": 290}
+                             for datatype in params["datatypeid"]]}
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def wait_for(condition, timeout=5.0):
+    """Process events until the condition is true or the timeout."""
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        QCoreApplication.processEvents(QEventLoop.AllEvents, 50)
+    return condition()
+
+
+def test_frost_dates_requested_concurrently(app, monkeypatch):
+    latency = 0.3
+    with StubServer({"/data": frost_dates}, latency=latency) as server:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        controller = async_controllers.GetFrostDatesAsyncController("token")
+        results = {}
+        controller.result_ready.connect(
+            lambda request_id, kind, result: results.update({kind: result})
+        )
+        finished = []
+        controller.finished.connect(finished.append)
+        start = time.perf_counter()
+        controller.sendRequest("GHCND:USC00250070")
+        wait_for(lambda: finished)
+        elapsed = time.perf_counter() - start
+    assert set(results) == {"first", "last"}
+    assert results["first"].short_date(4, 4) == "Oct 17"  # 32 ℉, 50%
+    assert results["last"].rows() == [[290] * 9] * 6
+    assert elapsed < 2 * latency
+
+
+def postal_code_search(params):
+    zipcode = params["postalcode"][0]
+    if zipcode == "00000":
+        return 200, {"postalCodes": []}
+    return 200, {"postalCodes": [{"lat": 41.0, "lng": -96.0,
+                                  "placeName": f"Town {zipcode}", "ISO3166-2": "NE"}]}
+
+
+def test_overlapping_requests_are_correlated(app, monkeypatch):
+    with StubServer({"/postalCodeSearchJSON": postal_code_search}, latency=0.05) as server:
+        monkeypatch.setattr(geonames_api, "GEONAMES_URL", server.url)
+        controller = async_controllers.GetZIPCodeAsyncController("user")
+        results = {}
+        errors = {}
+        finished = []
+        controller.result_ready.connect(
+            lambda request_id, result: results.update({request_id: result["zipcode"]})
+        )
+        controller.error_raised.connect(
+            lambda request_id, message: errors.update({request_id: message})
+        )
+        controller.finished.connect(finished.append)
+        zipcodes = [f"{n:05d}" for n in range(68001, 68021)] + ["00000"]
+        request_ids = {controller.sendRequest(zipcode): zipcode for zipcode in zipcodes}
+        wait_for(lambda: len(finished) == len(zipcodes))
+    assert len(request_ids) == len(zipcodes)
+    assert sorted(finished) == sorted(request_ids)
+    assert {request_ids[request_id] for request_id in errors} == {"00000"}
+    assert all(request_ids[request_id] == zipcode for request_id, zipcode in results.items())
+    assert len(results) == len(zipcodes) - 1
+    assert controller.pendingRequests() == 0
+    assert async_controllers.thread_pool().maxThreadCount() == async_controllers.MAX_THREAD_COUNT
+
+
+def test_identical_requests_share_one_call(app, monkeypatch):
+    with StubServer({"/postalCodeSearchJSON": postal_code_search}, latency=0.1) as server:
+        monkeypatch.setattr(geonames_api, "GEONAMES_URL", server.url)
+        controller = async_controllers.GetZIPCodeAsyncController("user")
+        results = []
+        controller.result_ready.connect(lambda request_id, result: results.append(request_id))
+        first = controller.sendRequest("68002")
+        second = controller.sendRequest("68002")
+        wait_for(lambda: controller.pendingRequests() == 0)
+        assert first == second
+        assert results == [first]
+        assert server.request_count == 1
+        assert controller.sendRequest("68002") != first  # not in flight anymore
+        wait_for(lambda: controller.pendingRequests() == 0)
+
+
+def paged_stations(total):
+    def route(params):
+        offset = int(params["offset"][0])
+        limit = int(params["limit"][0])
+        ids = range(offset, min(offset + limit, total + 1))
+        return 200, {
+            "metadata": {"resultset": {"offset": offset, "count": total, "limit": limit}},
+            "results": [{"id": f"GHCND:{n:011d}", "name": f"STATION {n}",
+                         "latitude": 41.0, "longitude": -96.0} for n in ids]
+        }
+    return route
+
+
+def test_superseded_station_search_is_dropped(app, monkeypatch):
+    with StubServer({"/stations": paged_stations(50)}, latency=0.1) as server:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        monkeypatch.setattr(ncdc_api, "STATIONS_PAGE_LIMIT", 10)
+        controller = async_controllers.GetNearbyStationsAsyncController("token")
+        batches = {}
+        finished = []
+        controller.batch_ready.connect(
+            lambda request_id, batch: batches.setdefault(request_id, []).extend(batch)
+        )
+        controller.finished.connect(finished.append)
+        old = controller.sendRequest(LocationCoordinates(latitude=41.3, longitude=-96.3),
+                                     20, 'miles')
+        wait_for(lambda: old in batches)
+        seen = len(batches[old])
+        new = controller.sendRequest(LocationCoordinates(latitude=40.8, longitude=-96.7),
+                                     20, 'miles')
+        wait_for(lambda: finished)
+        wait_for(lambda: server.request_count >= 5 and not controller._requests)
+    assert finished == [new]
+    assert len(batches[old]) == seen
+    assert len(batches[new]) == 50
+    assert server.request_count < 10  # the old search stopped paging
+
+
+def test_prefetch_keeps_the_newest_hints(app, monkeypatch):
+    with StubServer({"/data": frost_dates}, latency=0.1) as server, \
+            response_cache.load(":memory:") as cache:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        controller = async_controllers.PrefetchController("token", cache, max_pending=2,
+                                                          concurrency=1)
+        for station_id in ("GHCND:A", "GHCND:B", "GHCND:C"):
+            controller.prefetchFrostDates(station_id)
+        assert controller.pendingPrefetches() == 2
+        wait_for(lambda: controller.pendingRequests() == 0
+                 and controller.pendingPrefetches() == 0)
+        assert server.request_count == 3  # A's first date, then C's two dates
+        for kind in ("first", "last"):
+            ncdc_api.get_frost_dates("token", "GHCND:C", kind, cache)
+        assert server.request_count == 3
+
+
+def test_click_joins_the_prefetch_in_flight(app, monkeypatch):
+    with StubServer({"/data": frost_dates}, latency=0.3) as server, \
+            response_cache.load(":memory:") as cache:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        prefetch = async_controllers.PrefetchController("token", cache)
+        controller = async_controllers.GetFrostDatesAsyncController("token", cache)
+        results = {}
+        controller.result_ready.connect(
+            lambda request_id, kind, result: results.update({kind: result})
+        )
+        finished = []
+        controller.finished.connect(finished.append)
+        prefetch.prefetchFrostDates("GHCND:USC00250070")
+        time.sleep(0.1)  # the prefetches are waiting for their responses
+        controller.sendRequest("GHCND:USC00250070")
+        wait_for(lambda: finished and prefetch.pendingRequests() == 0)
+    assert set(results) == {"first", "last"}
+    assert server.request_count == 2
+
+
+def test_unexpected_errors_are_reported(app, monkeypatch):
+    def get_frost_dates(token, station_id, kind, cache):
+        raise ValueError(f"bad {kind}")
+
+    monkeypatch.setattr(async_controllers, "get_frost_dates", get_frost_dates)
+    controller = async_controllers.GetFrostDatesAsyncController("token")
+    errors = []
+    controller.error_raised.connect(lambda request_id, message: errors.append(message))
+    finished = []
+    controller.finished.connect(finished.append)
+    controller.sendRequest("GHCND:USC00250070")
+    wait_for(lambda: finished)
+    assert sorted(errors) == ["bad first", "bad last"]
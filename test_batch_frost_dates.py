@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+import subprocess
+import sys
+import time
+
+import pytest
+
+import batch_frost_dates
+import geonames_api
+import ncdc_api
+import response_cache
+from stub_services import StubServer
+
+
+def postal_code_search(params):
+    zipcode = params["postalcode"][0]
+    if zipcode == "00000":
+        return 200, {"postalCodes": []}
+    return 200, {"postalCodes": [{"lat": 41.5437, "lng": -96.1347,
+                                  "placeName": "Blair", "ISO3166-2": "NE"}]}
+
+
+def stations(params):
+    return 200, {
+        "metadata": {"resultset": {"offset": 1, "count": 2, "limit": 1000}},
+        "results": [
+            {"id": "GHCND:USC00250070", "name": "ARLINGTON, NE US",
+             "latitude": 41.4536, "longitude": -96.3611},
+            {"id": "GHCND:USC00251145", "name": "BLAIR, NE US",
+             "latitude": 41.5417, "longitude": -96.1353},
+        ]
+    }
+
+
+def frost_dates(params):
+    return 200, {"results": [{"station": station_id, "datatype": datatype, "value": 290,
+                              "date": "2010-01-01T00:00:00"}
+                             for station_id in params["stationid"]
+                             for datatype in params["datatypeid"]]}
+
+
+@pytest.fixture
+def services(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    routes = {"/postalCodeSearchJSON": postal_code_search,
+              "/stations": stations, "/data": frost_dates}
+    with StubServer(routes) as server:
+        monkeypatch.setattr(geonames_api, "GEONAMES_URL", server.url)
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        yield server
+
+
+def run(zipcodes, output_format, output=None, **kwargs):
+    output = io.StringIO() if output is None else output
+    if isinstance(zipcodes, str):
+        zipcodes = batch_frost_dates.read_zipcodes(io.StringIO(zipcodes))
+    options = batch_frost_dates.PipelineOptions(username="user", token="token")
+    stats = batch_frost_dates.run(
+        zipcodes, batch_frost_dates.ResultWriter(output, output_format), options, **kwargs
+    )
+    return output.getvalue(), stats
+
+
+def test_csv_output(services):
+    output, stats = run("zipcode\n68008\n68008\n\n00000\n", "csv", workers=4)
+    rows = {row["zipcode"]: row for row in csv.DictReader(io.StringIO(output))}
+    assert set(rows) == {"68008", "00000"}
+    assert rows["68008"]["station_id"] == "GHCND:USC00251145"
+    assert rows["68008"]["ANN-TMIN-PRBFST-T32FP50"] == "Oct 17"
+    assert rows["68008"]["ANN-TMIN-PRBLST-T16FP90"] == "Oct 17"
+    assert rows["68008"]["error"] == ""
+    assert rows["00000"]["error"] == "ZIP code not found: 00000"
+    assert (stats.count, stats.errors) == (2, 1)
+    report = io.StringIO()
+    stats.report(report)
+    assert "2 ZIP codes (1 errors)" in report.getvalue()
+
+
+def test_jsonl_output_reuses_caches(services):
+    run("68008\n", "jsonl")
+    requests_before = services.request_count
+    output, stats = run("68008\n", "jsonl")
+    row = json.loads(output)
+    assert row["city"] == "Blair, NE"
+    assert len(row["first"]) == 54
+    assert services.request_count == requests_before
+
+
+def test_results_written_as_they_finish(services):
+    output = io.StringIO()
+    written_early = []
+
+    def zipcodes():
+        yield "68008"
+        time.sleep(0.5)
+        yield "68102"
+        written_early.append("68008" in output.getvalue())
+        yield "68123"
+
+    run(zipcodes(), "csv", output, workers=4)
+    assert written_early == [True]
+
+
+def test_process_workers_save_cache_stats(services):
+    output, stats = run("68008\n68102\n", "csv", workers=2, executor_kind="process")
+    assert (stats.count, stats.errors) == (2, 0)
+    with response_cache.load("ncdc_cache.sqlite3") as cache:
+        total = cache.total_stats()
+    assert total.hits + total.misses > 0
+
+
+def test_does_not_import_qt():
+    code = "import sys, batch_frost_dates; sys.exit('PyQt5' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+
+def test_unknown_executor_opens_nothing(services, tmp_path):
+    with pytest.raises(ValueError):
+        run("68008\n", "csv", executor_kind="fiber")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_station_without_frost_dates(services, monkeypatch):
+    monkeypatch.setitem(services.routes, "/data", lambda params: (200, {"results": []}))
+    output, stats = run("68008\n", "csv")
+    row = next(csv.DictReader(io.StringIO(output)))
+    assert row["error"] == "No results"
+    assert (stats.count, stats.errors) == (1, 1)
@@ -0,0 +1,74 @@
+import time
+import zipfile
+
+import pytest
+
+import gazetteer
+import zip_index
+
+
+DUMP = (
+    "US\t68008\tBlair\tNebraska\tNE\tWashington\t177\t\t\t41.5437\t-96.1347\t4\n"
+    "US\t00501\tHoltsville\tNew York\tNY\tSuffolk\t103\t\t\t40.8154\t-73.0451\t4\n"
+    "US\t99950\tKetchikan\tAlaska\tAK\tKetchikan Gateway\t130\t\t\t55.875\t-131.46\t\n"
+    "US\t68102\tOmaha\tNebraska\tNE\tDouglas\t055\t\t\t41.2587\t-95.9378\t4\n"
+)
+
+
+@pytest.fixture
+def dump_file(tmp_path):
+    filename = tmp_path / "US.txt"
+    filename.write_text(DUMP, encoding="utf-8")
+    return filename
+
+
+def test_build_and_lookup(dump_file, tmp_path):
+    filename = str(tmp_path / "gazetteer.dat")
+    assert gazetteer.build(str(dump_file), filename) == 4
+    with gazetteer.load(filename) as index:
+        assert len(index) == 4
+        assert list(index) == ["00501", "68008", "68102", "99950"]
+        assert index["68008"] == {"zipcode": "68008", "latitude": 41.5437,
+                                  "longitude": -96.1347, "city": "Blair, NE"}
+        assert index.get("99950")["city"] == "Ketchikan, AK"
+        assert "00501" in index
+        assert "12345" not in index
+        assert "1234" not in index
+        assert index.get("12345") is None
+        with pytest.raises(KeyError):
+            index["00000"]
+
+
+def test_build_from_zip_archive(dump_file, tmp_path):
+    archive_name = tmp_path / "US.zip"
+    with zipfile.ZipFile(archive_name, "w") as archive:
+        archive.writestr("readme.txt", "GeoNames postal codes")
+        archive.write(dump_file, "US.txt")
+    filename = str(tmp_path / "gazetteer.dat")
+    assert gazetteer.build(str(archive_name), filename) == 4
+
+
+def test_lookup_speed(tmp_path):
+    filename = str(tmp_path / "gazetteer.dat")
+    zip_index.write(({"zipcode": f"{n:05d}", "latitude": 40.0,
+                      "longitude": -96.0, "city": "Somewhere, NE"}
+                     for n in range(0, 100000, 2)), filename)
+    with zip_index.load(filename) as index:
+        start = time.perf_counter()
+        for n in range(1000):
+            index.get(f"{n * 37:05d}")
+        assert (time.perf_counter() - start) / 1000 < 0.001
+
+
+def test_missing_and_invalid(tmp_path):
+    assert gazetteer.load(str(tmp_path / "missing.dat")) is None
+    bad = tmp_path / "bad.dat"
+    bad.write_bytes(b"not an index")
+    with pytest.raises(RuntimeError):
+        zip_index.load(str(bad))
+    empty = tmp_path / "empty.dat"
+    empty.write_bytes(b"")
+    with zip_index.load(str(empty)) as index:
+        assert len(index) == 0
+        assert "68008" not in index
+        assert list(index.records()) == []
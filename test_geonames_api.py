@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+import geonames_api
+
+
+@pytest.fixture
+def fake_lookup(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def get_zipcode_location(username, zipcode):
+        with lock:
+            calls.append(zipcode)
+        time.sleep(0.01)
+        if zipcode == "00000":
+            raise RuntimeError(f"ZIP code not found: {zipcode}")
+        return {"zipcode": zipcode, "latitude": 41.0, "longitude": -96.0,
+                "city": "Somewhere, NE"}
+
+    monkeypatch.setattr(geonames_api, "get_zipcode_location", get_zipcode_location)
+    return calls
+
+
+def test_get_zipcode_locations_skips_duplicates_and_known(fake_lookup):
+    zipcodes = ["68008", "68008", "68102", "68503", " 68102 "]
+    results = list(geonames_api.get_zipcode_locations(
+        "user", zipcodes, known={"68503": {}}, max_workers=4
+    ))
+    assert sorted(r["zipcode"] for r in results) == ["68008", "68102"]
+    assert sorted(fake_lookup) == ["68008", "68102"]
+    assert set(results[0]) == {"zipcode", "latitude", "longitude", "city"}
+
+
+def test_get_zipcode_locations_is_concurrent(fake_lookup):
+    zipcodes = [f"{n:05d}" for n in range(1, 41)]
+    start = time.perf_counter()
+    results = list(geonames_api.get_zipcode_locations("user", zipcodes, max_workers=20))
+    assert len(results) == 40
+    assert time.perf_counter() - start < 40 * 0.01
+
+
+def test_get_zipcode_locations_errors(fake_lookup):
+    with pytest.raises(RuntimeError):
+        list(geonames_api.get_zipcode_locations("user", ["00000"]))
+    errors = []
+    results = list(geonames_api.get_zipcode_locations(
+        "user", ["00000", "68008"], on_error=lambda z, e: errors.append(z)
+    ))
+    assert [r["zipcode"] for r in results] == ["68008"]
+    assert errors == ["00000"]
+    with pytest.raises(ValueError):
+        list(geonames_api.get_zipcode_locations("user", ["68008"], max_workers=0))
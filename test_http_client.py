@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+import http_client
+from stub_services import StubServer
+
+
+@pytest.fixture(autouse=True)
+def session():
+    http_client.configure(retries=2, backoff_factor=0)
+    yield
+    http_client.configure()
+    http_client.close()
+
+
+def test_connections_are_reused():
+    with StubServer({"/ping": lambda params: (200, params)}) as server:
+        for n in range(5):
+            r = http_client.get(server.url + "/ping", params={"n": n})
+            assert r.json() == {"n": [str(n)]}
+        pool = http_client.get_session().get_adapter(server.url).poolmanager
+        assert pool.connection_from_url(server.url).num_connections == 1
+
+
+def test_retries_failed_requests():
+    statuses = [503, 503, 200]
+    with StubServer({"/flaky": lambda params: (statuses.pop(0), {})}) as server:
+        assert http_client.get(server.url + "/flaky").status_code == 200
+        assert server.request_count == 3
+
+
+def test_gives_up_after_retries():
+    with StubServer({"/down": lambda params: (503, {})}) as server:
+        assert http_client.get(server.url + "/down").status_code == 503
+        assert server.request_count == 3
+
+
+def test_timeout():
+    http_client.configure(retries=0, timeout=(1.0, 0.05))
+    with StubServer({"/slow": lambda params: (200, {})}, latency=0.2) as server:
+        start = time.perf_counter()
+        with pytest.raises(RuntimeError):
+            http_client.get(server.url + "/slow")
+        assert time.perf_counter() - start < 0.2
@@ -0,0 +1,32 @@
+import subprocess
+import sys
+
+CORE_MODULES = ["geonames_api", "ncdc_api", "location_coordinates", "zip_data",
+                "gazetteer", "station_catalog", "response_cache", "http_client"]
+IMPORT_BUDGET = 0.06  # seconds, best of RUNS
+RUNS = 5
+
+MEASURE = f"""
+import sys, time
+start = time.perf_counter()
+import {", ".join(CORE_MODULES)}
+elapsed = time.perf_counter() - start
+print(elapsed, "PyQt5" in sys.modules, "requests" in sys.modules)
+"""
+
+
+def measure_import():
+    output = subprocess.run([sys.executable, "-c", MEASURE], check=True,
+                            capture_output=True, text=True).stdout.split()
+    return float(output[0]), output[1] == "True", output[2] == "True"
+
+
+def test_core_import_does_not_load_qt_or_requests():
+    _, imports_qt, imports_requests = measure_import()
+    assert not imports_qt
+    assert not imports_requests
+
+
+def test_core_import_time_budget():
+    best = min(measure_import()[0] for _ in range(RUNS))
+    assert best < IMPORT_BUDGET, f"core import took {best * 1000:.1f} ms"
@@ -0,0 +1,150 @@
+import pytest
+from PyQt5.QtCore import QCoreApplication, QModelIndex, QPersistentModelIndex, Qt
+
+from item_models import StationListModel, ZipCodeListModel
+from location_coordinates import LocationCoordinates
+from ncdc_api import StationInfo
+
+
+ORIGIN = LocationCoordinates(latitude=41.0, longitude=-96.0)
+
+
+def station(name, latitude):
+    return StationInfo(f"GHCND:{name}", name,
+                       LocationCoordinates(latitude=latitude, longitude=-96.0))
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+@pytest.fixture
+def model(app):
+    model = StationListModel()
+    model.set_origin(ORIGIN)
+    return model
+
+
+def names(model):
+    return [model.data(model.index(row, 0)) for row in range(model.rowCount())]
+
+
+def test_pages_inserted_in_distance_order(model):
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+    model.add_stations([station("C", 41.3), station("A", 41.1)])
+    model.add_stations([station("D", 41.4), station("B", 41.2), station("E", 41.5)])
+    assert names(model) == ["A", "B", "C", "D", "E"]
+    assert inserted == [(0, 1), (2, 3), (1, 1)]
+    assert model.station_id(1) == "GHCND:B"
+    assert model.data(model.index(0, 1)) == "6.9 miles"
+
+
+def test_child_rows(model):
+    model.add_stations([station("B", 41.2), station("A", 41.1)])
+    parent = model.index(1, 0)
+    assert model.rowCount(parent) == 4
+    child = model.index(0, 1, parent)
+    assert model.data(child) == "GHCND:B"
+    assert model.data(model.index(1, 1, parent)) == "41.2"
+    assert model.parent(child) == parent
+    assert model.rowCount(child) == 0
+
+
+def test_sort_by_name_descending(model):
+    model.add_stations([station("b", 41.1), station("C", 41.3), station("a", 41.2)])
+    model.sort(StationListModel.SORT_BY_NAME, Qt.SortOrder.DescendingOrder)
+    assert names(model) == ["C", "b", "a"]
+    model.add_stations([station("Z", 41.4), station("B", 41.5)])
+    assert names(model) == ["Z", "C", "B", "b", "a"]
+    assert model.parent(model.index(0, 0, model.index(2, 0))).row() == 2
+
+
+def test_persistent_index_follows_station(model):
+    model.add_stations([station("B", 41.2), station("D", 41.4)])
+    selected = QPersistentModelIndex(model.index(1, 0))
+    model.add_stations([station("A", 41.1), station("C", 41.3)])
+    assert selected.row() == 3
+    model.sort(StationListModel.SORT_BY_NAME, Qt.SortOrder.DescendingOrder)
+    assert selected.row() == 0
+    assert model.data(QModelIndex(selected)) == "D"
+
+
+def test_clear(model):
+    model.add_stations([station("A", 41.1)])
+    model.clear()
+    assert model.rowCount() == 0
+    model.add_stations([station("B", 41.2)])
+    assert names(model) == ["B"]
+
+
+def zip_entry(zipcode):
+    return {"zipcode": zipcode, "latitude": "41.0", "longitude": "-96.0",
+            "city": f"Town {zipcode}, NE"}
+
+
+def test_zip_codes_newest_first(app):
+    model = ZipCodeListModel()
+    model.add(zip_entry("68008"))
+    model.add(zip_entry("68102"))
+    model.add(zip_entry("68008"))
+    assert model.rowCount() == 2
+    assert "68008" in model and "10001" not in model
+    assert model.zipcode(0) == "68102"
+    child = model.index(2, 1, model.index(1, 0))
+    assert model.data(child) == "Town 68008, NE"
+    assert model.parent(child).row() == 1
+
+
+def test_zip_history_restored_lazily(app, tmp_path):
+    filename = str(tmp_path / "zip_history.txt")
+    lookup = {f"{n:05d}": zip_entry(f"{n:05d}") for n in range(250)}
+    model = ZipCodeListModel()
+    model.restore(lookup, filename)
+    for zipcode in lookup:
+        model.add(lookup[zipcode])
+    model.close()
+    with open(filename, "a") as fh:
+        fh.write("99999\n00003\n")  # not in the lookup, and a duplicate
+
+    restored = ZipCodeListModel()
+    restored.restore(lookup, filename)
+    assert restored.rowCount() == 0
+    assert "00003" in restored and "99999" not in restored
+    restored.fetchMore(QModelIndex())
+    assert restored.rowCount() == ZipCodeListModel.FETCH_SIZE
+    assert restored.zipcode(0) == "00003"
+    assert restored.zipcode(1) == "00249"
+    restored.add(zip_entry("00003"))
+    assert restored.rowCount() == ZipCodeListModel.FETCH_SIZE
+    while restored.canFetchMore(QModelIndex()):
+        restored.fetchMore(QModelIndex())
+    assert restored.rowCount() == 250
+    assert restored.entry(249)["zipcode"] == "00000"
+    restored.delete_history()
+    restored.close()
+    with open(filename) as fh:
+        assert fh.read() == ""
+
+
+def test_reveal_and_clear_keep_history(app, tmp_path):
+    filename = str(tmp_path / "zip_history.txt")
+    lookup = {f"{n:05d}": zip_entry(f"{n:05d}") for n in range(250)}
+    with open(filename, "w") as fh:
+        fh.writelines(f"{zipcode}\n" for zipcode in lookup)
+    model = ZipCodeListModel()
+    model.restore(lookup, filename)
+    assert model.reveal("00100") == 149
+    assert model.rowCount() == 200
+    assert model.zipcode(149) == "00100"
+    model.clear()
+    assert model.rowCount() == 0 and "00010" not in model
+    model.add(lookup["00010"])
+    model.close()
+
+    restored = ZipCodeListModel()
+    restored.restore(lookup, filename)
+    assert restored.reveal("00010") == 0
+    assert restored.reveal("00000") == 249
+    restored.close()
@@ -33,3 +33,28 @@ def test_distance_from():
     assert origin.distance_from(other, 'miles') == pytest.approx(21.576, abs=1e-3)
     with pytest.raises(ValueError):
         origin.distance_from(other, 'na')
+
+
+def test_distances_from():
+    origin = LocationCoordinates(latitude="41.318581",
+                                 longitude="-96.346288")
+    others = [LocationCoordinates(latitude="41.55361", longitude="-96.14056"),
+              LocationCoordinates(latitude="41.318581", longitude="-96.346288"),
+              LocationCoordinates(latitude="40.8153762", longitude="-73.0451085")]
+    latitudes = [other.latitude for other in others]
+    longitudes = [other.longitude for other in others]
+    distances = origin.distances_from(latitudes, longitudes, 'miles')
+    assert list(distances) == pytest.approx(
+        [origin.distance_from(other, 'miles') for other in others]
+    )
+    assert sort_order(distances) == [1, 0, 2]
+    great_circle = origin.distances_from(latitudes, longitudes, 'km', 'great_circle')
+    assert great_circle[0] == pytest.approx(31.26, abs=0.01)
+    assert great_circle[1] == 0.0
+    assert great_circle[2] == pytest.approx(1948.4, abs=0.1)
+    with pytest.raises(ValueError):
+        origin.distances_from(latitudes, longitudes, 'na')
+    with pytest.raises(ValueError):
+        origin.distances_from(latitudes, longitudes, 'km', 'na')
+    with pytest.raises(ValueError):
+        origin.distances_from(latitudes, longitudes[:1], 'km')
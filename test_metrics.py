@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+import metrics
+import response_cache
+import zip_data
+
+
+@pytest.fixture
+def metrics_file(tmp_path):
+    filename = tmp_path / "metrics.jsonl"
+    metrics.reset()
+    metrics.enable(str(filename))
+    yield filename
+    metrics.disable()
+    metrics.reset()
+
+
+def test_records_timers_and_counters(metrics_file, tmp_path):
+    cache_data = zip_data.load(str(tmp_path / "zip_data.csv"))
+    cache_data.close()
+    with response_cache.load(":memory:") as cache:
+        cache.put("data", {"stationid": "A"}, {"results": []})
+        cache.get("data", {"stationid": "A"})
+        cache.get("data", {"stationid": "B"})
+    with pytest.raises(RuntimeError):
+        with metrics.timer("failing"):
+            raise RuntimeError("boom")
+    timers, counters = metrics.summary()
+    assert timers["zip_data.load"].count == 1
+    assert timers["cache.get"].count == 2
+    assert timers["failing"].errors == 1
+    assert counters == {"cache.hit": 1, "cache.miss": 1}
+    assert "cache 50% hits" in metrics.format_summary()
+    metrics.disable()
+    lines = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert {line["name"] for line in lines} >= {"zip_data.load", "cache.get", "cache.hit"}
+    assert [line for line in lines if line["name"] == "failing"][0]["error"] is True
+
+
+def test_disabled_metrics_cost_little():
+    metrics.disable()
+    assert metrics.timer("a") is metrics.timer("b")
+    with metrics.timer("a"):
+        metrics.count("b")
+    assert metrics.summary() == ({}, {})
@@ -0,0 +1,132 @@
+import time
+
+import pytest
+
+import ncdc_api
+import response_cache
+from location_coordinates import LocationCoordinates
+from stub_services import StubServer
+
+
+STATIONS = {
+    "metadata": {"resultset": {"offset": 1, "count": 2, "limit": 25}},
+    "results": [
+        {"id": "GHCND:USC00250070", "name": "ARLINGTON, NE US",
+         "latitude": 41.4536, "longitude": -96.3611},
+        {"id": "GHCND:USC00251145", "name": "BLAIR, NE US",
+         "latitude": 41.5417, "longitude": -96.1353},
+    ]
+}
+
+
+@pytest.fixture
+def ncei(monkeypatch):
+    with StubServer({"/stations": lambda params: (200, STATIONS)}) as server:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        yield server
+
+
+def test_get_nearby_stations(ncei):
+    location = LocationCoordinates(latitude=41.318581, longitude=-96.346288)
+    stations = ncdc_api.get_nearby_stations("token", location, 20, "miles")
+    assert [s.id for s in stations] == ["GHCND:USC00250070", "GHCND:USC00251145"]
+    assert stations[1].location.latitude == 41.5417
+
+
+def test_get_nearby_stations_cached(ncei):
+    location = LocationCoordinates(latitude=41.318581, longitude=-96.346288)
+    with response_cache.load(":memory:") as cache:
+        first = ncdc_api.get_nearby_stations("token", location, 20, "miles", cache)
+        second = ncdc_api.get_nearby_stations("token", location, 20, "miles", cache)
+        assert [s.id for s in first] == [s.id for s in second]
+        assert ncei.request_count == 1
+        assert cache.stats().hits == 1
+
+
+def paged_stations(total):
+    def route(params):
+        offset = int(params["offset"][0])
+        limit = int(params["limit"][0])
+        ids = range(offset, min(offset + limit, total + 1))
+        return 200, {
+            "metadata": {"resultset": {"offset": offset, "count": total, "limit": limit}},
+            "results": [{"id": f"GHCND:{n:011d}", "name": f"STATION {n}",
+                         "latitude": 41.0, "longitude": -96.0} for n in ids]
+        }
+    return route
+
+
+def test_iter_stations_in_extent_pages(monkeypatch):
+    with StubServer({"/stations": paged_stations(25)}) as server:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        pages = list(ncdc_api.iter_stations_in_extent("token", "41,-97,42,-96", limit=10))
+        assert [len(page) for page in pages] == [10, 10, 5]
+        assert pages[2][-1].id == "GHCND:00000000025"
+        assert server.request_count == 3
+
+
+def test_get_nearby_stations_returns_every_page(monkeypatch):
+    monkeypatch.setattr(ncdc_api, "STATIONS_PAGE_LIMIT", 7)
+    with StubServer({"/stations": paged_stations(20)}) as server:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        location = LocationCoordinates(latitude=41.318581, longitude=-96.346288)
+        stations = ncdc_api.get_nearby_stations("token", location, 20, "miles")
+        assert len({s.id for s in stations}) == 20
+        assert server.request_count == 3
+
+
+def test_get_nearby_stations_no_results(monkeypatch):
+    with StubServer({"/stations": lambda params: (200, {})}) as server:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        location = LocationCoordinates(latitude=41.318581, longitude=-96.346288)
+        with pytest.raises(RuntimeError):
+            ncdc_api.get_nearby_stations("token", location, 20, "miles")
+
+
+def test_station_array():
+    stations = [ncdc_api.StationInfo(station["id"], station["name"],
+                                     LocationCoordinates(latitude=station["latitude"],
+                                                         longitude=station["longitude"]))
+                for station in STATIONS["results"]]
+    stations.append(ncdc_api.StationInfo("GHCND:USC00255090", "MEAD 6 S, NE US – ÉTÉ",
+                                         LocationCoordinates(latitude=41.1, longitude=-96.5)))
+    array = ncdc_api.StationArray(stations)
+    assert len(array) == 3
+    assert [s.id for s in array] == [s.id for s in stations]
+    assert array[-1].name == "MEAD 6 S, NE US – ÉTÉ"
+    assert array[1].location.latitude == 41.5417
+    with pytest.raises(IndexError):
+        array[3]
+    assert array.id(-3) == stations[0].id
+    assert array.name(-2) == stations[1].name
+    assert [s.id for s in array.take([-1, 0])] == [stations[2].id, stations[0].id]
+    with pytest.raises(IndexError):
+        array.name(-4)
+    origin = LocationCoordinates(latitude=41.318581, longitude=-96.346288)
+    ordered, distances = array.sorted_by_distance(origin, 'miles')
+    assert [s.id for s in ordered] == ["GHCND:USC00250070", "GHCND:USC00255090",
+                                       "GHCND:USC00251145"]
+    assert list(distances) == pytest.approx(
+        [origin.distance_from(s.location, 'miles') for s in ordered]
+    )
+    assert ordered.name(2) == "BLAIR, NE US"
+
+
+def test_parse_frost_dates():
+    response = {"results": [
+        {"datatype": "ANN-TMIN-PRBFST-T16FP10", "value": 274},
+        {"datatype": "ANN-TMIN-PRBFST-T36FP90", "value": 300},
+        {"datatype": "ANN-TMIN-PRBLST-T16FP10", "value": 100},  # the other kind
+        {"datatype": "ANN-TMIN-PRBFST-T20FP10", "value": -7777},  # not a day
+    ]}
+    frost_dates = ncdc_api.parse_frost_dates(response, "first")
+    assert frost_dates.day(0, 0) == 274
+    assert frost_dates.day(5, 8) == 300
+    assert frost_dates.day(1, 0) == ncdc_api.NO_DATE
+    assert frost_dates.short_date(0, 0) == ncdc_api.to_short_date(274) == "Oct 01"
+    assert frost_dates.short_date(1, 0) == ""
+    assert frost_dates.to_dict() == {"ANN-TMIN-PRBFST-T16FP10": "Oct 01",
+                                     "ANN-TMIN-PRBFST-T36FP90": "Oct 27"}
+    assert len(frost_dates.rows()) == 6 and len(frost_dates.rows()[0]) == 9
+    with pytest.raises(RuntimeError, match="No results"):
+        ncdc_api.parse_frost_dates({}, "last")
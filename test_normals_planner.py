@@ -0,0 +1,69 @@
+import pytest
+
+import ncdc_api
+import normals_planner
+from normals_planner import DataQuery, plan
+from stub_services import FakeServices
+
+
+FROST_DATATYPES = [*ncdc_api.FrostDateDataTypesIterable("first"),
+                   *ncdc_api.FrostDateDataTypesIterable("last")]
+
+
+@pytest.fixture
+def fake_ncei(monkeypatch):
+    services = FakeServices(station_count=200)
+    with services.server() as server:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        yield services, server
+
+
+def test_plan_groups_by_dataset():
+    queries = plan({
+        "A": ["ANN-TMIN-PRBGSL-T32FP50", "MLY-TMIN-NORMAL"],
+        "B": ["ANN-TMIN-PRBGSL-T32FP50"],
+        "C": ["ANN-TMIN-PRBGSL-T28FP50"],
+    })
+    assert sorted(queries, key=lambda query: query.dataset) == [
+        DataQuery("NORMAL_ANN", ("A", "B", "C"),
+                  ("ANN-TMIN-PRBGSL-T28FP50", "ANN-TMIN-PRBGSL-T32FP50")),
+        DataQuery("NORMAL_MLY", ("A",), ("MLY-TMIN-NORMAL",)),
+    ]
+
+
+def test_plan_splits_into_full_pages():
+    station_ids = [f"S{n:03d}" for n in range(100)]
+    queries = plan({station_id: FROST_DATATYPES for station_id in station_ids})
+    # 108 results per station: runs of 37 stations fill four pages each
+    assert [len(query.station_ids) for query in queries] == [37, 37, 26]
+    assert sum(query.pages for query in queries) == 11
+    assert sorted(s for query in queries for s in query.station_ids) == station_ids
+    assert all(len(query.payload()["datatypeid"]) == 108 for query in queries)
+
+
+def test_fetch_normals_splits_results(fake_ncei):
+    services, server = fake_ncei
+    station_ids = [station["id"] for station in services.stations[:30]]
+    requests = {station_id: ["ANN-TMIN-PRBGSL-T32FP50", "MLY-TMIN-NORMAL"]
+                for station_id in station_ids}
+    requests[station_ids[0]] = ["MLY-TMIN-NORMAL"]
+    normals = normals_planner.fetch_normals("token", requests)
+    assert server.request_count == 2
+    assert set(normals) == set(station_ids)
+    assert set(normals[station_ids[0]]) == {"MLY-TMIN-NORMAL"}
+    monthly = normals[station_ids[1]]["MLY-TMIN-NORMAL"]
+    assert len(monthly) == 12 and monthly[0] < monthly[6]
+    assert len(normals[station_ids[1]]["ANN-TMIN-PRBGSL-T32FP50"]) == 1
+
+
+def test_frost_dates_for_stations(fake_ncei):
+    services, server = fake_ncei
+    station_id = services.stations[0]["id"]
+    frost_dates = normals_planner.get_frost_dates_for_stations(
+        "token", [station_id, "GHCND:MISSING"]
+    )
+    assert server.request_count == 1
+    assert set(frost_dates) == {station_id}
+    for kind in ("first", "last"):
+        assert frost_dates[station_id][kind] == ncdc_api.get_frost_dates("token", station_id,
+                                                                         kind)
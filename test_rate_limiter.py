@@ -0,0 +1,95 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import http_client
+import rate_limiter
+from stub_services import StubServer
+
+
+def test_bucket_limits_rate():
+    limiter = rate_limiter.RateLimiter("test", 20, capacity=2, filename=":memory:")
+    start = time.perf_counter()
+    for _ in range(6):
+        limiter.acquire()
+    elapsed = time.perf_counter() - start
+    assert 0.15 < elapsed < 0.5  # 2 at once, then 4 more at 20 per second
+    assert limiter.remaining().used == 6
+
+
+def test_daily_budget_is_persistent(tmp_path):
+    filename = str(tmp_path / "rate_limits.sqlite3")
+    limiter = rate_limiter.RateLimiter("test", 100, capacity=10, daily_limit=5,
+                                       filename=filename)
+    for _ in range(2):
+        limiter.acquire(cost=2)
+    limiter.close()
+    limiter = rate_limiter.RateLimiter("test", 100, capacity=10, daily_limit=5,
+                                       filename=filename)
+    assert limiter.remaining().remaining == 1
+    with pytest.raises(RuntimeError, match="Daily limit"):
+        limiter.acquire(cost=2)
+    limiter.acquire()
+    assert limiter.remaining().remaining == 0
+    limiter.close()
+
+
+def test_throttling_slows_down_and_recovers():
+    http_client.configure(backoff_factor=0)
+    limiter = rate_limiter.RateLimiter("test", 100, capacity=1, filename=":memory:")
+    statuses = [429, 200]
+    try:
+        with StubServer({"/busy": lambda params: (statuses.pop(0), {})}) as server:
+            r = http_client.get(server.url + "/busy", limiter=limiter)
+            assert r.status_code == 200
+            assert server.request_count == 2
+    finally:
+        http_client.configure()
+        http_client.close()
+    budget = limiter.remaining()
+    assert budget.used == 2
+    assert budget.rate == pytest.approx(50 + 100 * rate_limiter.RECOVERY_FRACTION)
+    for _ in range(20):
+        limiter.succeeded()
+    assert limiter.remaining().rate == 100
+
+
+def test_errors_do_not_recover_the_rate():
+    http_client.configure(backoff_factor=0)
+    limiter = rate_limiter.RateLimiter("test", 100, capacity=1, filename=":memory:")
+    statuses = [429, 404]
+    try:
+        with StubServer({"/busy": lambda params: (statuses.pop(0), {})}) as server:
+            assert http_client.get(server.url + "/busy", limiter=limiter).status_code == 404
+    finally:
+        http_client.configure()
+        http_client.close()
+    assert limiter.remaining().rate == pytest.approx(50)
+
+
+def test_acquire_async_does_not_block_the_event_loop(tmp_path):
+    filename = str(tmp_path / "rate_limits.sqlite3")
+    limiter = rate_limiter.RateLimiter("test", 100, filename=filename)
+    other = sqlite3.connect(filename, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")  # another process is updating its bucket
+    threading.Timer(0.3, other.rollback).start()
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    async def acquire():
+        ticker = asyncio.create_task(tick())
+        await limiter.acquire_async()
+        ticker.cancel()
+
+    asyncio.run(acquire())
+    other.close()
+    limiter.close()
+    assert ticks >= 10
@@ -0,0 +1,90 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import response_cache
+
+
+@pytest.fixture
+def filename(tmp_path):
+    return str(tmp_path / "cache.sqlite3")
+
+
+def test_cache_key_is_normalized():
+    a = response_cache.cache_key("data", {"stationid": "X", "datatypeid": ["B", "A"]})
+    b = response_cache.cache_key("data", {"datatypeid": ["A", "B"], "stationid": "X"})
+    c = response_cache.cache_key("stations", {"stationid": "X", "datatypeid": ["A", "B"]})
+    assert a == b
+    assert a != c
+
+
+def test_hits_misses_and_persistence(filename):
+    with response_cache.load(filename) as cache:
+        assert cache.get("data", {"stationid": "X"}) is None
+        cache.put("data", {"stationid": "X"}, {"results": [1, 2]})
+        assert cache.get("data", {"stationid": "X"}) == {"results": [1, 2]}
+        stats = cache.stats()
+        assert (stats.hits, stats.misses, stats.entries) == (1, 1, 1)
+        assert stats.hit_rate == 0.5
+    with response_cache.load(filename) as cache:
+        assert cache.get("data", {"stationid": "X"}) == {"results": [1, 2]}
+        total = cache.total_stats()
+        assert (total.hits, total.misses) == (2, 1)
+
+
+def test_lru_eviction(filename):
+    with response_cache.load(filename, max_bytes=100, memory_entries=1) as cache:
+        cache.put("data", {"n": 1}, "a" * 40)
+        cache.put("data", {"n": 2}, "b" * 40)
+        assert cache.get("data", {"n": 1}) is not None  # 2 is now least recent
+        cache.put("data", {"n": 3}, "c" * 40)
+        assert cache.get("data", {"n": 2}) is None
+        assert cache.get("data", {"n": 1}) is not None
+        assert cache.get("data", {"n": 3}) is not None
+        stats = cache.stats()
+        assert stats.evictions == 1
+        assert stats.size <= 100
+
+
+def test_ttl(filename):
+    with response_cache.load(filename, ttl=0.05) as cache:
+        cache.put("data", {"n": 1}, [1])
+        assert cache.get("data", {"n": 1}) == [1]
+        time.sleep(0.1)
+        assert cache.get("data", {"n": 1}) is None
+        assert cache.stats().entries == 0
+
+
+def test_hits_are_copies(filename):
+    with response_cache.load(filename) as cache:
+        response = {"results": [1, 2]}
+        cache.put("data", {"n": 1}, response)
+        response["results"].append(3)
+        cache.get("data", {"n": 1})["results"].append(4)
+        assert cache.get("data", {"n": 1}) == {"results": [1, 2]}
+
+
+def test_single_flight(filename):
+    requests = []
+
+    def fetch(response):
+        with cache.single_flight("data", {"n": 1}) as cached:
+            if cached is not None:
+                return cached
+            requests.append(response)
+            time.sleep(0.2)
+            if response is None:
+                raise RuntimeError("Request failed")
+            cache.put("data", {"n": 1}, response)
+            return response
+
+    with response_cache.load(filename) as cache, ThreadPoolExecutor() as executor:
+        failed = executor.submit(fetch, None)
+        time.sleep(0.05)
+        waiting = [executor.submit(fetch, {"results": [n]}) for n in range(3)]
+        with pytest.raises(RuntimeError):
+            failed.result()
+        results = [future.result() for future in waiting]
+    assert len(requests) == 2  # the failed request, then one of the waiting ones
+    assert results == [requests[1]] * 3
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+import ncdc_api
+import station_catalog
+from location_coordinates import LocationCoordinates
+from ncdc_api import StationInfo
+from stub_services import StubServer
+
+
+@pytest.fixture
+def stations():
+    rng = random.Random(1620)
+    return [
+        StationInfo(f"GHCND:{n:011d}", f"STATION {n}",
+                    LocationCoordinates(latitude=rng.uniform(30, 48),
+                                        longitude=rng.uniform(-120, -75)))
+        for n in range(3000)
+    ]
+
+
+def test_near_matches_bounding_box_search(stations):
+    catalog = station_catalog.StationCatalog(stations)
+    origin = LocationCoordinates(latitude=41.318581, longitude=-96.346288)
+    extent = origin.googleapi_latlngbounds_urlvalue(60, 'miles')
+    lat_lo, lng_lo, lat_hi, lng_hi = (float(v) for v in extent.split(','))
+    expected = {s.id for s in stations
+                if lat_lo <= s.location.latitude <= lat_hi
+                and lng_lo <= s.location.longitude <= lng_hi}
+    assert expected
+    assert {s.id for s in catalog.near(origin, 60, 'miles')} == expected
+
+
+def test_nearest_matches_brute_force(stations):
+    catalog = station_catalog.StationCatalog(stations)
+    for origin in (LocationCoordinates(latitude=41.3, longitude=-96.3),
+                   LocationCoordinates(latitude=25.0, longitude=-130.0)):
+        expected = sorted(stations, key=lambda s: origin.distance_from(s.location, 'km'))
+        assert [s.id for s in catalog.nearest(origin, 5, 'km')] == [s.id for s in expected[:5]]
+    assert catalog.nearest(origin, 0) == []
+    assert station_catalog.StationCatalog([]).nearest(origin, 3) == []
+
+
+def test_sync_and_load(tmp_path, monkeypatch):
+    results = [{"id": "GHCND:USC00250070", "name": "ARLINGTON, NE US",
+                "latitude": 41.4536, "longitude": -96.3611}]
+
+    def route(params):
+        assert "extent" not in params
+        return 200, {"metadata": {"resultset": {"offset": 1, "count": 1, "limit": 1000}},
+                     "results": results}
+
+    filename = str(tmp_path / "station_catalog.csv")
+    with StubServer({"/stations": route}) as server:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        assert station_catalog.sync("token", filename) == 1
+    catalog = station_catalog.load(filename)
+    assert len(catalog) == 1
+    origin = LocationCoordinates(latitude=41.318581, longitude=-96.346288)
+    assert catalog.near(origin, 20, 'miles')[0].name == "ARLINGTON, NE US"
+    assert station_catalog.load(str(tmp_path / "missing.csv")) is None
@@ -0,0 +1,62 @@
+import pytest
+
+import ncdc_api
+from location_coordinates import LocationCoordinates
+from station_query_cache import StationQueryCache, subtract, uncovered
+from stub_services import KNOWN_PLACES, FakeServices
+
+
+@pytest.fixture
+def ncei(monkeypatch):
+    with FakeServices(page_size=50).server() as server:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        yield server
+
+
+def place(zipcode):
+    *_, latitude, longitude = KNOWN_PLACES[zipcode]
+    return LocationCoordinates(latitude=latitude, longitude=longitude)
+
+
+def ids(stations):
+    return sorted(station.id for station in stations)
+
+
+def test_subtract():
+    assert subtract((0, 0, 4, 4), (1, 1, 2, 2)) == [
+        (0, 0, 1, 4), (2, 0, 4, 4), (1, 0, 2, 1), (1, 2, 2, 4)
+    ]
+    assert subtract((0, 0, 4, 4), (5, 5, 6, 6)) == [(0, 0, 4, 4)]
+    assert subtract((1, 1, 2, 2), (0, 0, 4, 4)) == []
+    assert uncovered((0, 0, 4, 4), [(0, 0, 4, 2), (0, 2, 4, 4)]) == []
+
+
+def test_smaller_search_is_answered_locally(ncei):
+    stations = StationQueryCache("token")
+    wide = stations.get_nearby_stations(place("68008"), 50, 'miles')
+    count = ncei.request_count
+    narrow = stations.get_nearby_stations(place("68008"), 25, 'miles')
+    assert ncei.request_count == count
+    assert ids(narrow) == ids(ncdc_api.get_nearby_stations("token", place("68008"),
+                                                           25, 'miles'))
+    assert set(ids(narrow)) < set(ids(wide))
+
+
+def test_larger_search_fetches_only_the_rest(ncei):
+    stations = StationQueryCache("token")
+    stations.get_nearby_stations(place("68008"), 25, 'miles')
+    count = ncei.request_count
+    wide = stations.get_nearby_stations(place("68008"), 50, 'miles')
+    assert ncei.request_count - count == 4  # the four bands around the first box
+    expected = ncdc_api.get_nearby_stations("token", place("68008"), 50, 'miles')
+    assert ids(wide) == ids(expected)
+    count = ncei.request_count
+    stations.get_nearby_stations(place("68102"), 10, 'miles')  # inside the wide box
+    assert ncei.request_count == count
+
+
+def test_no_results(ncei):
+    stations = StationQueryCache("token")
+    with pytest.raises(RuntimeError, match="No results"):
+        stations.get_nearby_stations(LocationCoordinates(latitude=0, longitude=0),
+                                     5, 'miles')
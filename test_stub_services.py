@@ -0,0 +1,58 @@
+import datetime
+import json
+
+import pytest
+
+import ncdc_api
+from benchmarks import bench_suite
+from location_coordinates import LocationCoordinates
+from stub_services import FakeServices
+
+
+@pytest.fixture
+def fake_ncei(monkeypatch):
+    services = FakeServices(page_size=5)
+    with services.server() as server:
+        monkeypatch.setattr(ncdc_api, "NCEI_URL", server.url)
+        yield services, server
+
+
+def test_station_search_honors_extent_and_page_size(fake_ncei):
+    services, server = fake_ncei
+    location = LocationCoordinates(latitude=41.5437, longitude=-96.1347)
+    stations = ncdc_api.get_nearby_stations("token", location, 100, "miles")
+    extent = location.googleapi_latlngbounds_urlvalue(100, "miles")
+    _, payload = services.search_stations({"extent": [extent], "limit": ["1000"]})
+    assert len(stations) == payload["metadata"]["resultset"]["count"] > 5
+    assert server.request_count == -(-len(stations) // 5)  # one request per page
+    assert len({station.id for station in stations}) == len(stations)
+
+
+def to_day(short_date):
+    return datetime.datetime.strptime(short_date, "%b %d")
+
+
+def test_frost_dates_are_ordered(fake_ncei):
+    station_id = fake_ncei[0].stations[0]["id"]
+    first = ncdc_api.get_frost_dates("token", station_id, "first")
+    last = ncdc_api.get_frost_dates("token", station_id, "last")
+    assert ncdc_api.NO_DATE not in first.days + last.days
+    row = ncdc_api.FROST_TEMPERATURES.index(32)
+    assert first.day(row, 0) < first.day(row, 8)
+    assert last.day(row, 8) < first.day(row, 0)
+    assert to_day(first.short_date(row, 0)) < to_day(first.short_date(row, 8))
+
+
+def test_benchmark_suite_reports_regressions(tmp_path, capsys):
+    results_file = str(tmp_path / "results.json")
+    assert bench_suite.main(["-n", "3", "--only", "services", "--json", results_file]) == 0
+    with open(results_file) as fh:
+        results = json.load(fh)["results"]
+    assert [result["name"] for result in results] == [
+        "geonames.get_zipcode_location", "ncdc.get_nearby_stations", "ncdc.get_frost_dates"
+    ]
+    faster = {result["name"]: dict(result, p95=result["p95"] / 10) for result in results}
+    regressions = bench_suite.report([bench_suite.BenchmarkResult(**result)
+                                      for result in results], faster)
+    assert len(regressions) == 3
+    assert "REGRESSION" in capsys.readouterr().out
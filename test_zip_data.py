@@ -0,0 +1,187 @@
+import os
+import threading
+
+import pytest
+
+import zip_data
+import zip_index
+
+
+def entry(zipcode, city="Blair, NE"):
+    return {"zipcode": zipcode, "latitude": "41.5437",
+            "longitude": "-96.1347", "city": city}
+
+
+def stored(zipcode, city="Blair, NE"):
+    return {"zipcode": zipcode, "latitude": 41.5437,
+            "longitude": -96.1347, "city": city}
+
+
+@pytest.fixture
+def filename(tmp_path):
+    return str(tmp_path / "zip_data.csv")
+
+
+def test_write_through(filename):
+    data = zip_data.load(filename)
+    data["68008"] = entry("68008")
+    data["68102"] = entry("68102", "Omaha, NE")
+    # records are on disk before the cache is closed
+    reloaded = zip_data.load(filename)
+    assert reloaded["68008"] == stored("68008")
+    assert reloaded["68102"]["city"] == "Omaha, NE"
+    assert len(reloaded) == 2
+
+
+def test_replay_last_record_wins_and_deletes(filename):
+    data = zip_data.load(filename)
+    data["68008"] = entry("68008")
+    data["68008"] = entry("68008", "Somewhere, NE")
+    data["68102"] = entry("68102")
+    del data["68102"]
+    data.close()
+    reloaded = zip_data.load(filename)
+    assert dict(reloaded) == {"68008": stored("68008", "Somewhere, NE")}
+
+
+@pytest.mark.parametrize("torn", ["68102,41.25",
+                                  "68008,41.25,-96.1,",  # not a delete
+                                  '68102,41.25,-96.1,"Omaha, N'])
+def test_torn_write_is_ignored(filename, torn):
+    data = zip_data.load(filename)
+    data["68008"] = entry("68008")
+    data.close()
+    with open(filename, "a", newline="") as fh:
+        fh.write(torn)
+    data = zip_data.load(filename)
+    assert list(data) == ["68008"]
+    data["00501"] = entry("00501")
+    data["68123"] = entry("68123")
+    data.close()
+    assert sorted(zip_data.load(filename)) == ["00501", "68008", "68123"]
+
+
+def test_legacy_journal(filename):
+    with open(filename, "w", newline="") as fh:
+        fh.write("zipcode,latitude,longitude,city\r\n"
+                 "68008,41.5437,-96.1347,\"Blair, NE\"\r\n"
+                 "68102,41.25,-96.0,Omaha\r\n"
+                 "68102,,,\r\n")
+    data = zip_data.load(filename)
+    assert dict(data) == {"68008": stored("68008")}
+    data["68102"] = entry("68102")
+    data.close()
+    assert sorted(zip_data.load(filename)) == ["68008", "68102"]
+
+
+def test_compaction_bounds_journal_size(filename, monkeypatch):
+    monkeypatch.setattr(zip_data, "JOURNAL_MAX_RECORDS", 10)
+    data = zip_data.load(filename)
+    for n in range(25):
+        data[f"{n:05d}"] = entry(f"{n:05d}", f"City {n}, NE")
+    data.close()
+    with open(filename) as fh:
+        assert len(fh.readlines()) <= 1 + 10
+    reloaded = zip_data.load(filename)
+    assert len(reloaded) == 25
+    assert reloaded["00024"]["city"] == "City 24, NE"
+    assert reloaded["00003"]["latitude"] == 41.5437
+
+
+def test_journal_over_index(filename, monkeypatch):
+    data = zip_data.load(filename)
+    data["68008"] = entry("68008")
+    data["68102"] = entry("68102", "Omaha, NE")
+    data.compact()
+    data["68102"] = entry("68102", "North Omaha, NE")
+    del data["68008"]
+    data["00501"] = entry("00501", "Holtsville, NY")
+    data.close()
+    reloaded = zip_data.load(filename)
+    assert sorted(reloaded) == ["00501", "68102"]
+    assert len(reloaded) == 2
+    assert "68008" not in reloaded
+    assert reloaded["68102"]["city"] == "North Omaha, NE"
+    with pytest.raises(KeyError):
+        reloaded["68008"]
+
+
+def test_types_no_op_writes_and_close(filename):
+    data = zip_data.load(filename)
+    data["68008"] = entry("68008")
+    data.compact()
+    assert data["68008"] == stored("68008")
+    data["68008"] = entry("68008")
+    data["68102"] = entry("68102")
+    assert data["68102"] == stored("68102")
+    data.close()
+    with open(filename) as fh:
+        assert [line.split(",")[0] for line in fh] == ["zipcode", "68102"]
+    with pytest.raises(ValueError):
+        data["68008"]
+    with pytest.raises(ValueError):
+        "68008" in data
+
+
+def test_reads_during_compaction(filename, monkeypatch):
+    monkeypatch.setattr(zip_data, "JOURNAL_MAX_RECORDS", 20)
+    data = zip_data.load(filename)
+    for n in range(100):
+        data[f"{n:05d}"] = entry(f"{n:05d}")
+    errors = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            for n in range(100):
+                try:
+                    data[f"{n:05d}"]
+                except Exception as error:
+                    errors.append(error)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for n in range(100, 300):
+        data[f"{n:05d}"] = entry(f"{n:05d}")
+    done.set()
+    for reader in readers:
+        reader.join()
+    data.close()
+    assert errors == []
+
+
+def test_compaction_closes_index_before_replacing_it(filename, monkeypatch):
+    data = zip_data.load(filename)
+    data["68008"] = entry("68008")
+    data.compact()
+    data["68102"] = entry("68102")
+    replace = os.replace
+
+    def replace_unmapped(source, destination):
+        assert data._index is None  # Windows cannot replace a mapped file
+        replace(source, destination)
+
+    monkeypatch.setattr(zip_index.os, "replace", replace_unmapped)
+    data.compact()
+    assert sorted(data) == ["68008", "68102"]
+    data.close()
+
+
+def test_convert(filename):
+    with open(filename, "w", newline="") as fh:
+        fh.write("zipcode,latitude,longitude,city\r\n"
+                 "68008,41.5437,-96.1347,\"Blair, NE\"\r\n")
+    assert zip_data.convert(filename) == 1
+    assert not os.path.exists(filename)
+    assert os.path.exists(zip_data.index_filename(filename))
+    assert zip_data.load(filename)["68008"]["city"] == "Blair, NE"
+
+
+def test_save(filename):
+    zip_data.save({"68008": entry("68008")}, filename)
+    assert dict(zip_data.load(filename)) == {"68008": stored("68008")}
+    with pytest.raises(RuntimeError):
+        zip_data.save({"68008": {"zip": "68008"}}, filename)
+    with pytest.raises(RuntimeError):
+        zip_data.load(filename)["68102"] = entry("68008")
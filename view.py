@@ -3,10 +3,12 @@ from typing import Callable, Any
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QCloseEvent, QFont
 from PyQt5.QtWidgets import (QWidget, QLineEdit, QHBoxLayout, QVBoxLayout,
-                             QPushButton, QTreeWidget, QHeaderView,
+                             QPushButton, QTreeView, QHeaderView,
                              QMainWindow, QLabel, QSizePolicy, QStackedLayout, QSlider, QSpinBox, QTableWidget,
                              QTableWidgetItem, QAbstractScrollArea)
 
+from item_models import StationListModel, ZipCodeListModel
+
 
 class MainWindow(QMainWindow):
     def __init__(self, *args, **kwargs):
@@ -16,6 +18,7 @@ class MainWindow(QMainWindow):
         self.frost_dates_widget = FrostDatesPage()
         self.stacked_layout = QStackedLayout()
         self.status_bar = self.statusBar()
+        self.metrics_label = QLabel()
         self.on_close: Callable[..., Any] | None = None
         self.setWindowTitle('Frost Dates')
         self.setUpWidgets()
@@ -28,6 +31,8 @@ class MainWindow(QMainWindow):
         self.stacked_layout.addWidget(self.frost_dates_widget)
         central_widget.setLayout(self.stacked_layout)
         self.setCentralWidget(central_widget)
+        self.metrics_label.setVisible(False)  # shown when metrics are enabled
+        self.status_bar.addPermanentWidget(self.metrics_label)
 
     def closeEvent(self, event: QCloseEvent) -> None:
         if self.on_close:
@@ -39,8 +44,10 @@ class ZipCodeSearchPage(QWidget):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.zip_code_edit = QLineEdit()
-        self.zip_code_list = QTreeWidget()
+        self.zip_code_model = ZipCodeListModel()
+        self.zip_code_list = QTreeView()
         self.search_button = QPushButton("Search")
+        self.clear_history_button = QPushButton("Clear History")
         self.next_button = QPushButton("Next")
         self.close_button = QPushButton("Close")
         self.setWindowTitle('ZIP Code Search')
@@ -60,7 +67,8 @@ class ZipCodeSearchPage(QWidget):
         size_policy = self.search_button.sizePolicy()
         size_policy.setHorizontalPolicy(QSizePolicy.Policy.Fixed)
         self.search_button.setSizePolicy(size_policy)
-        self.zip_code_list.setColumnCount(2)
+        self.zip_code_list.setModel(self.zip_code_model)
+        self.zip_code_list.setUniformRowHeights(True)
         header = self.zip_code_list.header()
         header.setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.zip_code_list.setHeaderHidden(True)
@@ -71,6 +79,7 @@ class ZipCodeSearchPage(QWidget):
         main_layout.addWidget(self.search_button, alignment=Qt.AlignmentFlag.AlignRight)
         main_layout.addWidget(self.zip_code_list)
         buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(self.clear_history_button)
         buttons_layout.addStretch(1)
         self.next_button.setEnabled(False)
         buttons_layout.addWidget(self.next_button)
@@ -80,6 +89,7 @@ class ZipCodeSearchPage(QWidget):
         self.zip_code_edit.setStatusTip("Enter 5-digit US ZIP code.")
         self.zip_code_list.setStatusTip("Location data returned for ZIP codes.")
         self.search_button.setStatusTip("Get location data from GeoNames.")
+        self.clear_history_button.setStatusTip("Forget the ZIP codes searched for.")
         self.next_button.setStatusTip("Go to the next page.")
         self.close_button.setStatusTip("Close the program.")
 
@@ -89,7 +99,8 @@ class SelectWeatherStationPage(QWidget):
         super().__init__(*args, **kwargs)
         self.search_radius = SearchRadiusWidget()
         self.search_button = QPushButton("Search")
-        self.station_list = QTreeWidget()
+        self.station_model = StationListModel()
+        self.station_list = QTreeView()
         self.next_button = QPushButton("Next")
         self.go_back_button = QPushButton("Go Back")
         self.close_button = QPushButton("Close")
@@ -102,9 +113,13 @@ class SelectWeatherStationPage(QWidget):
         select_heading_font = QFont()
         select_heading_font.setPointSize(16)
         select_heading.setFont(select_heading_font)
-        self.station_list.setColumnCount(2)
+        self.station_list.setModel(self.station_model)
+        self.station_list.setUniformRowHeights(True)  # lets the view skip measuring rows
         header = self.station_list.header()
-        header.setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        header.setStretchLastSection(False)
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        header.setSectionResizeMode(1, QHeaderView.ResizeMode.Fixed)
+        header.resizeSection(1, 100)
         self.station_list.setHeaderHidden(True)
         main_layout = QVBoxLayout()
         main_layout.addWidget(select_heading)
@@ -1,33 +1,307 @@
 import csv
-from typing import Any
+import os
+import sys
+import threading
+from collections.abc import MutableMapping
+from typing import Any, BinaryIO, Iterator
 
+import metrics
+import zip_index
 
-def load(filename: str = "zip_data.csv") -> dict[str, dict[str, Any]]:
+
+FIELDNAMES = ["zipcode", "latitude", "longitude", "city"]
+JOURNAL_FIELDNAMES = FIELDNAMES + ["op"]  # op is last, so only a whole record has one
+SET, DELETE = "set", "delete"
+JOURNAL_MAX_RECORDS = 1000  # compact once the journal holds this many records
+
+
+@metrics.timed("zip_data.load")
+def load(filename: str = "zip_data.csv") -> "ZipData":
     """Load the program cache from a file."""
-    try:
-        with open(filename, 'r', newline='') as csvfile:
-            result = {}
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                zipcode = row['zipcode']
-                result[zipcode] = row
-            return result
-    except FileNotFoundError:
-        return {}
-
-
-def save(data: dict[str, dict[str, Any]],
+    return ZipData(filename)
+
+
+def index_filename(filename: str) -> str:
+    """Get the name of the binary index that goes with a journal file."""
+    return os.path.splitext(filename)[0] + ".idx"
+
+
+def convert(filename: str = "zip_data.csv") -> int:
+    """Convert a CSV program cache to the binary index format.
+
+    The CSV file is removed once the index has been written.
+
+    Returns:
+        The number of ZIP codes in the index.
+    """
+    data = ZipData(filename)
+    count = len(data)
+    data.compact()
+    data.close()
+    return count
+
+
+@metrics.timed("zip_data.save")
+def save(data: MutableMapping[str, dict[str, Any]],
          filename: str = "zip_data.csv") -> None:
-    """Save the program cache to a file."""
+    """Save the program cache to a file.
+
+    The file is replaced in a single step, so an interrupted save never
+    leaves a partially written cache behind.
+    """
     if not data:
         return
+    temp_filename = filename + ".tmp"
     try:
-        with open(filename, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(
-                csvfile, ["zipcode", "latitude", "longitude", "city"]
-            )
+        with open(temp_filename, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, FIELDNAMES)
             writer.writeheader()
             for zipcode, coords in data.items():
                 writer.writerow(coords)
-    except KeyError:
+        os.replace(temp_filename, filename)
+    except (KeyError, ValueError):
+        os.remove(temp_filename)
+        raise RuntimeError("Unexpected program data format")
+
+
+class ZipData(MutableMapping):
+    """Program cache of ZIP code data.
+
+    The cache is stored in two files. The bulk of the records live in a
+    sorted binary index (see zip_index) that is memory-mapped, so
+    loading parses nothing and a lookup is a binary search. Changes are
+    appended to a CSV journal as soon as they are made, so a crash loses
+    nothing. Loading replays the journal on top of the index and later
+    records replace earlier ones. Each record ends with its operation,
+    set or delete, so a record torn by a crash has none and is skipped;
+    the torn tail is cut off before the journal is appended to again. Once the journal reaches JOURNAL_MAX_RECORDS it is
+    merged into a new index, which keeps the load time bounded.
+
+    Latitudes and longitudes are always floats, whether the entry comes
+    from the index or the journal. Using the cache after close() raises
+    ValueError. The cache can be read from several threads while one
+    thread writes to it.
+    """
+    def __init__(self, filename: str = "zip_data.csv") -> None:
+        self.filename = filename
+        self.index_filename = index_filename(filename)
+        self._index = zip_index.load(self.index_filename)
+        self._data: dict[str, dict[str, Any]] = {}
+        self._deleted: set[str] = set()
+        self._records = 0
+        self._legacy_journal = False  # written before records had an operation
+        self._lock = threading.RLock()
+        self._closed = False
+        self._replay()
+        self._file = None
+        if self._needs_compaction() or self._legacy_journal:
+            self.compact()
+
+    def __getitem__(self, zipcode: str) -> dict[str, Any]:
+        with self._lock:
+            self._check_open()
+            try:
+                return self._data[zipcode]
+            except KeyError:
+                if self._index is None or zipcode in self._deleted:
+                    raise
+                return self._index[zipcode]
+
+    def __contains__(self, zipcode: object) -> bool:
+        with self._lock:
+            self._check_open()
+            if zipcode in self._data:
+                return True
+            return (self._index is not None and zipcode not in self._deleted
+                    and zipcode in self._index)
+
+    def __setitem__(self, zipcode: str, entry: dict[str, Any]) -> None:
+        if zipcode != entry.get("zipcode"):
+            raise RuntimeError("Unexpected program data format")
+        entry = _normalize(entry)
+        with self._lock:
+            self._check_open()
+            if zipcode in self and self[zipcode] == entry:
+                return
+            self._append(dict(entry, op=SET))
+            self._data[zipcode] = entry
+            self._deleted.discard(zipcode)
+        self._maybe_compact()
+
+    def __delitem__(self, zipcode: str) -> None:
+        with self._lock:
+            self._check_open()
+            if zipcode not in self:
+                raise KeyError(zipcode)
+            self._append({"zipcode": zipcode, "op": DELETE})
+            self._data.pop(zipcode, None)
+            if self._index is not None and zipcode in self._index:
+                self._deleted.add(zipcode)
+        self._maybe_compact()
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            self._check_open()
+            zipcodes = []
+            if self._index is not None:
+                zipcodes = [zipcode for zipcode in self._index
+                            if zipcode not in self._deleted and zipcode not in self._data]
+            zipcodes.extend(self._data)
+        return iter(zipcodes)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._check_open()
+            if self._index is None:
+                return len(self._data)
+            return (len(self._index) - len(self._deleted)
+                    + sum(1 for zipcode in self._data if zipcode not in self._index))
+
+    @metrics.timed("zip_data.compact")
+    def compact(self) -> None:
+        """Merge the journal into the index and start a new journal.
+
+        Lookups wait for the lock while the index is rebuilt, so they
+        never see the cache without an index. The old index is closed
+        before its file is replaced, since Windows cannot replace or
+        remove a file that is memory-mapped.
+        """
+        with self._lock:
+            self._check_open()
+            self._close_file()
+            records = [self[zipcode] for zipcode in self]
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+            try:
+                if records:
+                    zip_index.write(records, self.index_filename)
+                elif os.path.exists(self.index_filename):
+                    os.remove(self.index_filename)
+            finally:
+                # the old index if the write failed, which leaves the journal in place
+                self._index = zip_index.load(self.index_filename)
+            if os.path.exists(self.filename):
+                os.remove(self.filename)
+            self._data.clear()
+            self._deleted.clear()
+            self._records = 0
+
+    def close(self) -> None:
+        """Close the journal and the index."""
+        with self._lock:
+            self._close_file()
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+            self._closed = True
+
+    def _replay(self) -> None:
+        """Load the records from the journal."""
+        try:
+            with open(self.filename, 'r', newline='') as csvfile:
+                reader = csv.DictReader(csvfile)
+                self._legacy_journal = "op" not in (reader.fieldnames or ["op"])
+                for row in reader:
+                    zipcode = row['zipcode']
+                    if self._legacy_journal:  # an empty city marked a delete
+                        if row['city'] is None:
+                            op = None
+                        elif row['city']:
+                            op = SET
+                        else:
+                            op = DELETE
+                    else:
+                        op = row['op']
+                    if op not in (SET, DELETE):  # torn write
+                        continue
+                    self._records += 1
+                    if op == SET:
+                        self._data[zipcode] = _normalize(row)
+                        self._deleted.discard(zipcode)
+                    else:
+                        self._data.pop(zipcode, None)
+                        if self._index is not None and zipcode in self._index:
+                            self._deleted.add(zipcode)
+        except FileNotFoundError:
+            pass
+        except KeyError:
+            raise RuntimeError("Unexpected program data format")
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise ValueError("ZIP code cache is closed")
+
+    def _append(self, entry: dict[str, Any]) -> None:
+        """Append a record to the journal and flush it to disk."""
+        if self._file is None:
+            self._open_file()
+        try:
+            self._writer.writerow(entry)
+        except ValueError:
+            raise RuntimeError("Unexpected program data format")
+        self._file.flush()
+        self._records += 1
+
+    def _open_file(self) -> None:
+        """Open the journal for appending, cutting off a torn last record.
+
+        A torn record can end inside a quoted city, which would make the
+        CSV reader swallow every record appended after it.
+        """
+        try:
+            with open(self.filename, 'rb+') as fh:
+                size = _complete_length(fh)
+                fh.truncate(size)
+        except FileNotFoundError:
+            size = 0
+        self._file = open(self.filename, 'a', newline='')
+        self._writer = csv.DictWriter(self._file, JOURNAL_FIELDNAMES)
+        if not size:
+            self._writer.writeheader()
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _needs_compaction(self) -> bool:
+        return self._records >= JOURNAL_MAX_RECORDS
+
+    def _maybe_compact(self) -> None:
+        if self._needs_compaction():
+            self.compact()
+
+
+def _complete_length(fh: BinaryIO, block_size: int = 4096) -> int:
+    """Get the length of a file up to the end of its last complete line."""
+    end = fh.seek(0, os.SEEK_END)
+    while end > 0:
+        start = max(0, end - block_size)
+        fh.seek(start)
+        newline = fh.read(end - start).rfind(b'\n')
+        if newline >= 0:
+            return start + newline + 1
+        end = start
+    return 0
+
+
+def _normalize(entry: dict[str, Any]) -> dict[str, Any]:
+    """Get a cache entry with the fields the index stores, as it stores them."""
+    try:
+        return {"zipcode": entry["zipcode"],
+                "latitude": float(entry["latitude"]),
+                "longitude": float(entry["longitude"]),
+                "city": entry["city"]}
+    except (KeyError, TypeError, ValueError):
         raise RuntimeError("Unexpected program data format")
+
+
+def main():
+    filename = sys.argv[1] if len(sys.argv) > 1 else "zip_data.csv"
+    count = convert(filename)
+    print(f"Wrote {count} ZIP codes to {index_filename(filename)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import mmap
+import os
+import struct
+from typing import Any, Iterable, Iterator
+
+
+MAGIC = b"ZIPX"
+HEADER = struct.Struct("<4sI")      # magic, record count
+RECORD = struct.Struct("<5sdd59s")  # zipcode, latitude, longitude, city
+
+
+def write(records: Iterable[dict[str, Any]], filename: str) -> int:
+    """Write ZIP code records to a sorted, fixed-width binary file.
+
+    Records use the same format as the program cache. When a ZIP code
+    appears more than once, the last record wins. The file is written
+    to a temporary file first so readers never see a partial index.
+
+    Args:
+        records: The ZIP code records to write.
+        filename: The name of the index file.
+    Returns:
+        The number of records written.
+    """
+    try:
+        by_zipcode = {record["zipcode"]: record for record in records}
+    except KeyError:
+        raise RuntimeError("Unexpected program data format")
+    temp_filename = filename + ".tmp"
+    try:
+        with open(temp_filename, "wb") as fh:
+            fh.write(HEADER.pack(MAGIC, len(by_zipcode)))
+            for zipcode in sorted(by_zipcode):
+                record = by_zipcode[zipcode]
+                fh.write(RECORD.pack(
+                    _zipcode_key(zipcode),
+                    float(record["latitude"]),
+                    float(record["longitude"]),
+                    record["city"].encode("utf-8")
+                ))
+        os.replace(temp_filename, filename)
+    except (KeyError, ValueError, struct.error):
+        os.remove(temp_filename)
+        raise RuntimeError("Unexpected program data format")
+    return len(by_zipcode)
+
+
+def load(filename: str) -> "ZipIndex | None":
+    """Open a ZIP code index if the file exists."""
+    try:
+        return ZipIndex(filename)
+    except FileNotFoundError:
+        return None
+
+
+class ZipIndex:
+    """Read-only mapping of ZIP code to location backed by a binary file.
+
+    The file is memory-mapped, so opening the index does not parse any
+    records. Lookups use a binary search over the sorted records. An
+    empty file, such as one left by an interrupted write, is an empty
+    index.
+    """
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self._map: mmap.mmap | None = None
+        self._count = 0
+        with open(filename, "rb") as fh:
+            if os.fstat(fh.fileno()).st_size == 0:
+                return  # mmap cannot map an empty file
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self._count = HEADER.unpack_from(self._map, 0)
+        except struct.error:
+            magic = None
+        if magic != MAGIC or len(self._map) != HEADER.size + self._count * RECORD.size:
+            self._map.close()
+            raise RuntimeError(f"Invalid ZIP code index: {filename}")
+
+    def __enter__(self) -> "ZipIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, zipcode: object) -> bool:
+        return isinstance(zipcode, str) and self._find(zipcode) >= 0
+
+    def __getitem__(self, zipcode: str) -> dict[str, Any]:
+        index = self._find(zipcode)
+        if index < 0:
+            raise KeyError(zipcode)
+        return self._record(index)
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self._count):
+            offset = HEADER.size + index * RECORD.size
+            yield self._map[offset:offset + 5].decode("ascii")
+
+    def get(self, zipcode: str, default: Any = None) -> Any:
+        """Get the record for the ZIP code or the default if missing."""
+        index = self._find(zipcode)
+        return self._record(index) if index >= 0 else default
+
+    def records(self) -> Iterator[dict[str, Any]]:
+        """Iterate over all records in ZIP code order."""
+        for index in range(self._count):
+            yield self._record(index)
+
+    def close(self) -> None:
+        """Release the memory map."""
+        if self._map is not None:
+            self._map.close()
+
+    def _find(self, zipcode: str) -> int:
+        """Find the record number for the ZIP code or -1 if missing."""
+        try:
+            key = _zipcode_key(zipcode)
+        except ValueError:
+            return -1
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * RECORD.size
+            current = self._map[offset:offset + 5]
+            if current < key:
+                lo = mid + 1
+            elif current > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def _record(self, index: int) -> dict[str, Any]:
+        zipcode, latitude, longitude, city = RECORD.unpack_from(
+            self._map, HEADER.size + index * RECORD.size
+        )
+        return {"zipcode": zipcode.decode("ascii"),
+                "latitude": latitude,
+                "longitude": longitude,
+                "city": city.rstrip(b"\0").decode("utf-8", errors="ignore")}
+
+
+def _zipcode_key(zipcode: str) -> bytes:
+    """Convert a ZIP code to the fixed-width key used in the index."""
+    key = zipcode.encode("ascii")
+    if len(key) != 5:
+        raise ValueError(f"Invalid ZIP code: {zipcode}")
+    return key